@@ -1,78 +1,531 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, redirect, render_template, request, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from main import AI2SQLService
 from test import test_runner
 from datetime import datetime
 import uuid
+import gzip
+import hashlib
+import hmac
+import time
 import os
-import tempfile
-from config.config import logger
+import json
+import queue
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from config.config import log_pipeline, logger, params
+from config import metrics
+from data.json_codec import dumps as json_dumps, to_columnar
+from data.history_store import HistoryStore
+from data.query_store import LOGIN_TICKETS, LOGS, POLLS, RESULTS, SESSIONS, SUMMARIES, QueryStore, create_query_store
+from voice.audio_decode import AudioDecodeError, decode_audio
+from voice.stt_batcher import STTBusy
+from voice.vad_trim import trim_silence
+from model.admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected
+from model.summary_executor import EMPTY_SUMMARY, SummaryExecutor
+from model.singleflight import SingleFlight, coalesce_key
 from threading import Thread
 
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    from flask_sock import Sock
+    FLASK_SOCK_AVAILABLE = True
+except ImportError:
+    FLASK_SOCK_AVAILABLE = False
+
 app = Flask(__name__)
 CORS(app)
+# 反向代理之后按 X-Forwarded-For 还原客户端地址（只信任配置的代理层数，防止客户端伪造该请求头）
+if params.trusted_proxy_hops > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=params.trusted_proxy_hops, x_proto=params.trusted_proxy_hops)
+# WebSocket（实时语音识别），未安装 flask-sock 时不提供
+sock = Sock(app) if FLASK_SOCK_AVAILABLE else None
+
+# 服务实例由 create_app() 在进程级初始化（gunicorn preload 时在 master 中执行一次）
+service: AI2SQLService = None
+speech_service = None
+# 语音识别工作线程（独占模型，动态合并并发请求），后端语音识别可用时由 create_app() 初始化
+stt_worker = None
+# 流式语音识别（WebSocket 实时出字），未配置流式模型时为 None
+streaming_stt = None
+# 语音模型加载状态（/api/ready 据此报告）：pending / loading / ready / unavailable
+model_status = {"speech": "pending", "streaming_speech": "pending"}
+_model_loader: Thread = None
+# 当前是否为 gunicorn preload_app 的 master 进程（由 gunicorn.conf.py 设置环境变量，fork 后在 worker 中置为 False）：
+# master 中同步加载模型、不启动识别线程，识别线程在 worker fork 后启动
+_preload_master = os.getenv("AI2SQL_PRELOAD") == "1"
+
+# 查询状态存储（key 为查询ID，按 TTL 与容量上限淘汰），由 create_app() 初始化
+#   LOGS:      查询日志
+#   RESULTS:   {"question": str, "sql": str, "total_rows": int}，结果行通过 put_rows/get_rows 单独存取
+#   SUMMARIES: {"status": "pending"|"done"|"error", "summary": dict, "error": str | None}
+query_store: QueryStore = None
+# 总结任务执行器（有界线程池），由 create_app() 初始化
+summary_executor: SummaryExecutor = None
+# 相同问题的并发请求合并为一次执行
+query_flight = SingleFlight()
+# 查询历史（SQLite，异步批量写入），由 create_app() 初始化
+history_store: HistoryStore = None
+# 查询准入控制（全局/每用户并发上限 + 等待队列），由 create_app() 初始化
+admission: AdmissionController = None
+
+# 登录身份：/api/receive_roles（需门户签名，服务端对服务端调用）写入 SESSIONS 命名空间并返回一次性登录票据，
+# 门户将浏览器重定向到 /api/login?ticket=...，由该接口下发会话令牌 Cookie；
+# 票据 LOGIN_TICKET_TTL 秒内有效且只能使用一次。
+# 会话被使用时每隔 SESSION_REFRESH 秒续期一次，避免按写入时间的 TTL 到期
+SESSION_COOKIE = "ai2sql_session"
+SESSION_REFRESH = 300
+LOGIN_TICKET_TTL = 60
+# 未登录用户按客户端地址计入每用户配额（客户端可自选的 Cookie 不能作为配额身份）；
+# 未配置 --trusted_proxy_hops 时反向代理后所有请求的地址相同，即所有未登录用户共用一份配额
+
+# 查询结果分页：首屏只返回第一页，其余行通过 /api/query/<query_id>/rows 按游标获取
+ROWS_PAGE_SIZE = 50
+ROWS_PAGE_SIZE_MAX = 500
+
+# 实时语音识别连接超过该时间（秒）未收到音频则断开
+SPEECH_STREAM_IDLE_TIMEOUT = 30
+
+# 响应体超过该字节数时按 Accept-Encoding 协商 br/gzip 压缩
+COMPRESS_MIN_BYTES = 1024
+
+# 流式查询：结果行按批推送（最多推送 ROWS_PAGE_SIZE_MAX 行，其余行仍通过分页接口获取），
+# 总结由执行器在写回时通知（不轮询存储）；最多等待 STREAM_SUMMARY_TIMEOUT 秒，之后由前端改为轮询
+# /api/query-summary，避免慢总结长期占用 gthread 线程。等待期间每 STREAM_SUMMARY_HEARTBEAT 秒
+# 刷新一次轮询时间，防止排队中的总结被当作无人等待而取消
+STREAM_SUMMARY_TIMEOUT = 20
+STREAM_SUMMARY_HEARTBEAT = 5
+
+
+def _rows_page(page: list, cursor: int, total_rows: int) -> dict:
+    """组装一页结果，游标为下一页起始行号（最后一页为 None）"""
+    next_cursor = cursor + len(page)
+    return {
+        "rows": page,
+        "total_rows": total_rows,
+        "next_cursor": str(next_cursor) if next_cursor < total_rows else None,
+    }
+
 
-# 初始化服务
-service = AI2SQLService()
+def _wants_columnar(data: dict = None) -> bool:
+    """客户端是否要求列式结果格式（查询参数或请求体中 format=columnar）"""
+    return (request.args.get('format') or (data or {}).get('format')) == 'columnar'
 
-# 存储查询日志（使用字典，key为查询ID）
-query_logs = {}
 
-# 存储查询结果和总结状态（用于前后端分步展示）
-query_results = {}   # query_id -> {"question": str, "sql": str, "rows": list}
-query_summaries = {}  # query_id -> {"status": "pending"|"done"|"error", "summary": dict, "error": str | None}
+def _format_rows(rows: list, columnar: bool):
+    """按协商的格式输出结果行：列式 {columns, data} 或 行列表"""
+    return to_columnar(rows) if columnar else rows
 
-def _run_summary_async(query_id: str, question: str, sql: str, rows):
-    """在后台线程中生成总结，避免阻塞主查询接口"""
+
+def _json_response(payload: dict, status: int = 200) -> Response:
+    """使用快速编码器序列化（原生处理日期/Decimal），并按 Accept-Encoding 压缩"""
+    body = json_dumps(payload)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        if BROTLI_AVAILABLE and request.accept_encodings["br"]:
+            body = brotli.compress(body, quality=4)
+            headers["Content-Encoding"] = "br"
+        elif request.accept_encodings["gzip"]:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, status=status, mimetype="application/json", headers=headers)
+
+
+def _store_summary(query_id: str, info: dict):
+    """总结执行器的回调：写回总结状态"""
+    query_store.put(SUMMARIES, query_id, info)
+
+
+def _last_polled(query_id: str):
+    """查询ID最近一次被轮询总结的时间，用于取消无人等待的总结任务"""
+    return (query_store.get(POLLS, query_id) or {}).get("polled_at")
+
+
+def _create_summary_executor() -> SummaryExecutor:
+    executor = SummaryExecutor(
+        summarize=service.summarizer.summarize,
+        on_result=_store_summary,
+        last_polled=_last_polled,
+        workers=params.summary_workers,
+        queue_size=params.summary_queue_size,
+        yield_threshold=params.summary_yield_threshold,
+        max_defer=params.summary_max_defer,
+        abandon_after=params.summary_abandon_after,
+    )
+    executor.start()
+    return executor
+
+
+def _current_user() -> dict:
+    """当前请求的用户身份 {"user_id", "roles", "anonymous"}；未登录时按客户端地址区分"""
+    token = request.cookies.get(SESSION_COOKIE)
+    user = query_store.get(SESSIONS, token) if token else None
+    if user is None:
+        return {"user_id": f"anonymous:{request.remote_addr or 'unknown'}", "session_id": None, "roles": [],
+                "anonymous": True}
+    if time.time() - user.get("seen_at", 0) > SESSION_REFRESH:
+        user = {**user, "seen_at": time.time()}
+        query_store.put(SESSIONS, token, user)
+    return user
+
+
+def _verify_portal_signature():
+    """
+    校验 /api/receive_roles 的门户签名，通过时返回 None，否则返回错误信息
+
+    门户用共享密钥（--portal_secret）对 "<X-Portal-Timestamp>.<请求体>" 计算 HMAC-SHA256，
+    十六进制结果放在 X-Portal-Signature 请求头；时间戳超过 --portal_signature_max_age 秒的请求拒绝，限制重放。
+    """
+    if not params.portal_secret:
+        return "未配置门户签名密钥（--portal_secret 或环境变量 AI2SQL_PORTAL_SECRET），拒绝建立会话"
+    timestamp = request.headers.get("X-Portal-Timestamp", "")
+    signature = request.headers.get("X-Portal-Signature", "")
     try:
-        summary_dict = service.summarizer.summarize(question, sql, rows)
-        query_summaries[query_id] = {
-            "status": "done",
-            "summary": summary_dict,
-            "error": None,
-        }
-    except Exception as e:
-        query_summaries[query_id] = {
+        age = abs(time.time() - float(timestamp))
+    except ValueError:
+        return "缺少或非法的 X-Portal-Timestamp"
+    if age > params.portal_signature_max_age:
+        return "门户签名已过期"
+    expected = hmac.new(params.portal_secret.encode("utf-8"), f"{timestamp}.".encode("utf-8") + request.get_data(),
+                        hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature):
+        return "门户签名校验失败"
+    return None
+
+
+def _role_key(user: dict):
+    """用于请求合并的角色键：角色集合相同的用户可见数据相同"""
+    return ",".join(sorted(user.get("roles") or [])) or None
+
+
+def _request_lane(data: dict) -> str:
+    """请求通道：测试页批量执行等标记为 batch（请求头 X-Query-Lane 或请求体 lane），其余为交互式"""
+    lane = request.headers.get("X-Query-Lane") or (data or {}).get("lane")
+    return BATCH if lane == BATCH else INTERACTIVE
+
+
+def _overloaded(e: AdmissionRejected):
+    """准入被拒：快速返回 429，Retry-After 为建议的重试间隔（秒）"""
+    response = jsonify({
+        "success": False,
+        "error": str(e),
+        "reason": e.reason,
+        "retry_after": e.retry_after,
+    })
+    response.status_code = 429
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def _create_admission() -> AdmissionController:
+    return AdmissionController(
+        max_concurrent=params.max_concurrent_queries,
+        per_user=params.per_user_concurrency,
+        queue_size=params.admission_queue_size,
+        queue_timeout=params.admission_queue_timeout,
+        batch_max_concurrent=params.batch_max_concurrency,
+    )
+
+
+def _run_query(question: str, role=None, on_event=None):
+    """
+    执行查询（收集日志，带整体重试机制），跳过总结生成以加快首屏返回，返回 (结果, 是否共享结果)
+
+    当本次查询出现错误（包括SQL未通过校验等）时，会自动重新调用大模型，最多尝试3次；
+    同一时刻相同的问题（同一角色）只执行一次，后到的请求共享结果（不会收到阶段事件）；
+    SQL生成期间总结任务为其让路。
+    """
+    with summary_executor.foreground():
+        result, shared = query_flight.do(
+            coalesce_key(question, role),
+            lambda: service.query_with_retries(question, collect_logs=True, skip_summary=True, on_event=on_event),
+        )
+    metrics.record_cache("singleflight", shared)
+    if not shared:
+        template_id = (result.get("template_info") or {}).get("template_id")
+        mode = "none" if not template_id else ("free" if template_id == "free" else "template")
+        metrics.QUESTIONS_TOTAL.inc(mode=mode, success=bool(result.get("success")))
+        metrics.LLM_CALLS_PER_QUESTION.observe(result.get("llm_calls", 0))
+        metrics.RESULT_ROWS.observe(len(result.get("rows") or []))
+    if shared:
+        logger.info(f"[请求合并] 复用进行中的相同查询结果：{question}（累计节省 {query_flight.stats()['shared']} 次）")
+    return result, shared
+
+
+def _save_query(query_id: str, question: str, result: dict, shared: bool, user: dict = None):
+    """保存查询日志、结果与查询历史，成功时提交总结任务，返回初始总结状态（查询失败时为 None）"""
+    query_store.put(LOGS, query_id, {
+        "question": question,
+        "timestamp": datetime.now().isoformat(),
+        "logs": result.get("logs", []),
+        "template_info": result.get("template_info"),
+        "sql": result.get("sql"),
+        "success": result.get("success"),
+        "error": result.get("error"),
+        "attempts": result.get("attempts", 1),
+        "shared": shared,
+    })
+    # 查询历史只入队，由后台线程批量写入；shared 表示复用了并发相同问题的结果
+    user = user or {}
+    if not history_store.record(query_id, result, user_id=user.get("user_id"),
+                                session_id=user.get("session_id"), shared=shared):
+        logger.warning(f"查询历史写入队列已满，丢弃记录 {query_id}")
+
+    if not result.get("success"):
+        return None
+    # 缓存查询结果，并异步生成总结
+    sql = result.get("sql", "")
+    rows = result.get("rows") or []
+    query_store.put_rows(query_id, rows)
+    query_store.put(RESULTS, query_id, {
+        "question": question,
+        "sql": sql,
+        "total_rows": len(rows),
+    })
+    # 初始化总结状态为 pending
+    summary_info = {
+        "status": "pending",
+        "summary": EMPTY_SUMMARY,
+        "error": None,
+    }
+    query_store.put(SUMMARIES, query_id, summary_info)
+    # 提交到总结执行器，队列已满时不生成总结
+    if not summary_executor.submit(query_id, question, sql, rows):
+        summary_info = {
             "status": "error",
-            "summary": {"summaryContent": "", "keyInfo": "", "recordOverview": "", "charts": []},
-            "error": str(e),
+            "summary": EMPTY_SUMMARY,
+            "error": "总结服务繁忙，本次查询未生成总结",
         }
+        query_store.put(SUMMARIES, query_id, summary_info)
+    return summary_info
 
-# 尝试初始化语音识别服务（可选）
-speech_service = None
-try:
-    # 如果配置了模型路径，可以在这里初始化
-    # 注意：需要根据实际环境修改模型路径
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    default_model_dir = os.path.join(base_dir, "model", "SenseVoiceSmall")
-    default_vad_model = os.path.join(base_dir, "model", "speech_fsmn_vad_zh-cn-16k-common-pytorch")
 
-    model_dir = os.getenv('FUNASR_MODEL_DIR', default_model_dir if os.path.exists(default_model_dir) else None)
-    vad_model = os.getenv('FUNASR_VAD_MODEL', default_vad_model if os.path.exists(default_vad_model) else None)
-    # 设备选择：环境变量优先；若未指定，则根据 torch 能力自动选择
+def _stt_device() -> str:
+    """语音模型的计算设备：环境变量优先；若未指定，则根据 torch 能力自动选择"""
     env_device = os.getenv('FUNASR_DEVICE')
     if env_device:
-        device = env_device
-    else:
-        try:
-            import torch  # noqa: WPS433
+        return env_device
+    try:
+        import torch  # noqa: WPS433
 
-            device = "cuda:0" if torch.cuda.is_available() else "cpu"
-        except Exception:
-            device = "cpu"
+        return "cuda:0" if torch.cuda.is_available() else "cpu"
+    except Exception:
+        return "cpu"
 
-    if model_dir and vad_model:
-        from voice.stt_service import get_stt_service
-        speech_service = get_stt_service(model_dir, vad_model, device=device)
-        if speech_service.is_available():
-            logger.info(f"语音识别服务已初始化，模型: {model_dir}, VAD: {vad_model}, 设备: {device}")
-        else:
-            logger.warning("语音识别服务初始化失败，请检查模型路径或依赖")
-    else:
+
+def _init_speech_service():
+    """尝试初始化语音识别服务（可选），不可用时返回 None"""
+    try:
+        # 如果配置了模型路径，可以在这里初始化
+        # 注意：需要根据实际环境修改模型路径
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        default_model_dir = os.path.join(base_dir, "model", "SenseVoiceSmall")
+        default_vad_model = os.path.join(base_dir, "model", "speech_fsmn_vad_zh-cn-16k-common-pytorch")
+
+        model_dir = os.getenv('FUNASR_MODEL_DIR', default_model_dir if os.path.exists(default_model_dir) else None)
+        vad_model = os.getenv('FUNASR_VAD_MODEL', default_vad_model if os.path.exists(default_vad_model) else None)
+        device = _stt_device()
+
+        if model_dir and vad_model:
+            from voice.stt_service import get_stt_service
+            # 预热放在 worker 进程的识别线程中做（STTBatchWorker），master 进程中不运行推理，
+            # 避免 torch 的 OpenMP 线程池在 fork 前被初始化
+            stt = get_stt_service(model_dir, vad_model, device=device, quantize=params.stt_quantize)
+            if stt.is_available():
+                logger.info(f"语音识别服务已初始化，模型: {model_dir}, VAD: {vad_model}, 设备: {device}, "
+                            f"量化: {stt.quantize}, 加载 {stt.load_seconds:.1f}s")
+            else:
+                logger.warning("语音识别服务初始化失败，请检查模型路径或依赖")
+            return stt
         logger.info("未配置 FunASR 模型路径，将使用浏览器原生语音识别")
-except Exception as e:
-    logger.error(f"语音识别服务初始化失败: {e}")
-    speech_service = None
+    except Exception as e:
+        logger.error(f"语音识别服务初始化失败: {e}")
+    return None
+
+
+def _create_stt_worker():
+    if speech_service is None or not speech_service.is_available():
+        return None
+    from voice.stt_batcher import STTBatchWorker
+    worker = STTBatchWorker(
+        speech_service,
+        max_wait_ms=params.stt_batch_max_wait_ms,
+        max_batch_seconds=params.stt_batch_max_seconds,
+        max_batch_size=params.stt_batch_max_size,
+        queue_size=params.stt_queue_size,
+        num_threads=params.stt_num_threads,
+        warmup_runs=params.stt_warmup_runs,
+    )
+    return worker
+
+
+def _init_streaming_stt():
+    """尝试初始化流式语音识别（可选）：需要 flask-sock 与流式模型（FUNASR_STREAMING_MODEL），不可用时返回 None"""
+    if not FLASK_SOCK_AVAILABLE:
+        logger.info("未安装 flask-sock，不提供实时语音识别")
+        return None
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    default_model_dir = os.path.join(base_dir, "model", "paraformer-zh-streaming")
+    model_dir = os.getenv('FUNASR_STREAMING_MODEL',
+                          default_model_dir if os.path.exists(default_model_dir) else None)
+    if not model_dir:
+        logger.info("未配置流式识别模型路径，不提供实时语音识别")
+        return None
+    try:
+        from voice.streaming_stt import StreamingSTTService
+        stt = StreamingSTTService(
+            model_dir,
+            device=_stt_device(),
+            replicas=params.stt_stream_replicas,
+            max_streams=params.stt_stream_max_streams,
+            chunk_ms=params.stt_stream_chunk_ms,
+        )
+        return stt if stt.is_available() else None
+    except Exception as e:
+        logger.error(f"流式语音识别初始化失败: {e}")
+    return None
+
+
+def _load_speech_models():
+    """加载语音识别模型（耗时数秒到数十秒），完成后更新 model_status"""
+    global speech_service, stt_worker, streaming_stt
+    start = time.perf_counter()
+    model_status.update(speech="loading", streaming_speech="loading")
+    speech_service = _init_speech_service()
+    worker = _create_stt_worker()
+    if worker is not None and not _preload_master:
+        worker.start()
+    stt_worker = worker
+    model_status["speech"] = "ready" if worker is not None else "unavailable"
+    streaming_stt = _init_streaming_stt()
+    model_status["streaming_speech"] = "ready" if streaming_stt is not None else "unavailable"
+    logger.info(f"语音模型加载完成，耗时 {time.perf_counter() - start:.1f}s: {model_status}")
+
+
+def _start_model_loading():
+    """
+    按 --model_load 加载语音模型：
+        sync       在 create_app() 中同步加载（preload 时 worker 通过 fork 共享，重启 worker 无需重新加载）
+        background 后台线程加载，应用立即可以处理查询，/api/ready 在加载完成前返回 503
+        auto       preload 时 sync，否则 background
+    """
+    global _model_loader
+    mode = params.model_load
+    if mode == "auto":
+        mode = "sync" if _preload_master else "background"
+    if mode == "background":
+        _model_loader = Thread(target=_load_speech_models, name="model-loader", daemon=True)
+        _model_loader.start()
+    else:
+        _load_speech_models()
+
+
+def create_app() -> Flask:
+    """
+    应用工厂：完成进程级初始化并返回 Flask 应用
+
+    gunicorn 以 preload_app 方式启动时在 master 进程中只执行一次，
+    语音模型等大对象随 fork 以写时复制方式被各 worker 共享；
+    数据库连接、HTTP 会话与后台线程不能跨进程共享，由 reinit_after_fork() 在 worker 中重建。
+    """
+    global service, query_store, summary_executor, admission, history_store
+    if service is None:
+        service = AI2SQLService()
+        query_store = create_query_store(params)
+        summary_executor = _create_summary_executor()
+        admission = _create_admission()
+        history_store = HistoryStore(params.query_history_path, batch_size=params.history_batch_size,
+                                     flush_interval=params.history_flush_interval)
+        _register_gauges()
+        if params.metrics_dir:
+            metrics.registry.enable_multiprocess(params.metrics_dir)
+        _start_model_loading()
+    return app
+
+
+def _register_gauges():
+    """注册采集时计算的仪表：连接池与总结队列状态"""
+    def pool_connections():
+        stats = service.database.pool_stats()
+        return {("idle",): stats["idle"], ("in_use",): stats["in_use"]}
+
+    def pool_utilization():
+        stats = service.database.pool_stats()
+        return stats["in_use"] / stats["size"] if stats["size"] else 0.0
+
+    metrics.DB_POOL_CONNECTIONS.set_function(pool_connections)
+    metrics.DB_POOL_UTILIZATION.set_function(pool_utilization)
+    metrics.SUMMARY_QUEUE_DEPTH.set_function(lambda: summary_executor.stats()["queue_depth"])
+    metrics.SUMMARY_RUNNING.set_function(lambda: summary_executor.stats()["running"])
+    metrics.ADMISSION_ACTIVE.set_function(
+        lambda: {(lane,): count for lane, count in admission.stats()["active"].items()})
+    metrics.STT_STREAMS_ACTIVE.set_function(
+        lambda: streaming_stt.stats()["active_streams"] if streaming_stt is not None else 0)
+    metrics.STT_QUEUE_DEPTH.set_function(
+        lambda: stt_worker.stats()["queue_depth"] if stt_worker is not None else 0)
+    metrics.ADMISSION_WAITING.set_function(
+        lambda: {(lane,): count for lane, count in admission.stats()["waiting"].items()})
+
+
+def reinit_after_fork():
+    """worker fork 后重建进程私有资源（由 gunicorn.conf.py 的 post_fork 钩子调用）"""
+    global _preload_master
+    _preload_master = False
+    if log_pipeline is not None:
+        log_pipeline.restart_after_fork()
+    metrics.registry.reset_after_fork()
+    if service is not None:
+        service.reinit_after_fork()
+    if query_store is not None:
+        query_store.reset_after_fork()
+    if summary_executor is not None:
+        summary_executor.restart_after_fork()
+    if admission is not None:
+        admission.reset_after_fork()
+    if history_store is not None:
+        history_store.reset_after_fork()
+    if "loading" in model_status.values():
+        # fork 时 master 中的模型仍在加载：加载线程不会随 fork 复制，在 worker 中重新加载
+        _start_model_loading()
+    elif stt_worker is not None:
+        stt_worker.restart_after_fork()
+
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """就绪探针：服务已初始化且语音模型不在加载中时返回 200，否则返回 503（负载均衡据此决定是否转发流量）"""
+    loading = [name for name, status in model_status.items() if status in ("pending", "loading")]
+    is_ready = service is not None and not loading
+    return jsonify({"ready": is_ready, "components": model_status}), 200 if is_ready else 503
+
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    """记录请求耗时与响应体积（流式响应在返回响应头时记录，即首字节耗时）"""
+    start = g.get("request_start")
+    if start is not None and request.endpoint != "metrics_endpoint":
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint,
+                                        method=request.method, status=response.status_code)
+        if not response.is_streamed and response.content_length is not None:
+            metrics.RESPONSE_BYTES.observe(response.content_length, endpoint=endpoint)
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 指标"""
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.route('/')
@@ -127,56 +580,34 @@ def query():
         
         # 生成查询ID
         query_id = str(uuid.uuid4())
-        
-        # 调用服务查询（收集日志，带整体重试机制），此处跳过总结生成，加快首屏返回
-        # 当本次查询出现错误（包括SQL未通过校验等）时，会自动重新调用大模型，最多尝试3次
-        result = service.query_with_retries(question, collect_logs=True, skip_summary=True)
-        
-        # 存储日志
-        query_logs[query_id] = {
-            "question": question,
-            "timestamp": datetime.now().isoformat(),
-            "logs": result.get("logs", []),
-            "template_info": result.get("template_info"),
-            "sql": result.get("sql"),
-            "success": result.get("success"),
-            "error": result.get("error"),
-            "attempts": result.get("attempts", 1),
-        }
 
-        # 如果本次查询成功，缓存查询结果，并异步生成总结
-        if result.get("success"):
-            sql = result.get("sql", "")
-            rows = result.get("rows", [])
-            query_results[query_id] = {
-                "question": question,
-                "sql": sql,
-                "rows": rows,
-            }
-            # 初始化总结状态为 pending
-            query_summaries[query_id] = {
-                "status": "pending",
-                "summary": {"summaryContent": "", "keyInfo": "", "recordOverview": "", "charts": []},
-                "error": None,
-            }
-            # 启动后台线程生成总结
-            worker = Thread(target=_run_summary_async, args=(query_id, question, sql, rows), daemon=True)
-            worker.start()
-        
+        user = _current_user()
+        try:
+            ticket = admission.acquire(user["user_id"], _request_lane(data))
+        except AdmissionRejected as e:
+            return _overloaded(e)
+        try:
+            result, shared = _run_query(question, _role_key(user))
+        finally:
+            admission.release(ticket)
+        summary_info = _save_query(query_id, question, result, shared, user)
+        rows = result.get("rows") or []
+
         # 返回结果（包含查询ID用于后续查看日志）
         # 此处 summary 仅返回占位结构，真实总结通过 /api/query-summary 轮询获取
-        return jsonify({
+        # rows 仅包含第一页，其余行通过 /api/query/<query_id>/rows 分页获取；format=columnar 时为列式格式
+        first_page = _rows_page(rows[:ROWS_PAGE_SIZE], 0, len(rows))
+        columnar = _wants_columnar(data)
+        return _json_response({
             "success": result["success"],
             "question": result["question"],
             "sql": result["sql"],
-            "rows": result["rows"],
-            "summary": query_summaries.get(query_id, {}).get("summary", {
-                "summaryContent": "",
-                "keyInfo": "",
-                "recordOverview": "",
-                "charts": [],
-            }),
-            "summary_status": query_summaries.get(query_id, {}).get("status", "pending"),
+            "rows": _format_rows(first_page["rows"], columnar),
+            "rows_format": "columnar" if columnar else "records",
+            "total_rows": first_page["total_rows"],
+            "next_cursor": first_page["next_cursor"],
+            "summary": (summary_info or {}).get("summary", EMPTY_SUMMARY),
+            "summary_status": (summary_info or {}).get("status", "pending"),
             "error": result.get("error"),
             "query_id": query_id,
             "template_info": result.get("template_info"),
@@ -190,14 +621,171 @@ def query():
         }), 500
 
 
+def _ndjson(event: str, data: dict) -> bytes:
+    """序列化为一行 NDJSON 事件"""
+    return json_dumps({"event": event, **data}) + b"\n"
+
+
+def _stream_summary(query_id: str):
+    """等待总结生成完成，按字段分块推送（summary 事件），最后推送 summary_done"""
+    deadline = time.monotonic() + STREAM_SUMMARY_TIMEOUT
+    finished = False
+    while True:
+        info = query_store.get(SUMMARIES, query_id)
+        if info is None:
+            yield _ndjson("summary_done", {"status": "not_found", "error": "查询ID不存在或已过期"})
+            return
+        if info["status"] != "pending":
+            break
+        remaining = deadline - time.monotonic()
+        if finished is None or remaining <= 0:
+            # 超时或任务不在本进程：前端改为轮询 /api/query-summary
+            yield _ndjson("summary_done", {"status": "pending", "error": None})
+            return
+        # 流式连接保持期间视为客户端仍在等待总结
+        query_store.put(POLLS, query_id, {"polled_at": time.time()})
+        finished = summary_executor.wait(query_id, timeout=min(remaining, STREAM_SUMMARY_HEARTBEAT))
+
+    summary = info.get("summary") or EMPTY_SUMMARY
+    for field in ("summaryContent", "keyInfo", "recordOverview", "charts"):
+        if summary.get(field):
+            yield _ndjson("summary", {"field": field, "value": summary[field]})
+    yield _ndjson("summary_done", {"status": info["status"], "error": info.get("error")})
+
+
+@app.route('/api/query/stream', methods=['POST'])
+def query_stream():
+    """
+    流式查询API：以 NDJSON（每行一个JSON事件）在各阶段完成时即时推送
+
+    事件顺序：query → attempt / template / sql / validation（可能随重试出现多轮）→ result
+             → rows（按批）→ rows_done → summary（按字段）→ summary_done → end；
+    服务端异常时推送 error 后结束。
+    """
+    data = request.json or {}
+    question = (data.get('question') or '').strip()
+    if not question:
+        return jsonify({
+            "success": False,
+            "error": "问题不能为空"
+        }), 400
+
+    user = _current_user()
+    # 准入在返回响应头之前完成，以便过载时直接返回 429；名额由执行线程在查询结束后交还
+    try:
+        ticket = admission.acquire(user["user_id"], _request_lane(data))
+    except AdmissionRejected as e:
+        return _overloaded(e)
+
+    query_id = str(uuid.uuid4())
+    role = _role_key(user)
+    columnar = _wants_columnar(data)
+    events: queue.Queue = queue.Queue()
+
+    def run():
+        # 查询在独立线程中执行，阶段事件经队列交给响应生成器；客户端断开后查询仍会完成并保存结果
+        try:
+            try:
+                result, shared = _run_query(question, role,
+                                            on_event=lambda event, payload: events.put((event, payload)))
+            finally:
+                admission.release(ticket)
+            _save_query(query_id, question, result, shared, user)
+            events.put((None, result))
+        except Exception as e:
+            events.put(("error", {"error": f"服务器错误: {str(e)}"}))
+
+    def generate():
+        yield _ndjson("query", {"query_id": query_id, "question": question})
+        while True:
+            event, payload = events.get()
+            if event is None:
+                break
+            yield _ndjson(event, payload)
+            if event == "error":
+                return
+
+        result = payload
+        rows = result.get("rows") or []
+        yield _ndjson("result", {
+            "success": result.get("success"),
+            "sql": result.get("sql"),
+            "error": result.get("error"),
+            "template_info": result.get("template_info"),
+            "attempts": result.get("attempts", 1),
+            "total_rows": len(rows),
+        })
+        if not result.get("success"):
+            yield _ndjson("end", {})
+            return
+
+        streamed = rows[:ROWS_PAGE_SIZE_MAX]
+        for offset in range(0, len(streamed), ROWS_PAGE_SIZE):
+            batch = streamed[offset:offset + ROWS_PAGE_SIZE]
+            yield _ndjson("rows", {"offset": offset, "rows": _format_rows(batch, columnar)})
+        page = _rows_page(streamed, 0, len(rows))
+        yield _ndjson("rows_done", {"total_rows": page["total_rows"], "next_cursor": page["next_cursor"]})
+
+        yield from _stream_summary(query_id)
+        yield _ndjson("end", {})
+
+    Thread(target=run, daemon=True).start()
+    return Response(generate(), mimetype="application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/query/<query_id>/rows', methods=['GET'])
+def get_query_rows(query_id):
+    """分页获取查询结果行（cursor 为上一页返回的 next_cursor，limit 为每页行数，format=columnar 返回列式格式）"""
+    try:
+        info = query_store.get(RESULTS, query_id)
+        metrics.record_cache("query_store", info is not None)
+        if info is None:
+            return jsonify({
+                "success": False,
+                "error": "查询ID不存在或已过期"
+            }), 404
+
+        try:
+            cursor = int(request.args.get('cursor') or 0)
+            limit = int(request.args.get('limit') or ROWS_PAGE_SIZE)
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "cursor 和 limit 必须是整数"
+            }), 400
+        if cursor < 0 or limit <= 0:
+            return jsonify({
+                "success": False,
+                "error": "cursor 不能为负数，limit 必须大于0"
+            }), 400
+
+        rows = query_store.get_rows(query_id, cursor, cursor + min(limit, ROWS_PAGE_SIZE_MAX))
+        if rows is None:
+            return jsonify({
+                "success": False,
+                "error": "查询ID不存在或已过期"
+            }), 404
+        page = _rows_page(rows, cursor, info["total_rows"])
+        page["rows"] = _format_rows(page["rows"], _wants_columnar())
+        return _json_response({"success": True, **page})
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"获取查询结果失败: {str(e)}"
+        }), 500
+
+
 @app.route('/api/query-logs/<query_id>', methods=['GET'])
 def get_query_logs(query_id):
     """获取查询日志API"""
     try:
-        if query_id in query_logs:
+        logs = query_store.get(LOGS, query_id)
+        metrics.record_cache("query_store", logs is not None)
+        if logs is not None:
             return jsonify({
                 "success": True,
-                "logs": query_logs[query_id]
+                "logs": logs
             })
         else:
             return jsonify({
@@ -215,19 +803,22 @@ def get_query_logs(query_id):
 def get_query_summary(query_id):
     """获取指定查询的总结结果（异步轮询）"""
     try:
-        if query_id not in query_summaries:
+        info = query_store.get(SUMMARIES, query_id)
+        metrics.record_cache("query_store", info is not None)
+        if info is not None and info["status"] == "pending":
+            query_store.put(POLLS, query_id, {"polled_at": time.time()})
+        if info is None:
             return jsonify({
                 "success": False,
                 "status": "not_found",
                 "error": "查询ID不存在或已过期",
-                "summary": {"summaryContent": "", "keyInfo": "", "recordOverview": "", "charts": []},
+                "summary": EMPTY_SUMMARY,
             }), 404
 
-        info = query_summaries[query_id]
         return jsonify({
             "success": info["status"] == "done",
             "status": info["status"],
-            "summary": info.get("summary", {"summaryContent": "", "keyInfo": "", "recordOverview": "", "charts": []}),
+            "summary": info.get("summary", EMPTY_SUMMARY),
             "error": info.get("error"),
         })
     except Exception as e:
@@ -235,103 +826,208 @@ def get_query_summary(query_id):
             "success": False,
             "status": "error",
             "error": f"获取总结失败: {str(e)}",
-            "summary": {"summaryContent": "", "keyInfo": "", "recordOverview": "", "charts": []},
+            "summary": EMPTY_SUMMARY,
+        }), 500
+
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """
+    当前用户的查询历史：q 非空时按问题全文检索，否则按时间倒序分页（before 为上一页最后一条的 created_at）
+    未登录用户不提供历史（匿名身份只用于并发配额）
+    """
+    try:
+        user = _current_user()
+        if user.get("anonymous"):
+            return jsonify({
+                "success": False,
+                "error": "请先登录后查看查询历史"
+            }), 401
+        try:
+            limit = min(int(request.args.get('limit') or 20), 100)
+            before = float(request.args['before']) if request.args.get('before') else None
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "limit 和 before 必须是数字"
+            }), 400
+        text = (request.args.get('q') or '').strip()
+        if text:
+            records = history_store.search(text, user_id=user["user_id"], limit=limit)
+        else:
+            records = history_store.recent(user_id=user["user_id"], limit=limit, before=before)
+        return jsonify({
+            "success": True,
+            "history": [
+                {key: record[key] for key in ("query_id", "created_at", "question", "sql",
+                                              "template_id", "success", "row_count")}
+                for record in records
+            ],
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"获取查询历史失败: {str(e)}"
         }), 500
 
 
 @app.route('/api/receive_roles', methods=['POST'])
-def get_login_roles(quest: dict):
+def get_login_roles():
+    """
+    接收登录用户身份与角色（由门户在用户登录后调用）
 
-    pass
+    请求体：{"user_id": str, "user_name": str（可选）, "roles": [str]}
+    请求需带门户签名（X-Portal-Timestamp / X-Portal-Signature，见 _verify_portal_signature），
+    否则任何客户端都能伪造 user_id 绕过每用户配额，或自选 roles 读取其他角色合并的结果。
+    建立会话并返回一次性登录地址 login_url（门户调用是服务端对服务端，Cookie 到不了浏览器），
+    门户将用户浏览器重定向到该地址，由 /api/login 下发会话 Cookie；
+    之后的查询按该用户计入并发配额，按角色集合合并相同问题。
+    """
+    try:
+        error = _verify_portal_signature()
+        if error:
+            logger.warning(f"[登录] 拒绝 /api/receive_roles 请求: {error}")
+            return jsonify({
+                "success": False,
+                "error": error
+            }), 403
+        data = request.get_json(silent=True) or {}
+        user_id = str(data.get('user_id') or '').strip()
+        roles = data.get('roles') or []
+        if isinstance(roles, str):
+            roles = [roles]
+        if not user_id or not isinstance(roles, list):
+            return jsonify({
+                "success": False,
+                "error": "user_id 不能为空，roles 必须是角色列表"
+            }), 400
+
+        token = uuid.uuid4().hex
+        user = {
+            "user_id": user_id,
+            "session_id": uuid.uuid4().hex[:16],
+            "user_name": data.get('user_name'),
+            "roles": sorted({str(role) for role in roles}),
+            "seen_at": time.time(),
+        }
+        query_store.put(SESSIONS, token, user)
+        ticket = uuid.uuid4().hex
+        query_store.put(LOGIN_TICKETS, ticket, {"token": token, "expires_at": time.time() + LOGIN_TICKET_TTL})
+        return jsonify({
+            "success": True,
+            "user_id": user_id,
+            "roles": user["roles"],
+            "login_url": f"/api/login?ticket={ticket}",
+            "expires_in": LOGIN_TICKET_TTL,
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"接收角色信息失败: {str(e)}"
+        }), 500
+
+
+@app.route('/api/login', methods=['GET'])
+def login():
+    """
+    浏览器登录：用 /api/receive_roles 返回的一次性票据换取会话 Cookie，并重定向到首页
+    """
+    ticket = request.args.get("ticket", "")
+    entry = query_store.get(LOGIN_TICKETS, ticket) if ticket else None
+    if entry is None or entry.get("used") or time.time() > entry.get("expires_at", 0):
+        return jsonify({
+            "success": False,
+            "error": "登录票据无效或已过期，请从门户重新进入"
+        }), 403
+    # 标记为已使用，票据不能重放
+    query_store.put(LOGIN_TICKETS, ticket, {**entry, "used": True})
+    response = redirect("/")
+    response.set_cookie(SESSION_COOKIE, entry["token"], httponly=True, samesite="Lax")
+    return response
 
 
 @app.route('/api/speech-recognize', methods=['POST'])
 def speech_recognize():
     """语音识别API接口（使用后端FunASR模型）"""
-    if not speech_service or not speech_service.is_available():
+    if stt_worker is None and model_status["speech"] in ("pending", "loading"):
+        response = jsonify({"success": False, "error": "语音识别模型加载中，请稍后重试"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    if stt_worker is None:
         return jsonify({
             "success": False,
             "error": "后端语音识别服务不可用，请使用浏览器原生语音识别"
         }), 503
     
     try:
-        # 检查是否有文件上传
-        if 'audio' not in request.files:
+        # 音频可以直接作为请求体上传（Content-Type: audio/*，不经过 multipart 解析），也可以作为表单文件 audio 上传
+        if request.mimetype.startswith('audio/'):
+            data = request.get_data()
+        elif 'audio' in request.files and request.files['audio'].filename != '':
+            data = request.files['audio'].read()
+        else:
             return jsonify({
                 "success": False,
                 "error": "未找到音频文件"
             }), 400
-        
-        audio_file = request.files['audio']
-        
-        if audio_file.filename == '':
+
+        # 在内存中解码并重采样为 16k 单声道数组，直接交给模型（不落临时文件、不启动 ffmpeg 进程）
+        try:
+            with metrics.STT_DECODE_SECONDS.time():
+                audio, method = decode_audio(data)
+        except AudioDecodeError as e:
             return jsonify({
                 "success": False,
-                "error": "音频文件为空"
-            }), 400
-        
-        # 保存临时文件，接受 wav/webm 等，非 wav 尝试转成 16k 单声道 wav
-        original_suffix = (os.path.splitext(audio_file.filename)[1] or '.wav').lower()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=original_suffix) as tmp_file:
-            audio_file.save(tmp_file.name)
-            tmp_path = tmp_file.name
-
-        converted_path = None
-        # 如果不是 wav，使用 ffmpeg 转码为 16k 单声道 wav
-        if original_suffix != '.wav':
-            try:
-                import subprocess
-
-                fd, converted_path = tempfile.mkstemp(suffix='.wav')
-                os.close(fd)
-
-                # 使用 ffmpeg 转码，要求系统 PATH 中已经配置好 ffmpeg
-                # -ar 16000: 采样率 16k
-                # -ac 1: 单声道
-                cmd = [
-                    "ffmpeg",
-                    "-y",              # 覆盖输出文件
-                    "-i", tmp_path,    # 输入文件
-                    "-ar", "16000",    # 目标采样率
-                    "-ac", "1",        # 单声道
-                    converted_path,
-                ]
-                subprocess.run(
-                    cmd,
-                    check=True,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
-                use_path = converted_path
-            except Exception as conv_err:
-                logger.warning(f"音频转码失败，将直接使用原文件: {conv_err}")
-                use_path = tmp_path
-        else:
-            use_path = tmp_path
-        
-        try:
-            # 进行语音识别
-            text = speech_service.recognize(use_path)
-            
-            if text:
-                return jsonify({
-                    "success": True,
-                    "text": text
-                })
-            else:
+                "error": str(e)
+            }), 415
+
+        # 裁掉首尾静音、压缩长停顿并限制时长，整段无语音时不调用识别模型
+        metrics.STT_AUDIO_SECONDS.inc(len(audio) / 16000, stage="received")
+        if params.stt_trim == "energy":
+            with metrics.STT_TRIM_SECONDS.time():
+                trim = trim_silence(audio, pad_ms=params.stt_trim_pad_ms, max_pause_ms=params.stt_max_pause_ms,
+                                    max_seconds=params.stt_max_utterance_seconds)
+            logger.debug(f"[语音识别] 音频 {trim.original_seconds:.1f}s -> {trim.seconds:.1f}s（开头 "
+                         f"{trim.leading_seconds:.1f}s，结尾 {trim.trailing_seconds:.1f}s，停顿 {trim.pause_seconds:.1f}s，"
+                         f"截断 {trim.truncated_seconds:.1f}s）")
+            if not trim.has_speech:
                 return jsonify({
                     "success": False,
-                    "error": "未能识别出语音内容"
+                    "error": "未检测到语音，请靠近麦克风重新录制"
                 }), 400
-        finally:
-            # 清理临时文件
-            for p in [tmp_path, converted_path] if 'converted_path' in locals() else [tmp_path]:
-                if p:
-                    try:
-                        os.unlink(p)
-                    except Exception:
-                        pass
-    
+            audio = trim.audio
+        elif params.stt_max_utterance_seconds:
+            audio = audio[:int(params.stt_max_utterance_seconds * 16000)]
+        metrics.STT_AUDIO_SECONDS.inc(len(audio) / 16000, stage="recognized")
+
+        # 交给识别工作线程（与其他并发请求合并成批）并等待结果
+        try:
+            future = stt_worker.submit(audio)
+        except STTBusy as e:
+            response = jsonify({"success": False, "error": str(e)})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+        try:
+            text = future.result(timeout=params.stt_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            return jsonify({
+                "success": False,
+                "error": "语音识别超时，请稍后重试"
+            }), 504
+        logger.debug(f"[语音识别] 音频 {len(audio) / 16000:.1f}s，解码方式 {method}")
+
+        if text:
+            return jsonify({
+                "success": True,
+                "text": text
+            })
+        else:
+            return jsonify({
+                "success": False,
+                "error": "未能识别出语音内容"
+            }), 400
+
     except Exception as e:
         return jsonify({
             "success": False,
@@ -339,6 +1035,58 @@ def speech_recognize():
         }), 500
 
 
+def _ws_send(ws, event: str, **data):
+    ws.send(json_dumps({"type": event, **data}).decode("utf-8"))
+
+
+def speech_stream(ws):
+    """
+    实时语音识别（WebSocket）
+
+    客户端：连接后发送二进制帧（16kHz 16bit 小端 单声道 PCM），结束录音时发送文本帧 {"type": "end"}
+    服务端：ready（可开始发送）→ partial（每识别出新文字时推送当前完整文本）→ final（最终文本与解码统计）；
+           不可用或并发已满时推送 error 后关闭
+    """
+    from voice.streaming_stt import SAMPLE_RATE, StreamsExhausted
+
+    if streaming_stt is None or not streaming_stt.is_available():
+        _ws_send(ws, "error", error="实时语音识别不可用，请使用录音识别")
+        return
+    try:
+        session = streaming_stt.open()
+    except StreamsExhausted as e:
+        _ws_send(ws, "error", error=str(e))
+        return
+
+    try:
+        _ws_send(ws, "ready", sample_rate=SAMPLE_RATE)
+        while True:
+            message = ws.receive(timeout=SPEECH_STREAM_IDLE_TIMEOUT)
+            if message is None:
+                _ws_send(ws, "error", error="长时间未收到音频，连接已关闭")
+                break
+            if isinstance(message, str):
+                if json.loads(message).get("type") == "end":
+                    text = session.finish()
+                    _ws_send(ws, "final", text=text, stats=session.stats())
+                    logger.info(f"[实时语音识别] {session.stats()}")
+                    break
+                continue
+            text = session.feed(message)
+            if text is not None:
+                _ws_send(ws, "partial", text=text)
+    except Exception as e:
+        # 客户端断开连接等
+        logger.info(f"[实时语音识别] 连接结束: {e}")
+    finally:
+        session.close()
+
+
+if sock is not None:
+    sock.route('/ws/speech-stream')(speech_stream)
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # 开发模式；生产环境使用 gunicorn -c gunicorn.conf.py "app:create_app()"
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
 
@@ -1,6 +1,9 @@
+import os
 import pathlib
 import logging
-import sys 
+import sys
+
+from config.structured_log import AsyncLogging
 
 env = "production"
 if env == "production":
@@ -11,24 +14,96 @@ else:
 
 work_space = pathlib.Path(__file__).parent.parent
 parser.add_argument("--work_space", type=pathlib.Path, default=work_space, help="工作目录")
+parser.add_argument("--query_history_path", type=pathlib.Path, default=work_space / "memory" / "query_history.db",
+                    help="查询历史数据库（SQLite，供历史查询接口、模板挖掘等离线工具使用）")
+parser.add_argument("--history_batch_size", type=int, default=100, help="查询历史每批写入的最大记录数")
+parser.add_argument("--history_flush_interval", type=float, default=1.0, help="查询历史攒批的最长等待时间（秒）")
+# 查询状态存储的类型与路径也可通过环境变量设置：gunicorn 不接受应用自身的命令行参数，
+# 多 worker 部署时由 gunicorn.conf.py 设置 AI2SQL_QUERY_STORE=sqlite
+parser.add_argument("--query_store", default=os.getenv("AI2SQL_QUERY_STORE", "memory"), choices=["memory", "sqlite"],
+                    help="查询状态存储：memory 为进程内存储；sqlite 供多个 worker 进程共享（环境变量 AI2SQL_QUERY_STORE）")
+parser.add_argument("--query_store_path", type=pathlib.Path,
+                    default=os.getenv("AI2SQL_QUERY_STORE_PATH", work_space / "memory" / "query_state.db"),
+                    help="sqlite 查询状态存储的数据库文件（环境变量 AI2SQL_QUERY_STORE_PATH）")
+parser.add_argument("--query_store_ttl", type=int, default=3600, help="查询日志/结果/总结的保留时间（秒）")
+parser.add_argument("--query_store_max_mb", type=int, default=256, help="查询状态存储中结果行的容量上限（MB）")
+parser.add_argument("--query_store_state_mb", type=int, default=32,
+                    help="查询状态存储中日志、总结、登录会话等其余条目的容量上限（MB），与结果行分开淘汰")
+parser.add_argument("--metrics_dir", type=pathlib.Path, default=os.getenv("AI2SQL_METRICS_DIR"),
+                    help="多进程指标快照目录（gunicorn 多 worker 时设置，/metrics 合并所有 worker 的指标）")
+parser.add_argument("--summary_workers", type=int, default=2, help="同时生成总结的线程数")
+parser.add_argument("--summary_queue_size", type=int, default=32, help="排队等待生成的总结任务上限")
+parser.add_argument("--summary_yield_threshold", type=int, default=2,
+                    help="正在进行的SQL生成请求数达到该值时，总结任务暂缓执行")
+parser.add_argument("--summary_max_defer", type=float, default=10.0, help="总结任务为SQL生成让路的最长时间（秒）")
+parser.add_argument("--summary_abandon_after", type=float, default=15.0,
+                    help="排队中的总结任务超过该时间无人轮询则取消（秒）")
+parser.add_argument("--max_concurrent_queries", type=int, default=16, help="每个进程同时执行的查询上限")
+parser.add_argument("--per_user_concurrency", type=int, default=2, help="单个用户同时进行（执行中+排队中）的查询上限")
+parser.add_argument("--batch_max_concurrency", type=int, default=4,
+                    help="批量通道（测试页批量执行等）同时执行的查询上限，为交互式请求保留空位")
+parser.add_argument("--admission_queue_size", type=int, default=32, help="等待准入的查询队列上限")
+parser.add_argument("--admission_queue_timeout", type=float, default=30.0, help="查询排队等待准入的最长时间（秒）")
+parser.add_argument("--portal_secret", default=os.getenv("AI2SQL_PORTAL_SECRET", ""),
+                    help="门户调用 /api/receive_roles 的签名密钥（环境变量 AI2SQL_PORTAL_SECRET），未配置时拒绝建立登录会话")
+parser.add_argument("--portal_signature_max_age", type=int, default=300, help="门户签名时间戳的有效期（秒）")
+parser.add_argument("--trusted_proxy_hops", type=int, default=int(os.getenv("AI2SQL_TRUSTED_PROXY_HOPS", "0")),
+                    help="应用前的可信反向代理层数（环境变量 AI2SQL_TRUSTED_PROXY_HOPS），"
+                         "大于0时按 X-Forwarded-For 取客户端地址，未登录用户按该地址计入每用户配额")
+parser.add_argument("--context_max_tokens", type=int, default=6000,
+                    help="多轮对话每轮提示词的 token 预算（系统提示词 + 摘要 + 最近消息）")
+parser.add_argument("--context_min_recent", type=int, default=4, help="多轮对话至少保留的最近消息条数")
+parser.add_argument("--context_summary_max_tokens", type=int, default=800, help="多轮对话滚动摘要的 token 上限")
+parser.add_argument("--context_max_sessions", type=int, default=1000, help="同时保留上下文的会话数上限")
+parser.add_argument("--context_ttl", type=int, default=3600, help="会话上下文空闲多久后过期（秒）")
+parser.add_argument("--agent_tool_workers", type=int, default=4, help="智能体同时执行的工具调用上限")
+parser.add_argument("--agent_step_timeout", type=float, default=30.0, help="智能体每一轮工具调用的最长等待时间（秒）")
+parser.add_argument("--agent_max_steps", type=int, default=6, help="智能体单个问题最多执行的工具调用轮数")
+parser.add_argument("--agent_tool_cache_size", type=int, default=128, help="每个会话缓存的工具调用结果数")
+parser.add_argument("--stt_stream_max_streams", type=int, default=4, help="同时进行的实时语音识别流数上限")
+parser.add_argument("--stt_stream_replicas", type=int, default=1, help="流式识别模型副本数（每个副本串行解码）")
+parser.add_argument("--stt_stream_chunk_ms", type=int, default=600, help="流式识别解码分块时长（毫秒，60的整数倍）")
+parser.add_argument("--model_load", default="auto", choices=["auto", "sync", "background"],
+                    help="语音模型加载方式：sync 启动时同步加载；background 后台加载（/api/ready 加载完成前返回503）；"
+                         "auto 在 gunicorn preload 时 sync，否则 background")
+parser.add_argument("--stt_batch_max_wait_ms", type=int, default=50,
+                    help="语音识别凑批等待时间（毫秒），越大合并越多、单次延迟越高，0 表示不等待")
+parser.add_argument("--stt_batch_max_seconds", type=float, default=60.0,
+                    help="语音识别单批音频总时长上限（秒），更长的单条音频单独识别")
+parser.add_argument("--stt_batch_max_size", type=int, default=8, help="语音识别单批条数上限，1 表示不合并")
+parser.add_argument("--stt_queue_size", type=int, default=32, help="排队等待识别的音频上限")
+parser.add_argument("--stt_num_threads", type=int, default=0, help="语音识别 torch 计算线程数，0 表示CPU核数的一半")
+parser.add_argument("--stt_quantize", default="none", choices=["none", "int8"],
+                    help="语音识别模型量化方式：none 保持 fp32；int8 全连接层动态量化（仅 CPU，推理更快、内存更小）")
+parser.add_argument("--stt_warmup_runs", type=int, default=1, help="语音识别模型加载后的预热次数，0 表示不预热")
+parser.add_argument("--stt_trim", default="energy", choices=["none", "energy"],
+                    help="识别前的静音裁剪：energy 按短时能量裁剪首尾静音、压缩长停顿；none 不处理")
+parser.add_argument("--stt_trim_pad_ms", type=int, default=300, help="静音裁剪时语音首尾保留的静音（毫秒）")
+parser.add_argument("--stt_max_pause_ms", type=int, default=1000, help="句中停顿的保留上限（毫秒），0 表示不压缩")
+parser.add_argument("--stt_max_utterance_seconds", type=float, default=60.0,
+                    help="单次上传识别的音频时长上限（秒，裁剪后超出部分截断），0 表示不限制")
+parser.add_argument("--stt_timeout", type=float, default=60.0, help="单次语音识别请求的最长等待时间（秒）")
+parser.add_argument("--log_level", default="DEBUG", choices=["DEBUG", "INFO", "WARNING", "ERROR"], help="日志级别")
+parser.add_argument("--log_format", default="text", choices=["text", "json"], help="日志输出格式：text 文本；json 每行一个JSON对象")
+parser.add_argument("--log_queue_size", type=int, default=10000, help="日志队列上限，写满时丢弃新日志（不阻塞请求）")
+parser.add_argument("--log_max_chars", type=int, default=2000, help="控制台日志中单个字段（SQL、模型输出等）的长度上限")
+parser.add_argument("--log_sample_debug", type=float, default=1.0, help="DEBUG 日志的输出比例（0~1）")
+parser.add_argument("--log_sample_info", type=float, default=1.0, help="INFO 日志的输出比例（0~1）")
 
-params = parser.parse_args()
+# 使用 parse_known_args：在 gunicorn 等宿主进程中导入时，忽略宿主自身的命令行参数
+params, _ = parser.parse_known_args()
 
-# 配置logging
+# 配置logging：请求线程只把日志记录放入队列，格式化与写出由后台线程完成（见 config/structured_log.py）
 logger = logging.getLogger('ai2sql')
-logger.setLevel(logging.DEBUG)
+logger.setLevel(getattr(logging, params.log_level))
 
+log_pipeline: AsyncLogging = None
 if not logger.handlers:
-
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
-
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+    log_pipeline = AsyncLogging(
+        logger,
+        fmt=params.log_format,
+        queue_size=params.log_queue_size,
+        max_chars=params.log_max_chars,
+        sample_rates={logging.DEBUG: params.log_sample_debug, logging.INFO: params.log_sample_info},
+        stream=sys.stdout,
     )
-    console_handler.setFormatter(formatter)
-
-    logger.addHandler(console_handler)
-
-
@@ -8,6 +8,9 @@ parser.add_argument('--db_port', default=3306, help='数据库端口')
 parser.add_argument('--db_user', default='root', help='数据库用户名')
 parser.add_argument('--db_password', default='violet', help='数据库密码')
 parser.add_argument('--db_name', default='test_db', help='数据库名称')
+parser.add_argument('--db_pool_size', type=int, default=5, help='数据库连接池大小')
+parser.add_argument('--entity_refresh_interval', type=int, default=300, help='实体词典增量刷新间隔（秒），0表示不刷新')
+parser.add_argument('--entity_rebuild_interval', type=int, default=3600, help='实体词典全量重建间隔（秒，使改名与删除生效），0表示不重建')
 
 # LLM配置
 parser.add_argument('--llm_url', default='https://ollama.com', help='LLM API端点')
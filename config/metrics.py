@@ -0,0 +1,385 @@
+"""
+运行指标：计数器、直方图与仪表，以 Prometheus 文本格式在 /metrics 暴露
+
+低开销：每个线程写入自己的分片字典，记录指标时不加锁，只在采集时合并各线程分片。
+线程结束时其分片并入 retired 累计值并从分片列表移除（每个请求新建线程的流式查询不会让分片无限增长）。
+多进程（gunicorn 多 worker）：配置 metrics_dir 后各进程定期把快照写入该目录，
+/metrics 由任意 worker 合并所有进程的快照（计数器与直方图求和，仪表按 pid 区分）。
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 默认延迟分桶（秒）：覆盖毫秒级数据库查询到数十秒的LLM调用
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+class MetricsRegistry:
+    """指标注册表：按线程分片累加，采集时合并"""
+
+    def __init__(self):
+        self._metrics: Dict[str, "_Metric"] = {}
+        self._shards: List[Dict] = []
+        # 已结束线程的分片合并后的累计值
+        self._retired: Dict[Tuple, float] = {}
+        # 仅在线程首次记录、线程结束与采集时使用；线程结束的回调可能在持锁线程中触发，因此可重入
+        self._shards_lock = threading.RLock()
+        self._local = threading.local()
+        # fork 后递增：父进程线程的分片在子进程中被回收时不计入
+        self._generation = 0
+        self.multiprocess_dir: Optional[Path] = None
+        self._flush_thread: Optional[threading.Thread] = None
+        self._flush_interval = 5.0
+
+    def _shard(self) -> Dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            # 线程结束时 threading.local 释放该线程的属性，owner 被回收后把分片并入 retired
+            owner = self._local.owner = _ShardOwner()
+            weakref.finalize(owner, self._retire, shard, self._generation)
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard: Dict, generation: int):
+        with self._shards_lock:
+            if generation != self._generation:
+                return
+            for key, value in shard.items():
+                self._retired[key] = self._retired.get(key, 0) + value
+            self._shards = [s for s in self._shards if s is not shard]
+
+    def _live(self) -> Tuple[List[Dict], Dict[Tuple, float]]:
+        """当前的线程分片与已结束线程的累计值（同一次加锁读取，线程结束时不会重复或遗漏计数）"""
+        with self._shards_lock:
+            return list(self._shards), dict(self._retired)
+
+    def _add(self, key: Tuple, amount: float):
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + amount
+
+    # ---------- 定义指标 ----------
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> "Counter":
+        return self._register(Counter(self, name, help_text, tuple(labelnames)))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> "Histogram":
+        return self._register(Histogram(self, name, help_text, tuple(labelnames), tuple(buckets)))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> "Gauge":
+        return self._register(Gauge(self, name, help_text, tuple(labelnames)))
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    # ---------- 采集 ----------
+
+    def snapshot(self) -> Dict[Tuple, float]:
+        """合并当前进程所有线程分片，返回 {(指标名, 标签值元组, 字段): 值}，仪表取当前值"""
+        shards, merged = self._live()
+        for shard in shards:
+            # dict() 复制在 GIL 下一次完成，不会与写入线程冲突
+            for key, value in dict(shard).items():
+                merged[key] = merged.get(key, 0) + value
+        for metric in self._metrics.values():
+            if isinstance(metric, Gauge):
+                for labels, value in metric.collect().items():
+                    merged[(metric.name, labels, "")] = value
+        return merged
+
+    def value(self, name: str, labels: Tuple = (), field: str = "") -> float:
+        """读取当前进程某个计数器的值（用于派生仪表）"""
+        shards, retired = self._live()
+        total = retired.get((name, labels, field), 0)
+        for shard in shards:
+            total += shard.get((name, labels, field), 0)
+        return total
+
+    def reset_after_fork(self):
+        """fork 后在子进程中调用：丢弃从父进程继承的分片，避免多个 worker 重复计入启动期间的计数"""
+        self._generation += 1
+        self._shards = []
+        self._retired = {}
+        self._shards_lock = threading.RLock()
+        self._local = threading.local()
+        self._flush_thread = None
+        if self.multiprocess_dir is not None:
+            self._start_flush()
+
+    # ---------- 多进程 ----------
+
+    def enable_multiprocess(self, directory: Path, flush_interval: float = 5.0):
+        """各进程定期把快照写入 directory/<pid>.json，供 /metrics 合并"""
+        self.multiprocess_dir = Path(directory)
+        self.multiprocess_dir.mkdir(parents=True, exist_ok=True)
+        self._flush_interval = flush_interval
+        self._start_flush()
+
+    def _start_flush(self):
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flush_thread.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                pass
+
+    def flush(self):
+        """把当前进程快照原子写入多进程目录"""
+        if self.multiprocess_dir is None:
+            return
+        entries = [[name, list(labels), field, value] for (name, labels, field), value in self.snapshot().items()]
+        self.multiprocess_dir.mkdir(parents=True, exist_ok=True)
+        path = self.multiprocess_dir / f"{os.getpid()}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _collect_all(self) -> Dict[Tuple, float]:
+        """合并所有进程的快照（当前进程使用实时值）；仪表加 pid 标签，且只保留存活进程"""
+        local = self.snapshot()
+        if self.multiprocess_dir is None:
+            return local
+
+        merged: Dict[Tuple, float] = {}
+        pid = os.getpid()
+
+        def add(entries: Iterable[Tuple[Tuple, float]], source_pid: int, alive: bool):
+            for (name, labels, field), value in entries:
+                metric = self._metrics.get(name)
+                if isinstance(metric, Gauge):
+                    if alive:
+                        merged[(name, labels + (str(source_pid),), field)] = value
+                    continue
+                merged[(name, labels, field)] = merged.get((name, labels, field), 0) + value
+
+        add(local.items(), pid, True)
+        for path in self.multiprocess_dir.glob("*.json"):
+            try:
+                source_pid = int(path.stem)
+                if source_pid == pid:
+                    continue
+                entries = json.loads(path.read_text(encoding="utf-8"))
+            except (ValueError, OSError):
+                continue
+            add((((name, tuple(labels), field), value) for name, labels, field, value in entries),
+                source_pid, _pid_alive(source_pid))
+        return merged
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        values = self._collect_all()
+        by_metric: Dict[str, List[Tuple[Tuple, str, float]]] = {}
+        for (name, labels, field), value in values.items():
+            by_metric.setdefault(name, []).append((labels, field, value))
+
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.help_text}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.render(sorted(by_metric.get(name, []), key=lambda item: str(item[:2]))))
+        return "\n".join(lines) + "\n"
+
+
+class _ShardOwner:
+    """线程本地的占位对象，随线程结束被回收，用于触发分片合并"""
+    __slots__ = ("__weakref__",)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: MetricsRegistry, name: str, help_text: str, labelnames: Tuple[str, ...]):
+        self.registry = registry
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+
+    def _labels(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        self.registry._add((self.name, self._labels(labels), ""), amount)
+
+    def render(self, samples):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, _, value in samples]
+
+
+class Histogram(_Metric):
+    """分桶直方图（桶计数非累计存储，输出时累加）"""
+    kind = "histogram"
+
+    def __init__(self, registry, name, help_text, labelnames, buckets):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._labels(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        shard = self.registry._shard()
+        for field, amount in ((str(index), 1), ("sum", value), ("count", 1)):
+            full_key = (self.name, key, field)
+            shard[full_key] = shard.get(full_key, 0) + amount
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文：with HISTOGRAM.time(label=...): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self, samples):
+        series: Dict[Tuple, Dict[str, float]] = {}
+        for labels, field, value in samples:
+            series.setdefault(labels, {})[field] = value
+        lines = []
+        for labels, fields in series.items():
+            cumulative = 0
+            for index, bound in enumerate(self.buckets + (float("inf"),)):
+                cumulative += fields.get(str(index), 0)
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, (('le', le),))} "
+                             f"{_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} "
+                         f"{_format_value(fields.get('sum', 0))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} "
+                         f"{_format_value(fields.get('count', 0))}")
+        return lines
+
+
+class Gauge(_Metric):
+    """仪表：直接设置，或注册采集时调用的回调"""
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text, labelnames):
+        super().__init__(registry, name, help_text, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._callback: Optional[Callable[[], Dict[Tuple, float]]] = None
+
+    def set(self, value: float, **labels):
+        self._values[self._labels(labels)] = value
+
+    def set_function(self, callback: Callable[[], object]):
+        """callback 返回数值（无标签）或 {标签值元组: 数值}"""
+        self._callback = callback
+
+    def collect(self) -> Dict[Tuple, float]:
+        values = dict(self._values)
+        if self._callback is not None:
+            try:
+                result = self._callback()
+            except Exception:
+                result = None
+            if isinstance(result, dict):
+                values.update({tuple(str(v) for v in k): float(x) for k, x in result.items()})
+            elif result is not None:
+                values[()] = float(result)
+        return values
+
+    def render(self, samples):
+        names = self.labelnames
+        lines = []
+        for labels, _, value in samples:
+            # 多进程合并时附加 pid 标签
+            label_names = names + ("pid",) if len(labels) > len(names) else names
+            lines.append(f"{self.name}{_format_labels(label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+# ---------- 全局注册表与业务指标 ----------
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "ai2sql_request_seconds", "HTTP请求处理耗时（流式接口为首字节耗时）", ["endpoint", "method", "status"])
+RESPONSE_BYTES = registry.histogram(
+    "ai2sql_response_bytes", "响应体字节数（压缩后）", ["endpoint"],
+    buckets=(1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216))
+LLM_SECONDS = registry.histogram("ai2sql_llm_seconds", "LLM调用耗时", ["purpose"])
+DB_SECONDS = registry.histogram("ai2sql_db_seconds", "数据库查询耗时（含取连接）")
+SUMMARY_SECONDS = registry.histogram("ai2sql_summary_seconds", "总结生成耗时（不含排队）")
+SUMMARY_QUEUE_WAIT_SECONDS = registry.histogram("ai2sql_summary_queue_wait_seconds", "总结任务排队等待时间")
+LLM_CALLS_PER_QUESTION = registry.histogram(
+    "ai2sql_llm_calls_per_question", "每个问题调用SQL生成LLM的次数（含重试）",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 18))
+RETRIES_TOTAL = registry.counter("ai2sql_retries_total", "重试次数", ["reason"])
+QUESTIONS_TOTAL = registry.counter("ai2sql_questions_total", "处理的问题数（按模板/自由模式）", ["mode", "success"])
+CACHE_REQUESTS_TOTAL = registry.counter("ai2sql_cache_requests_total", "缓存查找次数", ["cache", "result"])
+RESULT_ROWS = registry.histogram(
+    "ai2sql_result_rows", "查询结果行数", buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000))
+DB_CONNECTIONS_ACQUIRED = registry.counter("ai2sql_db_connections_acquired_total", "从连接池取出连接次数")
+DB_CONNECTIONS_RELEASED = registry.counter("ai2sql_db_connections_released_total", "连接归还或关闭次数")
+DB_CONNECTIONS_CREATED = registry.counter("ai2sql_db_connections_created_total", "新建数据库连接次数")
+DB_POOL_CONNECTIONS = registry.gauge("ai2sql_db_pool_connections", "连接池连接数", ["state"])
+DB_POOL_UTILIZATION = registry.gauge("ai2sql_db_pool_utilization", "使用中连接数 / 连接池大小")
+SUMMARY_QUEUE_DEPTH = registry.gauge("ai2sql_summary_queue_depth", "排队中的总结任务数")
+SUMMARY_RUNNING = registry.gauge("ai2sql_summary_running", "正在生成的总结任务数")
+ADMISSION_TOTAL = registry.counter(
+    "ai2sql_admission_total", "查询准入结果（admitted / user_limit / queue_full / timeout）", ["lane", "result"])
+ADMISSION_WAIT_SECONDS = registry.histogram("ai2sql_admission_wait_seconds", "查询准入排队等待时间", ["lane"])
+ADMISSION_ACTIVE = registry.gauge("ai2sql_admission_active", "正在执行的查询数", ["lane"])
+ADMISSION_WAITING = registry.gauge("ai2sql_admission_waiting", "排队等待准入的查询数", ["lane"])
+STT_STREAM_CHUNK_SECONDS = registry.histogram("ai2sql_stt_stream_chunk_seconds", "流式语音识别单个分块的解码耗时")
+STT_STREAM_RTF = registry.histogram(
+    "ai2sql_stt_stream_rtf", "流式语音识别每路流的实时率（解码耗时 / 音频时长）",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2))
+STT_DECODE_SECONDS = registry.histogram("ai2sql_stt_decode_seconds", "上传音频的解码与重采样耗时")
+STT_RECOGNIZE_SECONDS = registry.histogram("ai2sql_stt_recognize_seconds", "语音识别模型推理耗时", ["mode"])
+AGENT_TOOL_SECONDS = registry.histogram("ai2sql_agent_tool_seconds", "智能体工具执行耗时", ["tool"])
+AGENT_TOOL_CALLS_TOTAL = registry.counter(
+    "ai2sql_agent_tool_calls_total", "智能体工具调用次数（ok / cached / error / timeout）", ["tool", "result"])
+STT_AUDIO_SECONDS = registry.counter(
+    "ai2sql_stt_audio_seconds_total", "上传识别的音频时长（received 上传 / recognized 静音裁剪后送入模型）", ["stage"])
+STT_TRIM_SECONDS = registry.histogram("ai2sql_stt_trim_seconds", "识别前静音裁剪耗时",
+                                      buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+STT_BATCH_SIZE = registry.histogram(
+    "ai2sql_stt_batch_size", "语音识别每批合并的音频条数", buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+STT_QUEUE_WAIT_SECONDS = registry.histogram("ai2sql_stt_queue_wait_seconds", "语音识别请求排队等待时间")
+STT_QUEUE_DEPTH = registry.gauge("ai2sql_stt_queue_depth", "排队等待识别的音频数")
+STT_STREAMS_ACTIVE = registry.gauge("ai2sql_stt_streams_active", "进行中的流式语音识别连接数")
+
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存查找结果"""
+    CACHE_REQUESTS_TOTAL.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,223 @@
+"""
+结构化日志：请求线程只构造事件对象并放入队列，格式化与写出在后台线程完成
+
+    - Event: 事件名 + 字段 + 消息模板，消息在真正输出时才格式化；
+      Lazy 字段（结果行预览、LLM原始输出、异常堆栈等）只在输出时才计算
+    - 大字段按 max_chars 截断，避免整段 LLM 输出或长 SQL 刷屏
+    - 按级别采样（如 DEBUG 只输出 1/10），WARNING 及以上不采样
+    - 有界队列，写满时丢弃并计数，日志永远不阻塞请求线程
+    - Transcript: 单次查询的结构化事件记录，按需渲染为 collect_logs 的日志文本
+
+输出格式：text 为原有的单行文本格式，json 为每行一个 JSON 对象（便于日志采集系统解析字段）。
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import traceback
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# 控制台输出中单个字段的默认长度上限（字符）
+FIELD_MAX_CHARS = 2000
+# 查询日志（返回给前端）中单个字段的长度上限，保留完整的模型输出以便排查
+TRANSCRIPT_MAX_CHARS = 20000
+
+
+class Lazy:
+    """延迟计算的日志字段：保存函数与参数（参数在创建时绑定），仅在日志输出时调用一次"""
+
+    __slots__ = ("fn", "args", "kwargs")
+
+    def __init__(self, fn, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def __call__(self):
+        return self.fn(*self.args, **self.kwargs)
+
+
+def format_exception(error: BaseException) -> str:
+    """异常堆栈文本（配合 Lazy 使用，只在输出时格式化）"""
+    return "".join(traceback.format_exception(type(error), error, error.__traceback__))
+
+
+def cap(value: Any, max_chars: Optional[int]) -> str:
+    """字段转为文本并按长度上限截断"""
+    text = value if isinstance(value, str) else str(value)
+    if max_chars is not None and len(text) > max_chars:
+        return f"{text[:max_chars]}...（已截断，共 {len(text)} 字符）"
+    return text
+
+
+class Event:
+    """一条结构化日志事件，作为 logging 的 msg 传入，str() 时才格式化"""
+
+    __slots__ = ("name", "template", "fields", "_resolved")
+
+    def __init__(self, name: str, template: str, **fields):
+        self.name = name
+        self.template = template
+        self.fields = fields
+        self._resolved: Optional[Dict[str, Any]] = None
+
+    def resolve(self) -> Dict[str, Any]:
+        """计算 Lazy 字段（只计算一次，控制台与查询日志共用结果）"""
+        if self._resolved is None:
+            resolved = {}
+            for key, value in self.fields.items():
+                if isinstance(value, Lazy):
+                    try:
+                        value = value()
+                    except Exception as e:
+                        value = f"<字段计算失败: {e}>"
+                resolved[key] = value
+            self._resolved = resolved
+        return self._resolved
+
+    def render(self, max_chars: Optional[int] = FIELD_MAX_CHARS) -> str:
+        fields = {key: cap(value, max_chars) for key, value in self.resolve().items()}
+        try:
+            return self.template.format(**fields)
+        except (KeyError, IndexError, ValueError):
+            return f"{self.template} {fields}"
+
+    def to_dict(self, max_chars: Optional[int] = FIELD_MAX_CHARS) -> Dict[str, Any]:
+        return {"event": self.name, **{key: cap(value, max_chars) for key, value in self.resolve().items()}}
+
+    def __str__(self):
+        return self.render(FIELD_MAX_CHARS)
+
+
+class Transcript:
+    """单次查询的事件记录（collect_logs），返回给前端时才渲染为文本"""
+
+    def __init__(self, max_chars: Optional[int] = TRANSCRIPT_MAX_CHARS):
+        self.max_chars = max_chars
+        self.events: List[Event] = []
+
+    def append(self, event: Event):
+        self.events.append(event)
+
+    def lines(self) -> List[str]:
+        return [event.render(self.max_chars) for event in self.events]
+
+
+class LevelSampler(logging.Filter):
+    """按级别采样：rate 为保留比例，按计数确定性采样（每 1/rate 条保留一条）；WARNING 及以上总是保留"""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+        self._counters = {level: itertools.count() for level in rates}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        return next(self._counters[record.levelno]) % round(1 / rate) == 0
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    入队时不做任何格式化（QueueHandler 默认会在调用线程中格式化消息），
+    队列已满时丢弃记录并计数
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """原有的文本格式，Event 字段按 max_chars 截断"""
+
+    def __init__(self, max_chars: int):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+        self.max_chars = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.msg, Event):
+            record.msg = record.msg.render(self.max_chars)
+        return super().format(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """每行一个 JSON 对象：时间、级别、事件名、消息与各字段"""
+
+    def __init__(self, max_chars: int):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+        }
+        if isinstance(record.msg, Event):
+            entry.update(record.msg.to_dict(self.max_chars))
+            entry["msg"] = record.msg.render(self.max_chars)
+        else:
+            entry["msg"] = cap(record.getMessage(), self.max_chars)
+        if record.exc_info:
+            entry["exc"] = cap(self.formatException(record.exc_info), self.max_chars)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class AsyncLogging:
+    """队列处理器 + 后台写出线程（QueueListener），fork 后需调用 restart_after_fork()"""
+
+    def __init__(self, logger: logging.Logger, fmt: str = "text", queue_size: int = 10000,
+                 max_chars: int = FIELD_MAX_CHARS, sample_rates: Optional[Dict[int, float]] = None,
+                 stream=None):
+        self.queue_size = queue_size
+        formatter = JsonFormatter(max_chars) if fmt == "json" else TextFormatter(max_chars)
+        self.output = logging.StreamHandler(stream or sys.stdout)
+        self.output.setFormatter(formatter)
+        self.handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        if sample_rates:
+            self.handler.addFilter(LevelSampler(sample_rates))
+        logger.addHandler(self.handler)
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.start()
+        atexit.register(self.stop)
+
+    def start(self):
+        self.listener = logging.handlers.QueueListener(self.handler.queue, self.output)
+        self.listener.start()
+
+    def stop(self):
+        """写出队列中剩余的日志后停止后台线程"""
+        if self.listener is not None:
+            try:
+                self.listener.stop()
+            except Exception:
+                pass
+            self.listener = None
+
+    def restart_after_fork(self):
+        """后台线程不会随 fork 复制：在子进程中换新队列并重新启动"""
+        self.handler.queue = queue.Queue(maxsize=self.queue_size)
+        self.handler.dropped = 0
+        self.listener = None
+        self.start()
@@ -1,71 +1,123 @@
 import pymysql
-from datetime import date, datetime, time, timedelta
-from typing import Dict, List
-import decimal
+import queue
+from typing import Dict, List, Optional
+
+from config.config import logger
+from config.structured_log import Event
+from config.metrics import DB_CONNECTIONS_ACQUIRED, DB_CONNECTIONS_CREATED, DB_CONNECTIONS_RELEASED, DB_SECONDS, registry
 
 
 class Database:
     """数据库操作类，负责执行SQL查询和数据处理"""
 
-    def __init__(self, db_conf: Dict):
+    def __init__(self, db_conf: Dict, pool_size: int = 5):
         self.db_conf = db_conf
+        # 连接池：复用已建立的连接，避免每次提问都重新连接数据库
+        self.pool_size = pool_size
+        self._pool: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+
+    def _connect(self):
+        """新建一个数据库连接"""
+        DB_CONNECTIONS_CREATED.inc()
+        return pymysql.connect(
+            host=self.db_conf["host"],
+            port=int(self.db_conf["port"]),
+            user=self.db_conf["user"],
+            password=self.db_conf["password"],
+            database=self.db_conf["db"],
+            charset="utf8mb4",
+            cursorclass=pymysql.cursors.DictCursor,
+            connect_timeout=10,
+            autocommit=True,
+        )
+
+    def _acquire(self):
+        """从连接池取出连接（池为空时新建），取出时检查连接是否存活"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        try:
+            conn.ping(reconnect=True)
+            return conn
+        except Exception:
+            self._discard(conn)
+            return self._connect()
+
+    def _release(self, conn):
+        """归还连接，池已满时直接关闭"""
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            self._discard(conn)
 
     @staticmethod
-    def serialize_row(row: Dict) -> Dict:
-        """将数据库行中的日期/时间对象转换为字符串，以便JSON序列化"""
-        serialized = {}
-        for key, value in row.items():
-            if value is None:
-                serialized[key] = None
-            elif isinstance(value, (date, datetime)):
-                serialized[key] = value.isoformat()
-            elif isinstance(value, (time, timedelta)):
-                # time 和 timedelta 都转换为字符串
-                serialized[key] = str(value)
-            elif isinstance(value, decimal.Decimal):
-                # Decimal 类型转换为 float
-                serialized[key] = float(value)
-            elif isinstance(value, (bytes, bytearray)):
-                # 二进制数据转换为字符串
-                serialized[key] = value.decode('utf-8', errors='ignore')
-            else:
-                serialized[key] = value
-        return serialized
-
-    def run_query(self, sql: str) -> List[Dict]:
-        """执行SQL查询并返回结果"""
+    def _discard(conn):
+        """关闭连接并忽略关闭过程中的异常"""
         try:
-            conn = pymysql.connect(
-                host=self.db_conf["host"],
-                port=int(self.db_conf["port"]),
-                user=self.db_conf["user"],
-                password=self.db_conf["password"],
-                database=self.db_conf["db"],
-                charset="utf8mb4",
-                cursorclass=pymysql.cursors.DictCursor,
-                connect_timeout=10,
-            )
+            conn.close()
+        except Exception:
+            pass
+
+    def reset_after_fork(self):
+        """
+        fork 后在子进程中调用：丢弃从父进程继承的连接（不关闭，关闭会影响父进程仍在使用的同一socket）
+        """
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+
+    def pool_stats(self) -> Dict:
+        """连接池状态：大小、空闲连接数、使用中连接数（由取出/归还计数器得出）"""
+        in_use = registry.value(DB_CONNECTIONS_ACQUIRED.name) - registry.value(DB_CONNECTIONS_RELEASED.name)
+        return {"size": self.pool_size, "idle": self._pool.qsize(), "in_use": max(in_use, 0)}
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        while True:
             try:
-                with conn.cursor() as cur:
-                    cur.execute(sql)
-                    rows = cur.fetchall()
-                    # 转换日期/时间对象为字符串
-                    return [self.serialize_row(row) for row in rows]
-            finally:
-                conn.close()
+                self._discard(self._pool.get_nowait())
+            except queue.Empty:
+                break
+
+    def run_query(self, sql: str, args: Optional[Dict] = None) -> List[Dict]:
+        """
+        执行SQL查询并返回结果
+
+        Args:
+            sql: SQL语句；带参数时使用 %(name)s 占位
+            args: 绑定参数，由驱动转义后代入，避免拼接字符串带来的注入风险
+
+        Returns:
+            驱动返回的原始行（date/Decimal 等类型由 data.json_codec 在编码时处理）
+        """
+        try:
+            with DB_SECONDS.time():
+                conn = self._acquire()
+                DB_CONNECTIONS_ACQUIRED.inc()
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(sql, args)
+                        rows = cur.fetchall()
+                except Exception:
+                    # 出错的连接状态不可信，不再放回连接池
+                    self._discard(conn)
+                    raise
+                finally:
+                    DB_CONNECTIONS_RELEASED.inc()
+                self._release(conn)
+            return list(rows)
         except pymysql.err.OperationalError as e:
             error_msg = str(e)
             if "Can't connect" in error_msg or "拒绝" in error_msg:
-                print(f"\n错误：无法连接到MySQL数据库")
-                print(f"请检查：")
-                print(f"  1. MySQL服务是否正在运行")
-                print(f"  2. 连接配置是否正确（host={self.db_conf['host']}, port={self.db_conf['port']}, db={self.db_conf['db']}）")
-                print(f"  3. 用户名和密码是否正确")
-                print(f"\n生成的SQL（已验证正确）：\n{sql}")
+                logger.error(Event(
+                    "db_connect_failed",
+                    "\n错误：无法连接到MySQL数据库\n请检查：\n  1. MySQL服务是否正在运行\n"
+                    "  2. 连接配置是否正确（host={host}, port={port}, db={db}）\n  3. 用户名和密码是否正确\n"
+                    "\n生成的SQL（已验证正确）：\n{sql}",
+                    host=self.db_conf['host'], port=self.db_conf['port'], db=self.db_conf['db'], sql=sql,
+                ))
             raise
         except Exception as e:
-            print(f"\n数据库查询错误：{e}")
-            print(f"\n生成的SQL：\n{sql}")
+            logger.error(Event("db_query_failed", "\n数据库查询错误：{error}\n\n生成的SQL：\n{sql}", error=e, sql=sql))
             raise
 
 
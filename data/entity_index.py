@@ -0,0 +1,324 @@
+"""
+内存实体词典：人员/班组/责任单元 名称 -> ID 的快速解析
+
+启动时从数据库全量加载，之后按主键 ID 增量刷新新增实体，并定期全量重建（改名、删除只能通过重建生效）。支持：
+    - 精确匹配（同名多人时返回全部候选，供前端消歧）
+    - 部分匹配（"康康" -> "罗康康"；match="contains" 时 "对门山" -> 包含该词的所有责任单元）
+    - 错别字模糊匹配（字符 n-gram 召回 + 相似度打分）
+    - 拼音匹配（"luokangkang" / "lkk" / 同音错字，需安装 pypinyin，可选）
+
+按名称解析（match="name"）时只有与问题完全相同的名称会直接按ID查询；部分、拼音、错别字匹配
+即使只有一个候选也返回 fuzzy，需要用户确认，多个候选返回 ambiguous。避免把不存在的名称
+（"张三"）或同音字（"张珊"）静默解析为另一个人（"张三丰"、"张三"）而返回他人的数据。
+按包含解析（match="contains"，与 LIKE '%x%' 语义一致）遍历全部名称，不受召回数量上限影响。
+"""
+
+import difflib
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config.config import logger
+from config.metrics import record_cache
+
+try:
+    from pypinyin import lazy_pinyin
+    PINYIN_AVAILABLE = True
+except ImportError:
+    PINYIN_AVAILABLE = False
+
+
+# 实体来源：表名、ID列、名称列、用于消歧展示的附加列
+ENTITY_SOURCES = {
+    "person": {"table": "大桥局人员信息表", "id": "档案编号", "name": "姓名", "extra": ["所属部门", "所属项目", "岗位"]},
+    "team": {"table": "班前讲话班组字典", "id": "班组ID", "name": "班组", "extra": ["所属项目"]},
+    "unit": {"table": "责任单元字典", "id": "ID", "name": "责任单元名称", "extra": ["所属项目"]},
+}
+
+# 模糊匹配阈值：相似度低于该值不作为候选；最佳候选领先第二名不足该差值时视为有歧义
+FUZZY_MIN_SCORE = 0.6
+FUZZY_MARGIN = 0.1
+MAX_CANDIDATES = 10
+
+
+@dataclass
+class Entity:
+    """词典中的一个实体"""
+    kind: str
+    id: str
+    name: str
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Resolution:
+    """一次名称解析的结果"""
+    query: str
+    status: str  # exact | partial | fuzzy | ambiguous | not_found
+    candidates: List[Entity] = field(default_factory=list)
+
+    @property
+    def ids(self) -> List[str]:
+        return [e.id for e in self.candidates]
+
+    @property
+    def resolved(self) -> bool:
+        """可直接按ID查询（fuzzy 需用户确认，不算已解析）；没有候选时永远不算已解析，避免绑定空的 IN ()"""
+        return self.status in ("exact", "partial") and bool(self.candidates)
+
+    @property
+    def needs_confirmation(self) -> bool:
+        """错别字模糊匹配或有多个候选：需要用户确认后才能使用"""
+        return self.status in ("fuzzy", "ambiguous") and bool(self.candidates)
+
+
+class AmbiguousEntityError(ValueError):
+    """名称对应多个不同实体、或只能模糊匹配到需要确认的实体时抛出，携带候选列表"""
+
+    def __init__(self, resolution: Resolution):
+        self.resolution = resolution
+        names = "、".join(dict.fromkeys(e.name for e in resolution.candidates))
+        super().__init__(f"“{resolution.query}”可能指：{names}，请指明具体名称")
+
+
+def _ngrams(text: str) -> List[str]:
+    """字符 1-gram 与 2-gram（中文名一般 2~4 字，单字用于召回错别字）"""
+    return list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def _pinyin_keys(text: str) -> List[str]:
+    """全拼与首字母，如 罗康康 -> luokangkang, lkk"""
+    if not PINYIN_AVAILABLE:
+        return []
+    syllables = lazy_pinyin(text)
+    return ["".join(syllables), "".join(s[0] for s in syllables if s)]
+
+
+class _KindIndex:
+    """单类实体的索引：名称 -> 实体、n-gram 倒排、拼音"""
+
+    def __init__(self):
+        self.by_name: Dict[str, List[Entity]] = defaultdict(list)
+        self.by_id: Dict[str, Entity] = {}
+        self.ngrams: Dict[str, set] = defaultdict(set)
+        self.pinyin: Dict[str, set] = defaultdict(set)
+        self.last_pk = 0
+
+    def add(self, entity: Entity):
+        if entity.id in self.by_id:
+            # 同一ID重新加载（如改名）：先移除旧名称
+            self.remove(entity.id)
+        self.by_id[entity.id] = entity
+        self.by_name[entity.name].append(entity)
+        for gram in _ngrams(entity.name):
+            self.ngrams[gram].add(entity.name)
+        for key in _pinyin_keys(entity.name):
+            self.pinyin[key].add(entity.name)
+
+    def remove(self, entity_id: str):
+        """移除实体；名称不再对应任何实体时同时移除其 n-gram 与拼音，避免召回到空名称"""
+        old = self.by_id.pop(entity_id, None)
+        if old is None:
+            return
+        remaining = [e for e in self.by_name.get(old.name, []) if e.id != entity_id]
+        if remaining:
+            self.by_name[old.name] = remaining
+            return
+        self.by_name.pop(old.name, None)
+        for table, keys in ((self.ngrams, _ngrams(old.name)), (self.pinyin, _pinyin_keys(old.name))):
+            for key in keys:
+                names = table.get(key)
+                if names is not None:
+                    names.discard(old.name)
+                    if not names:
+                        del table[key]
+
+
+class EntityIndex:
+    """人员/班组/责任单元名称解析索引，线程安全，读多写少"""
+
+    def __init__(self, database=None, refresh_interval: int = 300, rebuild_interval: int = 3600):
+        """
+        Args:
+            database: data.database.Database 实例，用于加载与增量刷新
+            refresh_interval: 增量刷新间隔（秒），0 表示不自动刷新
+            rebuild_interval: 全量重建间隔（秒），使改名与删除生效，0 表示不重建
+        """
+        self.database = database
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._kinds: Dict[str, _KindIndex] = {kind: _KindIndex() for kind in ENTITY_SOURCES}
+        self._last_rebuild = time.monotonic()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.ready = False
+
+    # ---------- 加载与刷新 ----------
+
+    @staticmethod
+    def _load_rows(index: _KindIndex, kind: str, rows: List[Dict]):
+        source = ENTITY_SOURCES[kind]
+        for row in rows:
+            name = (row.get(source["name"]) or "").strip()
+            entity_id = row.get(source["id"])
+            if not name or entity_id in (None, ""):
+                continue
+            index.add(Entity(kind=kind, id=str(entity_id), name=name,
+                             extra={k: row.get(k) for k in source["extra"]}))
+            index.last_pk = max(index.last_pk, int(row.get("ID") or 0))
+
+    def load(self, kind: str, rows: List[Dict]):
+        """将数据库行加入索引（行需包含 ID、ID列、名称列）"""
+        with self._lock:
+            self._load_rows(self._kinds[kind], kind, rows)
+
+    def _select(self, kind: str, last_pk: int) -> List[Dict]:
+        source = ENTITY_SOURCES[kind]
+        columns = ", ".join(dict.fromkeys(["ID", source["id"], source["name"], *source["extra"]]))
+        sql = f"SELECT {columns} FROM {source['table']} WHERE ID > %(last_pk)s ORDER BY ID"
+        return self.database.run_query(sql, {"last_pk": last_pk}) or []
+
+    def refresh(self):
+        """按主键增量加载新增的实体（首次调用即全量加载）"""
+        if self.database is None:
+            return
+        for kind, source in ENTITY_SOURCES.items():
+            rows = self._select(kind, self._kinds[kind].last_pk)
+            if rows:
+                self.load(kind, rows)
+                logger.debug(f"[实体词典] {source['table']} 新增 {len(rows)} 条")
+        self.ready = True
+
+    def rebuild(self):
+        """全量重新加载并整体替换索引：改名、删除的实体在重建后生效（增量刷新只能发现新增的ID）"""
+        if self.database is None:
+            return
+        kinds = {}
+        for kind in ENTITY_SOURCES:
+            kinds[kind] = _KindIndex()
+            self._load_rows(kinds[kind], kind, self._select(kind, 0))
+        with self._lock:
+            self._kinds = kinds
+        self._last_rebuild = time.monotonic()
+        self.ready = True
+        logger.info("[实体词典] 全量重建完成: " + ", ".join(
+            f"{kind}={len(index.by_id)}" for kind, index in kinds.items()))
+
+    def start(self, background: bool = True):
+        """
+        启动时加载并开启后台增量刷新线程；数据库不可用时索引为空，解析会回退到按名称查询
+
+        Args:
+            background: 是否启动刷新线程；gunicorn preload 的 master 中传 False，只做首次加载，
+                刷新线程由 restart_after_fork() 在各 worker 中启动
+        """
+        try:
+            self.refresh()
+            logger.info("[实体词典] 加载完成: " + ", ".join(
+                f"{kind}={len(index.by_id)}" for kind, index in self._kinds.items()))
+        except Exception as e:
+            logger.warning(f"[实体词典] 加载失败，将回退为按名称查询: {e}")
+        if background and self.refresh_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name="entity-index-refresh", daemon=True)
+            self._thread.start()
+
+    def restart_after_fork(self):
+        """fork 后在子进程中调用：重建锁并重启刷新线程（线程不会随 fork 复制，索引数据已通过写时复制继承）"""
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.refresh_interval > 0:
+            self._thread = threading.Thread(target=self._refresh_loop, name="entity-index-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                if self.rebuild_interval > 0 and time.monotonic() - self._last_rebuild >= self.rebuild_interval:
+                    self.rebuild()
+                else:
+                    self.refresh()
+            except Exception as e:
+                logger.warning(f"[实体词典] 刷新失败: {e}")
+
+    # ---------- 解析 ----------
+
+    def resolve(self, kind: str, text: str, match: str = "name") -> Resolution:
+        """
+        将名称解析为实体
+
+        Args:
+            kind: person / team / unit
+            text: 名称（可能含错别字、只写了一部分或是拼音）
+            match: "name" 解析为唯一名称（同名多人全部返回）；
+                   "contains" 返回所有包含该文本的实体（与 LIKE '%x%' 语义一致）
+        """
+        resolution = self._resolve(kind, (text or "").strip(), match)
+        record_cache("entity_index", resolution.resolved)
+        return resolution
+
+    def _resolve(self, kind: str, query: str, match: str) -> Resolution:
+        if not query:
+            return Resolution(query=query, status="not_found")
+
+        with self._lock:
+            index = self._kinds[kind]
+            exact = index.by_name.get(query)
+            if exact and match == "name":
+                return Resolution(query=query, status="exact", candidates=list(exact))
+
+            if match == "contains":
+                # 遍历全部名称而不是召回结果（召回有数量上限），保证与 LIKE '%x%' 返回相同的实体
+                candidates = [e for n, entities in index.by_name.items() if query in n for e in entities]
+                if candidates:
+                    return Resolution(query=query, status="partial", candidates=candidates)
+
+            scored = [item for item in self._score(index, query) if index.by_name.get(item[0])]
+            if not scored:
+                return Resolution(query=query, status="not_found")
+
+            best_name, best_score, _ = scored[0]
+            runner_up = scored[1][1] if len(scored) > 1 else 0.0
+            if best_score - runner_up >= FUZZY_MARGIN:
+                # 名称与问题不同（部分、拼音或错别字匹配）：即使候选唯一也需要用户确认
+                return Resolution(query=query, status="fuzzy", candidates=list(index.by_name[best_name]))
+            close = [n for n, s, _ in scored if best_score - s < FUZZY_MARGIN][:MAX_CANDIDATES]
+            return Resolution(query=query, status="ambiguous",
+                              candidates=[e for n in close for e in index.by_name[n]])
+
+    @staticmethod
+    def _recall(index: _KindIndex, query: str) -> List[str]:
+        """通过 n-gram 倒排与拼音召回候选名称"""
+        hits: Counter = Counter()
+        for gram in _ngrams(query):
+            for name in index.ngrams.get(gram, ()):
+                hits[name] += 1
+        key = query.lower()
+        for name in index.pinyin.get(key, ()):
+            hits[name] += len(query)
+        for pinyin_key in _pinyin_keys(query):
+            for name in index.pinyin.get(pinyin_key, ()):
+                hits[name] += len(query)
+        return [name for name, _ in hits.most_common(200)]
+
+    def _score(self, index: _KindIndex, query: str) -> List[tuple]:
+        """对召回的候选名称打分，返回 [(名称, 分数, 匹配方式 contains|pinyin|similar)]，按分数降序"""
+        query_keys = set(_pinyin_keys(query)) | {query.lower()}
+        scored = []
+        for name in self._recall(index, query):
+            if query in name:
+                score, how = 0.9, "contains"
+            elif query_keys & set(_pinyin_keys(name)):
+                score, how = 0.85, "pinyin"
+            else:
+                score, how = difflib.SequenceMatcher(None, query, name).ratio(), "similar"
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((name, score, how))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
@@ -0,0 +1,387 @@
+"""
+查询历史存储：SQLite（WAL 模式）持久化每次查询的关键信息
+
+    - 索引：用户、会话、时间、模板ID、SQL指纹（自由SQL归一化后的形状，见 sql/template_miner.py）
+    - 问题全文检索：FTS5 trigram 分词（中文无需分词器；少于3个字的检索词回退为 LIKE）
+    - 写入异步批量：请求线程只把记录放入有界队列，后台线程按批（batch_size 条或 flush_interval 秒）
+      在一个事务中写入；队列写满时丢弃并计数，历史写入永远不阻塞查询
+    - 读取：按用户/会话的最近查询、全文检索、按模板或指纹统计，供历史查询接口、
+      模板挖掘（sql/template_miner.py）与索引建议（sql/index_advisor.py）直接使用
+
+替代原先的 JSONL 追加写入（memory/query_history.jsonl）；已有的 JSONL 可导入：
+使用方法: python -m data.history_store import memory/query_history.jsonl [--db memory/query_history.db]
+"""
+
+import argparse
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from sql.template_miner import fingerprint_sql, parameterize_sql
+
+# 与 config.config 中的 logger 为同一个（按名称获取，离线工具导入本模块时不解析服务的命令行参数）
+logger = logging.getLogger("ai2sql")
+
+# 默认数据库路径，与 config.config 中 --query_history_path 的默认值一致
+DEFAULT_HISTORY_DB = Path(__file__).resolve().parent.parent / "memory" / "query_history.db"
+
+_COLUMNS = ("query_id", "user_id", "session_id", "created_at", "question", "sql", "template_id",
+            "sql_fingerprint", "success", "attempts", "llm_calls", "shared", "row_count", "error")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_history (
+    id INTEGER PRIMARY KEY,
+    query_id TEXT UNIQUE,
+    user_id TEXT,
+    session_id TEXT,
+    created_at REAL NOT NULL,
+    question TEXT NOT NULL,
+    sql TEXT,
+    template_id TEXT,
+    sql_fingerprint TEXT,
+    success INTEGER NOT NULL,
+    attempts INTEGER,
+    llm_calls INTEGER,
+    shared INTEGER,
+    row_count INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_history_user ON query_history (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_history_session ON query_history (session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_history_time ON query_history (created_at);
+CREATE INDEX IF NOT EXISTS idx_history_template ON query_history (template_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_history_fingerprint ON query_history (sql_fingerprint, created_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS query_history_fts USING fts5(
+    question, content='query_history', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS query_history_fts_insert AFTER INSERT ON query_history BEGIN
+    INSERT INTO query_history_fts (rowid, question) VALUES (new.id, new.question);
+END;
+CREATE TRIGGER IF NOT EXISTS query_history_fts_delete AFTER DELETE ON query_history BEGIN
+    INSERT INTO query_history_fts (query_history_fts, rowid, question) VALUES ('delete', old.id, old.question);
+END;
+"""
+
+# trigram 分词要求检索词至少 3 个字符
+_FTS_MIN_CHARS = 3
+
+
+def sql_fingerprint(sql: Optional[str], template_id: Optional[str]) -> Optional[str]:
+    """自由SQL的形状指纹（模板SQL由模板ID区分，不计算指纹）"""
+    if not sql or (template_id and template_id != "free"):
+        return None
+    try:
+        normalized_sql, _, _ = parameterize_sql(sql)
+    except Exception:
+        return None
+    return fingerprint_sql(normalized_sql)
+
+
+def _to_record(row: sqlite3.Row) -> Dict:
+    record = dict(row)
+    record.pop("id", None)
+    record["success"] = bool(record["success"])
+    record["shared"] = bool(record["shared"])
+    return record
+
+
+class HistoryStore:
+    """SQLite 查询历史，写入异步批量，读取使用线程本地连接"""
+
+    def __init__(self, path: Path, batch_size: int = 100, flush_interval: float = 1.0,
+                 queue_size: int = 10000, start_writer: bool = True):
+        """
+        Args:
+            path: 数据库文件路径
+            batch_size: 单个事务最多写入的记录数
+            flush_interval: 队列未攒满一批时，最长等待多久写入（秒）
+            queue_size: 待写入记录的队列上限，写满时丢弃新记录
+            start_writer: 是否启动后台写入线程（离线工具只读时不需要）
+        """
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._metrics = {"queued": 0, "written": 0, "dropped": 0, "batches": 0, "failed": 0}
+        self._writer: Optional[threading.Thread] = None
+        if start_writer:
+            self._start_writer()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _start_writer(self):
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def reset_after_fork(self):
+        """fork 后在子进程中调用：丢弃父进程的连接、队列与写入线程"""
+        self._local = threading.local()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._start_writer()
+
+    # ---------- 写入 ----------
+
+    def record(self, query_id: str, result: Dict, user_id: Optional[str] = None,
+               session_id: Optional[str] = None, shared: bool = False) -> bool:
+        """记录一次查询（放入写入队列后立即返回），队列已满时返回 False"""
+        template_id = (result.get("template_info") or {}).get("template_id")
+        entry = {
+            "query_id": query_id,
+            "user_id": user_id,
+            "session_id": session_id,
+            "created_at": time.time(),
+            "question": result.get("question") or "",
+            "sql": result.get("sql"),
+            "template_id": template_id,
+            "sql_fingerprint": None,  # 指纹在写入线程中计算
+            "success": bool(result.get("success")),
+            "attempts": result.get("attempts", 1),
+            "llm_calls": 0 if shared else result.get("llm_calls", 0),
+            "shared": shared,
+            "row_count": len(result.get("rows") or []),
+            "error": result.get("error"),
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._metrics["dropped"] += 1
+            return False
+        self._metrics["queued"] += 1
+        return True
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch: List[Dict]):
+        """整批在一个事务中写入；失败时记录日志并逐条重试，一条坏记录不会连累同批的其他记录"""
+        for entry in batch:
+            if entry["sql_fingerprint"] is None:
+                try:
+                    entry["sql_fingerprint"] = sql_fingerprint(entry["sql"], entry["template_id"])
+                except Exception as e:
+                    logger.warning(f"[查询历史] 计算SQL指纹失败 {entry.get('query_id')}: {e}")
+        placeholders = ", ".join(f":{column}" for column in _COLUMNS)
+        statement = (f"INSERT OR IGNORE INTO query_history ({', '.join(_COLUMNS)}) "
+                     f"VALUES ({placeholders})")
+        conn = self._conn()
+        try:
+            self._execute(conn, statement, batch)
+            self._metrics["written"] += len(batch)
+            self._metrics["batches"] += 1
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self._metrics["failed"] += 1
+                logger.warning(f"[查询历史] 写入记录 {batch[0].get('query_id')} 失败，已丢弃: {e}")
+                return
+            logger.warning(f"[查询历史] 批量写入 {len(batch)} 条失败，改为逐条写入: {e}")
+        for entry in batch:
+            try:
+                self._execute(conn, statement, [entry])
+                self._metrics["written"] += 1
+            except Exception as e:
+                self._metrics["failed"] += 1
+                logger.warning(f"[查询历史] 写入记录 {entry.get('query_id')} 失败，已丢弃: {e}")
+
+    @staticmethod
+    def _execute(conn: sqlite3.Connection, statement: str, entries: List[Dict]):
+        """在一个事务中写入，失败时回滚并抛出原异常"""
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(statement, entries)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待队列中的记录全部写入（离线导入或进程退出前调用），超时返回 False"""
+        if self._writer is None:
+            batch = []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                self._queue.task_done()
+            if batch:
+                self._write_batch(batch)
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    # ---------- 读取 ----------
+
+    def recent(self, user_id: Optional[str] = None, session_id: Optional[str] = None,
+               limit: int = 50, before: Optional[float] = None) -> List[Dict]:
+        """最近的查询（可按用户/会话过滤），before 为分页游标（created_at）"""
+        clauses, args = [], []
+        if user_id is not None:
+            clauses.append("user_id = ?")
+            args.append(user_id)
+        if session_id is not None:
+            clauses.append("session_id = ?")
+            args.append(session_id)
+        if before is not None:
+            clauses.append("created_at < ?")
+            args.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT * FROM query_history {where} ORDER BY created_at DESC LIMIT ?", (*args, limit)
+        ).fetchall()
+        return [_to_record(row) for row in rows]
+
+    def search(self, text: str, user_id: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """按问题全文检索，结果按相关度排序（检索词过短时按时间倒序）"""
+        text = (text or "").strip()
+        if not text:
+            return []
+        user_clause, args = ("AND h.user_id = ?", [user_id]) if user_id is not None else ("", [])
+        if len(text) >= _FTS_MIN_CHARS:
+            phrase = '"' + text.replace('"', '""') + '"'
+            rows = self._conn().execute(
+                "SELECT h.* FROM query_history_fts f JOIN query_history h ON h.id = f.rowid "
+                f"WHERE query_history_fts MATCH ? {user_clause} ORDER BY f.rank LIMIT ?",
+                (phrase, *args, limit),
+            ).fetchall()
+        else:
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            rows = self._conn().execute(
+                f"SELECT h.* FROM query_history h WHERE h.question LIKE ? ESCAPE '\\' {user_clause} "
+                "ORDER BY h.created_at DESC LIMIT ?",
+                (f"%{escaped}%", *args, limit),
+            ).fetchall()
+        return [_to_record(row) for row in rows]
+
+    def by_fingerprint(self, fingerprint: str, limit: int = 50) -> List[Dict]:
+        """同一形状的自由SQL查询记录"""
+        rows = self._conn().execute(
+            "SELECT * FROM query_history WHERE sql_fingerprint = ? ORDER BY created_at DESC LIMIT ?",
+            (fingerprint, limit),
+        ).fetchall()
+        return [_to_record(row) for row in rows]
+
+    def template_stats(self, since: Optional[float] = None) -> List[Dict]:
+        """按模板ID统计查询次数、成功率与平均LLM调用次数"""
+        rows = self._conn().execute(
+            "SELECT template_id, COUNT(*) AS count, AVG(success) AS success_rate, AVG(llm_calls) AS avg_llm_calls "
+            "FROM query_history WHERE created_at >= ? GROUP BY template_id ORDER BY count DESC",
+            (since or 0,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_records(self, since: Optional[float] = None, free_only: bool = False) -> Iterator[Dict]:
+        """按时间顺序遍历历史记录（模板挖掘、索引建议等离线工具使用）"""
+        sql = "SELECT * FROM query_history WHERE created_at >= ?"
+        if free_only:
+            sql += " AND (template_id IS NULL OR template_id = 'free')"
+        for row in self._conn().execute(sql + " ORDER BY created_at", (since or 0,)):
+            yield _to_record(row)
+
+    def stats(self) -> Dict:
+        """写入队列指标"""
+        return {**self._metrics, "queue_depth": self._queue.qsize()}
+
+    # ---------- 导入 ----------
+
+    def import_jsonl(self, path: Path) -> int:
+        """导入旧版 JSONL 查询历史，返回导入的记录数（query_id 已存在的记录跳过）"""
+        count = 0
+        batch: List[Dict] = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                template_id = item.get("template_id")
+                timestamp = item.get("timestamp")
+                try:
+                    created_at = time.mktime(time.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S"))
+                except (TypeError, ValueError):
+                    created_at = time.time()
+                entry = {column: item.get(column) for column in _COLUMNS}
+                entry.update({
+                    "created_at": created_at,
+                    "question": item.get("question") or "",
+                    "sql_fingerprint": sql_fingerprint(item.get("sql"), template_id),
+                    "success": bool(item.get("success")),
+                    "shared": bool(item.get("shared")),
+                })
+                batch.append(entry)
+                count += 1
+                if len(batch) >= 500:
+                    self._write_batch(batch)
+                    batch = []
+        if batch:
+            self._write_batch(batch)
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询历史存储工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    import_parser = sub.add_parser("import", help="导入旧版 JSONL 查询历史")
+    import_parser.add_argument("jsonl", type=Path, nargs="+", help="JSONL 查询历史文件")
+    search_parser = sub.add_parser("search", help="按问题全文检索")
+    search_parser.add_argument("text", help="检索词")
+    search_parser.add_argument("--limit", type=int, default=20)
+    templates_parser = sub.add_parser("templates", help="按模板统计查询次数与成功率")
+    for p in (import_parser, search_parser, templates_parser):
+        p.add_argument("--db", type=Path, default=DEFAULT_HISTORY_DB, help="查询历史数据库文件")
+    args = parser.parse_args()
+
+    store = HistoryStore(args.db, start_writer=False)
+    if args.command == "import":
+        for path in args.jsonl:
+            print(f"{path}: 导入 {store.import_jsonl(path)} 条")
+    elif args.command == "search":
+        for record in store.search(args.text, limit=args.limit):
+            created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["created_at"]))
+            print(f"{created}  {record['template_id'] or '-':<6} {record['question']}")
+    else:
+        for item in store.template_stats():
+            print(f"{item['template_id'] or '-':<8} {item['count']:>6} 次  成功率 {item['success_rate']:.0%}  "
+                  f"平均LLM调用 {item['avg_llm_calls'] or 0:.2f}")
+
+
+if __name__ == "__main__":
+    main()
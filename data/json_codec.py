@@ -0,0 +1,47 @@
+"""
+查询结果的 JSON 编码
+
+数据库返回的原始行（含 date/datetime/Decimal 等）直接交给编码器处理，不再逐行逐格预先转换：
+    - 安装了 orjson 时使用 orjson（原生支持 date/datetime/time，其余类型走 json_default）
+    - 否则回退到标准库 json
+另提供列式格式 {columns, data}：列名只出现一次，显著减小大结果集的体积。
+"""
+
+import decimal
+import json
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def json_default(value: Any) -> Any:
+    """编码器无法直接处理的类型（与原 Database.serialize_row 的转换规则一致）"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (time, timedelta)):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", errors="ignore")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """编码为 UTF-8 JSON 字节串（中文不转义）"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, default=json_default, separators=(",", ":")).encode("utf-8")
+
+
+def to_columnar(rows: List[Dict]) -> Dict:
+    """行列表 -> {"columns": [列名], "data": [[值, ...], ...]}"""
+    if not rows:
+        return {"columns": [], "data": []}
+    columns = list(rows[0].keys())
+    return {"columns": columns, "data": [list(row.values()) for row in rows]}
@@ -0,0 +1,300 @@
+"""
+查询状态存储：保存查询日志、查询结果与异步总结状态，供前端分步轮询
+
+两种实现：
+    - MemoryQueryStore: 进程内 LRU + TTL，按估算字节数限制总容量，适合单进程部署
+    - SQLiteQueryStore: SQLite（WAL 模式）文件存储，多个 gunicorn worker 共享，
+      /api/query-summary 等轮询请求落到任意 worker 都能取到状态
+
+结果行单独存放（put_rows / get_rows），结果记录中只保留行数，
+翻页时只读取需要的部分，避免每次读取结果记录都复制整批数据。
+
+容量预算分两部分：结果行（max_bytes）与其余命名空间（state_max_bytes，日志、总结、会话等小条目），
+各自按最久未访问淘汰，一次大结果集不会挤掉登录会话与总结状态。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from data.json_codec import json_default
+
+# 命名空间
+LOGS = "logs"
+RESULTS = "results"
+SUMMARIES = "summaries"
+POLLS = "polls"
+SESSIONS = "sessions"
+LOGIN_TICKETS = "login_tickets"
+_ROWS = "rows"
+# 除结果行外的命名空间共用一个容量预算
+_STATE = "state"
+
+# SQLite 中结果行按块存储，翻页时只解码所需的块
+ROWS_CHUNK_SIZE = 500
+# 估算结果行字节数时抽样的行数
+_SIZE_SAMPLE_ROWS = 20
+
+
+def _estimate_size(value: Any) -> int:
+    """估算对象序列化后的字节数（结果行只抽样前若干行，避免完整序列化大结果集）"""
+    if isinstance(value, list) and len(value) > _SIZE_SAMPLE_ROWS:
+        sample = json.dumps(value[:_SIZE_SAMPLE_ROWS], ensure_ascii=False, default=json_default)
+        return len(sample.encode("utf-8")) * len(value) // _SIZE_SAMPLE_ROWS
+    return len(json.dumps(value, ensure_ascii=False, default=json_default).encode("utf-8"))
+
+
+def _pool(namespace: str) -> str:
+    """命名空间所属的容量预算"""
+    return _ROWS if namespace == _ROWS else _STATE
+
+
+class QueryStore:
+    """查询状态存储接口"""
+
+    def put(self, namespace: str, key: str, value: Dict):
+        raise NotImplementedError
+
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def put_rows(self, key: str, rows: List[Dict]):
+        raise NotImplementedError
+
+    def get_rows(self, key: str, start: int, stop: int) -> Optional[List[Dict]]:
+        """读取第 [start, stop) 行，结果不存在或已过期时返回 None"""
+        raise NotImplementedError
+
+    def reset_after_fork(self):
+        """fork 后在子进程中调用，重建进程私有资源"""
+
+
+class MemoryQueryStore(QueryStore):
+    """进程内 LRU + TTL 存储，超出字节预算时淘汰最久未访问的条目（结果行与其余命名空间分别计算预算）"""
+
+    def __init__(self, ttl: int = 3600, max_bytes: int = 256 * 1024 * 1024, state_max_bytes: int = 32 * 1024 * 1024):
+        """
+        Args:
+            ttl: 条目存活时间（秒），从写入时开始计算
+            max_bytes: 结果行估算字节数的上限
+            state_max_bytes: 其余命名空间（日志、结果记录、总结、会话等）估算字节数的上限
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.state_max_bytes = state_max_bytes
+        # 每个预算一个 LRU：(namespace, key) -> (过期时间, 估算字节数, 值)
+        self._entries: Dict[str, "OrderedDict[Tuple[str, str], Tuple[float, int, Any]]"] = {
+            _ROWS: OrderedDict(), _STATE: OrderedDict()}
+        self._bytes = {_ROWS: 0, _STATE: 0}
+        self._budgets = {_ROWS: max_bytes, _STATE: state_max_bytes}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _set(self, namespace: str, key: str, value: Any, size: int):
+        now = time.monotonic()
+        pool = _pool(namespace)
+        entries = self._entries[pool]
+        with self._lock:
+            old = entries.pop((namespace, key), None)
+            if old is not None:
+                self._bytes[pool] -= old[1]
+            entries[(namespace, key)] = (now + self.ttl, size, value)
+            self._bytes[pool] += size
+            if now - self._last_sweep > min(self.ttl, 60):
+                self._sweep(now)
+            # 只在同一预算内淘汰最久未访问的条目，最新写入的条目即使超出预算也保留
+            while self._bytes[pool] > self._budgets[pool] and len(entries) > 1:
+                _, (_, evicted_size, _) = entries.popitem(last=False)
+                self._bytes[pool] -= evicted_size
+
+    def _get(self, namespace: str, key: str) -> Any:
+        pool = _pool(namespace)
+        entries = self._entries[pool]
+        with self._lock:
+            entry = entries.get((namespace, key))
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del entries[(namespace, key)]
+                self._bytes[pool] -= entry[1]
+                return None
+            entries.move_to_end((namespace, key))
+            return entry[2]
+
+    def _sweep(self, now: float):
+        """清理所有过期条目（调用方持有锁）"""
+        for pool, entries in self._entries.items():
+            for entry_key in [k for k, (expires_at, _, _) in entries.items() if expires_at < now]:
+                self._bytes[pool] -= entries.pop(entry_key)[1]
+        self._last_sweep = now
+
+    def put(self, namespace: str, key: str, value: Dict):
+        self._set(namespace, key, value, _estimate_size(value))
+
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        return self._get(namespace, key)
+
+    def put_rows(self, key: str, rows: List[Dict]):
+        # 直接保存列表引用，不复制；调用方之后不应再修改该列表
+        self._set(_ROWS, key, rows, _estimate_size(rows))
+
+    def get_rows(self, key: str, start: int, stop: int) -> Optional[List[Dict]]:
+        rows = self._get(_ROWS, key)
+        return None if rows is None else rows[start:stop]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {pool: {"entries": len(entries), "bytes": self._bytes[pool], "max_bytes": self._budgets[pool]}
+                    for pool, entries in self._entries.items()}
+
+
+class SQLiteQueryStore(QueryStore):
+    """基于 SQLite（WAL 模式）的跨进程存储，每个线程使用独立连接"""
+
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS query_state (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        expires_at REAL NOT NULL,
+        accessed_at REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE INDEX IF NOT EXISTS idx_query_state_expires ON query_state (expires_at);
+    CREATE INDEX IF NOT EXISTS idx_query_state_accessed ON query_state (accessed_at);
+    CREATE TABLE IF NOT EXISTS query_rows (
+        key TEXT NOT NULL,
+        chunk INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (key, chunk)
+    );
+    """
+
+    def __init__(self, path: Path, ttl: int = 3600, max_bytes: int = 1024 * 1024 * 1024,
+                 state_max_bytes: int = 32 * 1024 * 1024):
+        """
+        Args:
+            path: 数据库文件路径，同一台机器上的所有 worker 使用同一文件
+            ttl: 条目存活时间（秒）
+            max_bytes: 结果行字节数上限，超出时按最久未访问淘汰
+            state_max_bytes: 其余命名空间字节数上限，与结果行分开淘汰
+        """
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.state_max_bytes = state_max_bytes
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn().executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def reset_after_fork(self):
+        # 连接不能跨进程使用，子进程中重新建立
+        self._local = threading.local()
+
+    def _set(self, namespace: str, key: str, value: str, size: int, chunks: Optional[List[str]] = None):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO query_state (namespace, key, value, size, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, value, size, now + self.ttl, now),
+            )
+            if chunks is not None:
+                conn.execute("DELETE FROM query_rows WHERE key = ?", (key,))
+                conn.executemany("INSERT INTO query_rows (key, chunk, data) VALUES (?, ?, ?)",
+                                 [(key, i, data) for i, data in enumerate(chunks)])
+        if now - self._last_sweep > min(self.ttl, 60):
+            self._sweep(now)
+
+    def _sweep(self, now: float):
+        """删除过期条目，并在结果行或其余命名空间超出各自字节预算时按最久未访问淘汰"""
+        self._last_sweep = now
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute("SELECT namespace, key FROM query_state WHERE expires_at < ?", (now,)).fetchall()
+            evicted = []
+            for condition, budget in (("namespace = ?", self.max_bytes), ("namespace != ?", self.state_max_bytes)):
+                total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM query_state "
+                                     f"WHERE expires_at >= ? AND {condition}", (now, _ROWS)).fetchone()[0]
+                if total <= budget:
+                    continue
+                for namespace, key, size in conn.execute(
+                        f"SELECT namespace, key, size FROM query_state WHERE expires_at >= ? AND {condition} "
+                        f"ORDER BY accessed_at", (now, _ROWS)).fetchall():
+                    if total <= budget:
+                        break
+                    evicted.append((namespace, key))
+                    total -= size
+            for namespace, key in expired + evicted:
+                conn.execute("DELETE FROM query_state WHERE namespace = ? AND key = ?", (namespace, key))
+                if namespace == _ROWS:
+                    conn.execute("DELETE FROM query_rows WHERE key = ?", (key,))
+
+    def _get(self, namespace: str, key: str) -> Optional[str]:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at FROM query_state WHERE namespace = ? AND key = ?",
+                           (namespace, key)).fetchone()
+        if row is None or row[1] < now:
+            return None
+        conn.execute("UPDATE query_state SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        return row[0]
+
+    def put(self, namespace: str, key: str, value: Dict):
+        data = json.dumps(value, ensure_ascii=False, default=json_default)
+        self._set(namespace, key, data, len(data.encode("utf-8")))
+
+    def get(self, namespace: str, key: str) -> Optional[Dict]:
+        data = self._get(namespace, key)
+        return None if data is None else json.loads(data)
+
+    def put_rows(self, key: str, rows: List[Dict]):
+        chunks = [json.dumps(rows[i:i + ROWS_CHUNK_SIZE], ensure_ascii=False, default=json_default)
+                  for i in range(0, len(rows), ROWS_CHUNK_SIZE)]
+        size = sum(len(c.encode("utf-8")) for c in chunks)
+        # query_state 中只保存行数，行数据按块存放在 query_rows
+        self._set(_ROWS, key, str(len(rows)), size, chunks=chunks)
+
+    def get_rows(self, key: str, start: int, stop: int) -> Optional[List[Dict]]:
+        total = self._get(_ROWS, key)
+        if total is None:
+            return None
+        stop = min(stop, int(total))
+        if start >= stop:
+            return []
+        first, last = start // ROWS_CHUNK_SIZE, (stop - 1) // ROWS_CHUNK_SIZE
+        rows: List[Dict] = []
+        for (data,) in self._conn().execute(
+                "SELECT data FROM query_rows WHERE key = ? AND chunk BETWEEN ? AND ? ORDER BY chunk",
+                (key, first, last)):
+            rows.extend(json.loads(data))
+        offset = first * ROWS_CHUNK_SIZE
+        return rows[start - offset:stop - offset]
+
+
+def create_query_store(params) -> QueryStore:
+    """根据配置创建查询状态存储"""
+    max_bytes = params.query_store_max_mb * 1024 * 1024
+    state_max_bytes = params.query_store_state_mb * 1024 * 1024
+    if params.query_store == "sqlite":
+        return SQLiteQueryStore(params.query_store_path, ttl=params.query_store_ttl, max_bytes=max_bytes,
+                                state_max_bytes=state_max_bytes)
+    return MemoryQueryStore(ttl=params.query_store_ttl, max_bytes=max_bytes, state_max_bytes=state_max_bytes)
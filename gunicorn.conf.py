@@ -0,0 +1,102 @@
+"""
+gunicorn 生产部署配置
+
+启动方式:
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+所有参数都可通过环境变量覆盖（AI2SQL_WORKERS、AI2SQL_THREADS 等），便于按机器调整。
+
+并发规划（worker / 线程数）
+---------------------------
+注意：默认的 workers=2、threads=8 是按下面的估算方法给出的起始值，尚未经过压测验证，
+没有对应的吞吐/延迟实测数据。上线前请在目标机器上按本节末尾的方法压测，
+并据实测结果通过 AI2SQL_WORKERS / AI2SQL_THREADS 调整。
+
+一次 /api/query 的耗时绝大部分花在等待 LLM 接口（数秒到数十秒，含重试），
+CPU 只在字段替换、JSON 序列化和语音识别时占用，因此：
+
+1. worker_class 使用 gthread：等待 LLM 时线程阻塞在网络 I/O 上，不占 CPU，
+   用线程扩展并发比多开进程省内存。
+2. 同时处理的查询数 = workers × threads。先确定目标并发（同时在等 LLM 的问题数），
+   再按内存决定 workers：
+       workers  = min(CPU核数, 可用内存 / 单 worker 常驻内存)
+       threads  = ceil(目标并发 / workers)
+   preload_app 开启后，语音模型在 master 中加载一次，worker 以写时复制共享，
+   单 worker 常驻内存主要是请求期间的结果行与 Python 对象（通常几百MB以内）。
+3. 线程数上限受 LLM 服务端并发配额约束：workers × threads 不应超过 LLM 服务允许的
+   并发数，否则多出来的请求只会在 LLM 侧排队、拉长尾延迟。
+4. 数据库连接池（--db_pool_size）按每个 worker 计算，建议不小于 threads，
+   总连接数 workers × db_pool_size 需低于 MySQL 的 max_connections。
+5. 语音识别是 CPU 密集型：每个 worker 同时识别多路音频会争抢核数，
+   如需大量语音识别，应优先增加 workers 而不是 threads。
+6. workers > 1 时必须使用共享的查询状态存储，否则 /api/query-summary、结果翻页与登录会话
+   落到其他 worker 上会返回 404。gunicorn 不接受应用自身的命令行参数，本文件在 workers > 1 时
+   设置环境变量 AI2SQL_QUERY_STORE=sqlite（数据库文件可用 AI2SQL_QUERY_STORE_PATH 指定）。
+
+用压测验证：
+    python test/load_test.py --url http://127.0.0.1:5000 --concurrency 1 2 4 8 16 --requests 40
+观察各并发档位的吞吐（req/s）与 P95 延迟：吞吐随并发不再上升、P95 明显变大的拐点
+即当前配置的饱和点；若拐点处 CPU 仍空闲，说明瓶颈在 LLM 服务或线程数，应提高 threads；
+若 CPU 已满（语音识别或大结果集序列化），应提高 workers 或减少 threads。
+
+启动耗时
+--------
+preload 时模型只在 master 中加载一次，worker 重启（max_requests 回收、崩溃拉起）直接 fork，
+无需重新导入 torch/funasr 或加载模型。不使用 preload 时（--model_load background），
+模型在后台线程加载，/api/ready 在加载完成前返回 503，可配置为负载均衡的就绪探针。
+导入耗时回归检查：
+    python test/bench_startup.py --max-import-ms 1500
+
+进程回收
+--------
+max_requests + max_requests_jitter 让 worker 处理一定数量请求后平滑重启，
+回收长时间运行积累的内存碎片；graceful_timeout 给正在等待 LLM 的请求留出收尾时间。
+"""
+
+import os
+import tempfile
+
+bind = os.getenv("AI2SQL_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("AI2SQL_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("AI2SQL_THREADS", "8"))
+
+# 多 worker 时查询状态必须跨进程共享（轮询总结、结果翻页、登录会话可能落到任意 worker）
+if workers > 1:
+    os.environ["AI2SQL_QUERY_STORE"] = "sqlite"
+
+# 在 master 中加载应用与模型，worker 通过 fork 写时复制共享
+preload_app = True
+# 告知应用当前为 preload master：模型同步加载，推理线程（及 torch 线程池）推迟到 worker fork 后再启动
+os.environ["AI2SQL_PRELOAD"] = "1" if preload_app else "0"
+
+# 单次查询包含多次 LLM 调用与重试，超时需覆盖最坏情况
+timeout = int(os.getenv("AI2SQL_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("AI2SQL_GRACEFUL_TIMEOUT", "120"))
+keepalive = 5
+
+# 平滑回收 worker
+max_requests = int(os.getenv("AI2SQL_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("AI2SQL_MAX_REQUESTS_JITTER", "100"))
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("AI2SQL_LOG_LEVEL", "info")
+
+# 多 worker 时各进程的指标快照目录，/metrics 合并所有 worker 的指标
+# 本文件在 master 加载应用之前执行：在此设置目录并删除上一次运行留下的快照
+# （只删除指标模块写入的 <pid>.json / <pid>.tmp 文件，目录可能由运维指定、含有其他文件）
+os.environ.setdefault("AI2SQL_METRICS_DIR", os.path.join(tempfile.gettempdir(), "ai2sql_metrics"))
+_metrics_dir = os.environ["AI2SQL_METRICS_DIR"]
+for _name in os.listdir(_metrics_dir) if os.path.isdir(_metrics_dir) else []:
+    _stem, _ext = os.path.splitext(_name)
+    if _stem.isdigit() and _ext in (".json", ".tmp"):
+        os.remove(os.path.join(_metrics_dir, _name))
+
+
+def post_fork(server, worker):
+    """worker 启动后重建数据库连接池、HTTP 会话和后台线程（这些资源不能跨进程共享）"""
+    from app import reinit_after_fork
+
+    reinit_after_fork()
+    server.log.info(f"worker {worker.pid} 已完成进程级重新初始化")
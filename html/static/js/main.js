@@ -14,9 +14,12 @@ const sidebarToggle = document.getElementById('sidebarToggle');
 const expandSidebarBtn = document.getElementById('expandSidebarBtn');
 
 // 语音录音相关变量（使用 MediaRecorder，录音后可上传给后端 STT）
-let mediaRecorder = null;
+let pcmRecorder = null;
 let audioChunks = [];
 let isRecording = false;
+// 实时语音识别（WebSocket 推送 16k PCM，边说边出字）；服务端不可用时回退为录音后上传
+let speechStream = null;
+const STREAM_SAMPLE_RATE = 16000;
 
 function setMicStatus(message, type = 'info') {
     if (!micStatus) return;
@@ -97,52 +100,54 @@ questionInput.addEventListener('keypress', (e) => {
     }
 });
 
-// 使用 MediaRecorder 录音，优先 wav，不支持则 webm
+// 录音上传（实时识别不可用时的回退）：采集 PCM 并在浏览器端编码为 16k 单声道 wav，
+// 服务端可直接在内存中解码，无需转码
 async function startRecording() {
+    const AudioCtx = window.AudioContext || window.webkitAudioContext;
+    if (!AudioCtx) {
+        setMicStatus('浏览器不支持录音', 'error');
+        showError('浏览器不支持录音');
+        return;
+    }
     try {
         const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        const audioContext = new AudioCtx();
+        const source = audioContext.createMediaStreamSource(stream);
+        const processor = audioContext.createScriptProcessor(4096, 1, 1);
         audioChunks = [];
-        mediaRecorder = MediaRecorder.isTypeSupported('audio/wav')
-            ? new MediaRecorder(stream, { mimeType: 'audio/wav' })
-            : new MediaRecorder(stream);
-
-        mediaRecorder.ondataavailable = (event) => {
-            if (event.data && event.data.size > 0) {
-                audioChunks.push(event.data);
-            }
+        processor.onaudioprocess = (event) => {
+            audioChunks.push(toPcm16k(event.inputBuffer.getChannelData(0), audioContext.sampleRate));
         };
-
-        mediaRecorder.onstart = () => {
-            isRecording = true;
-            micBtn.classList.add('recording');
-            micBtn.title = '正在录音...';
-            setMicStatus('正在录音，点击再次停止', 'active');
-            if (micStatus) micStatus.classList.add('recording');
-        };
-
-        mediaRecorder.onstop = () => {
-            isRecording = false;
-            micBtn.classList.remove('recording');
-            micBtn.title = '语音输入';
-            if (micStatus) micStatus.classList.remove('recording');
-
-            if (!audioChunks.length) {
-                setMicStatus('录音数据为空', 'error');
-                return;
-            }
-
-            const mimeType = MediaRecorder.isTypeSupported('audio/wav') ? 'audio/wav' : 'audio/webm';
-            const ext = mimeType === 'audio/wav' ? 'wav' : 'webm';
-            const audioBlob = new Blob(audioChunks, { type: mimeType });
-            audioBlob.fileExt = ext;
-
-            setMicStatus('录音完成，可上传识别', 'info');
-            uploadAndRecognize(audioBlob);
-
-            stream.getTracks().forEach(track => track.stop());
+        source.connect(processor);
+        processor.connect(audioContext.destination);
+
+        pcmRecorder = {
+            stop() {
+                processor.disconnect();
+                source.disconnect();
+                audioContext.close();
+                stream.getTracks().forEach(track => track.stop());
+                pcmRecorder = null;
+                isRecording = false;
+                micBtn.classList.remove('recording');
+                micBtn.title = '语音输入';
+                if (micStatus) micStatus.classList.remove('recording');
+
+                if (!audioChunks.length) {
+                    setMicStatus('录音数据为空', 'error');
+                    return;
+                }
+                setMicStatus('录音完成，可上传识别', 'info');
+                uploadAndRecognize(encodeWav(audioChunks, STREAM_SAMPLE_RATE));
+                audioChunks = [];
+            },
         };
 
-        mediaRecorder.start();
+        isRecording = true;
+        micBtn.classList.add('recording');
+        micBtn.title = '正在录音...';
+        setMicStatus('正在录音，点击再次停止', 'active');
+        if (micStatus) micStatus.classList.add('recording');
     } catch (err) {
         console.error('无法访问麦克风:', err);
         setMicStatus('无法访问麦克风，请检查权限', 'error');
@@ -150,40 +155,163 @@ async function startRecording() {
     }
 }
 
-// 上传音频到后端并填充识别结果
-async function uploadAndRecognize(audioBlob) {
-    setMicStatus('正在上传并识别...', 'info');
-    try {
-        const formData = new FormData();
-        const ext = audioBlob.fileExt || 'wav';
-        formData.append('audio', audioBlob, `recording.${ext}`);
+// 将若干段 16bit PCM 拼接为 wav（44 字节 RIFF 头 + 数据）
+function encodeWav(pcmChunks, sampleRate) {
+    const dataLength = pcmChunks.reduce((sum, chunk) => sum + chunk.byteLength, 0);
+    const header = new DataView(new ArrayBuffer(44));
+    const writeString = (offset, text) => {
+        for (let i = 0; i < text.length; i++) header.setUint8(offset + i, text.charCodeAt(i));
+    };
+    writeString(0, 'RIFF');
+    header.setUint32(4, 36 + dataLength, true);
+    writeString(8, 'WAVE');
+    writeString(12, 'fmt ');
+    header.setUint32(16, 16, true);
+    header.setUint16(20, 1, true);               // PCM
+    header.setUint16(22, 1, true);               // 单声道
+    header.setUint32(24, sampleRate, true);
+    header.setUint32(28, sampleRate * 2, true);  // 字节率
+    header.setUint16(32, 2, true);               // 块对齐
+    header.setUint16(34, 16, true);              // 位深
+    writeString(36, 'data');
+    header.setUint32(40, dataLength, true);
+    return new Blob([header.buffer, ...pcmChunks], { type: 'audio/wav' });
+}
 
-        const resp = await fetch('/api/speech-recognize', {
-            method: 'POST',
-            body: formData,
-        });
-        const data = await resp.json();
+// 将浏览器采样率的浮点音频降采样为 16k 的 16bit PCM
+function toPcm16k(input, inputRate) {
+    const ratio = inputRate / STREAM_SAMPLE_RATE;
+    const length = Math.floor(input.length / ratio);
+    const output = new Int16Array(length);
+    for (let i = 0; i < length; i++) {
+        // 区间平均，避免直接抽取带来的混叠
+        const start = Math.floor(i * ratio);
+        const end = Math.min(input.length, Math.floor((i + 1) * ratio));
+        let sum = 0;
+        for (let j = start; j < end; j++) sum += input[j];
+        const value = Math.max(-1, Math.min(1, sum / Math.max(1, end - start)));
+        output[i] = value < 0 ? value * 0x8000 : value * 0x7fff;
+    }
+    return output.buffer;
+}
 
-        if (resp.ok && data.success && data.text) {
-            questionInput.value = data.text;
-            setMicStatus('识别成功，内容已填入输入框', 'active');
-        } else {
-            const msg = data.error || '识别失败';
-            setMicStatus(msg, 'error');
-            showError(msg);
+// 尝试建立实时识别连接，服务端就绪返回 true，否则返回 false（由调用方回退为录音上传）
+function openSpeechSocket() {
+    return new Promise((resolve) => {
+        let settled = false;
+        const finish = (ok, ws) => {
+            if (settled) return;
+            settled = true;
+            resolve(ok ? ws : null);
+        };
+        let ws;
+        try {
+            const protocol = location.protocol === 'https:' ? 'wss' : 'ws';
+            ws = new WebSocket(`${protocol}://${location.host}/ws/speech-stream`);
+        } catch (err) {
+            finish(false);
+            return;
         }
+        ws.binaryType = 'arraybuffer';
+        ws.onmessage = (event) => {
+            const msg = JSON.parse(event.data);
+            if (msg.type === 'ready') {
+                finish(true, ws);
+            } else if (!settled) {
+                ws.close();
+                finish(false);
+            }
+        };
+        ws.onerror = () => finish(false);
+        ws.onclose = () => finish(false);
+        setTimeout(() => {
+            if (!settled) {
+                ws.close();
+                finish(false);
+            }
+        }, 3000);
+    });
+}
+
+// 实时识别：麦克风音频经 ScriptProcessor 转为 16k PCM 持续发送，识别文本实时填入输入框
+async function startStreamingRecognition() {
+    if (!window.WebSocket || !(window.AudioContext || window.webkitAudioContext)) return false;
+    const ws = await openSpeechSocket();
+    if (!ws) return false;
+
+    let stream;
+    try {
+        stream = await navigator.mediaDevices.getUserMedia({ audio: true });
     } catch (err) {
-        console.error('上传识别失败', err);
-        setMicStatus('网络或服务错误', 'error');
-        showError('语音识别失败: ' + err.message);
+        ws.close();
+        throw err;
     }
+    const AudioCtx = window.AudioContext || window.webkitAudioContext;
+    const audioContext = new AudioCtx();
+    const source = audioContext.createMediaStreamSource(stream);
+    const processor = audioContext.createScriptProcessor(4096, 1, 1);
+    processor.onaudioprocess = (event) => {
+        if (ws.readyState === WebSocket.OPEN) {
+            ws.send(toPcm16k(event.inputBuffer.getChannelData(0), audioContext.sampleRate));
+        }
+    };
+    source.connect(processor);
+    processor.connect(audioContext.destination);
+
+    const release = () => {
+        processor.disconnect();
+        source.disconnect();
+        audioContext.close();
+        stream.getTracks().forEach(track => track.stop());
+    };
+    ws.onmessage = (event) => {
+        const msg = JSON.parse(event.data);
+        if (msg.type === 'partial') {
+            questionInput.value = msg.text;
+        } else if (msg.type === 'final') {
+            questionInput.value = msg.text;
+            setMicStatus(msg.text ? '识别完成，内容已填入输入框' : '未能识别出语音内容', msg.text ? 'active' : 'error');
+            ws.close();
+        } else if (msg.type === 'error') {
+            setMicStatus(msg.error, 'error');
+        }
+    };
+    ws.onclose = () => {
+        if (speechStream) {
+            release();
+            speechStream = null;
+            isRecording = false;
+            micBtn.classList.remove('recording');
+            micBtn.title = '语音输入';
+            if (micStatus) micStatus.classList.remove('recording');
+        }
+    };
+
+    speechStream = { ws, release };
+    isRecording = true;
+    questionInput.value = '';
+    micBtn.classList.add('recording');
+    micBtn.title = '正在识别...';
+    setMicStatus('正在实时识别，点击再次停止', 'active');
+    if (micStatus) micStatus.classList.add('recording');
+    return true;
 }
 
 // 停止录音
 function stopRecording() {
-    if (mediaRecorder && isRecording) {
+    if (speechStream) {
+        // 通知服务端结束，最终结果返回后由服务端关闭连接
+        setMicStatus('正在识别最后一段语音...', 'info');
+        speechStream.release();
+        speechStream.release = () => {};
+        if (speechStream.ws.readyState === WebSocket.OPEN) {
+            speechStream.ws.send(JSON.stringify({ type: 'end' }));
+        }
+        return;
+    }
+    if (pcmRecorder && isRecording) {
         setMicStatus('正在停止录音...', 'info');
-        mediaRecorder.stop();
+        pcmRecorder.stop();
     }
 }
 
@@ -199,7 +327,15 @@ micBtn.addEventListener('click', () => {
         stopRecording();
     } else {
         setMicStatus('正在请求麦克风权限...', 'info');
-        startRecording();
+        startStreamingRecognition()
+            .then((streaming) => {
+                if (!streaming) startRecording();
+            })
+            .catch((err) => {
+                console.error('无法访问麦克风:', err);
+                setMicStatus('无法访问麦克风，请检查权限', 'error');
+                showError('无法访问麦克风，请检查权限');
+            });
     }
 });
 
@@ -283,11 +419,9 @@ function renderDataTable() {
     
     const data = cachedQueryData;
     
-    if (data.rows && data.rows.length > 0) {
-        const totalRows = data.rows.length;
-        const maxDisplayRows = 50;
-        const displayRows = data.rows.slice(0, maxDisplayRows);
-        dataTable.innerHTML = createTable(displayRows);
+    if (data.rows && data.rows.data.length > 0) {
+        dataTable.innerHTML = createTable(data.rows);
+        updateLoadMoreButton();
     } else {
         dataTable.innerHTML = '<p style="color: #999; text-align: center; padding: 20px;">暂无数据</p>';
     }
@@ -349,20 +483,24 @@ async function handleQuery() {
     contentArea.scrollTop = 0;
     
     try {
-        const response = await fetch('/api/query', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ question })
-        });
-        
-        const data = await response.json();
-        
-        if (data.success) {
-            displayResults(data);
+        if (window.ReadableStream && window.TextDecoder) {
+            await runStreamingQuery(question);
         } else {
-            showError(data.error || '查询失败');
+            const response = await fetch('/api/query', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ question, format: 'columnar' })
+            });
+
+            const data = await response.json();
+
+            if (data.success) {
+                displayResults(data);
+            } else {
+                showError(queryErrorMessage(data));
+            }
         }
     } catch (err) {
         showError('网络错误: ' + err.message);
@@ -372,8 +510,160 @@ async function handleQuery() {
     }
 }
 
+// 查询失败提示；系统繁忙（429）时附带建议的重试间隔
+function queryErrorMessage(data) {
+    const message = data.error || '查询失败';
+    return data.retry_after ? `${message}（约 ${data.retry_after} 秒后可重试）` : message;
+}
+
+// 更新加载提示文字（流式查询各阶段进度）
+function setLoadingStage(message) {
+    const label = loading.querySelector('span');
+    if (label) label.textContent = message;
+}
+
+// 流式查询：逐行读取 NDJSON 事件并增量渲染
+async function runStreamingQuery(question) {
+    const response = await fetch('/api/query/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ question, format: 'columnar' })
+    });
+    if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}));
+        showError(queryErrorMessage(data));
+        return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    const state = { queryId: null, question, streamedSummary: {} };
+    let buffer = '';
+    try {
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let newline;
+            while ((newline = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (line) handleStreamEvent(JSON.parse(line), state);
+            }
+        }
+    } finally {
+        setLoadingStage('正在处理中...');
+    }
+}
+
+// 处理单个流式事件
+function handleStreamEvent(evt, state) {
+    switch (evt.event) {
+        case 'query':
+            state.queryId = evt.query_id;
+            setLoadingStage('正在理解问题...');
+            break;
+        case 'attempt':
+            if (evt.attempt > 1) setLoadingStage(`第 ${evt.attempt} 次尝试查询...`);
+            break;
+        case 'template':
+            if (evt.template_info && evt.template_info.template_id !== 'free') {
+                setLoadingStage(`已匹配查询模板：${evt.template_info.description || evt.template_info.template_id}`);
+            } else {
+                setLoadingStage('正在生成SQL...');
+            }
+            break;
+        case 'sql':
+            setLoadingStage('已生成SQL，正在校验...');
+            break;
+        case 'validation':
+            setLoadingStage(evt.passed ? 'SQL校验通过，正在查询数据...' : 'SQL未通过校验，正在重新生成...');
+            break;
+        case 'result':
+            hideLoading();
+            if (!evt.success) {
+                showError(evt.error || '查询失败');
+                break;
+            }
+            // 先展示SQL与空结果区域，行数据由后续 rows 事件追加
+            displayResults({
+                success: true,
+                question: state.question,
+                sql: evt.sql,
+                rows: { columns: [], data: [] },
+                total_rows: evt.total_rows,
+                next_cursor: null,
+                summary: {},
+                summary_status: 'streaming',
+                query_id: state.queryId,
+                template_info: evt.template_info,
+                attempts: evt.attempts,
+            });
+            break;
+        case 'rows':
+            appendStreamRows(evt.rows);
+            break;
+        case 'rows_done':
+            if (cachedQueryData) {
+                cachedQueryData.total_rows = evt.total_rows;
+                cachedQueryData.next_cursor = evt.next_cursor;
+            }
+            updateRowCount();
+            updateLoadMoreButton();
+            break;
+        case 'summary':
+            // 按字段逐块渲染总结
+            state.streamedSummary[evt.field] = evt.value;
+            renderSummaryArea(state.streamedSummary, state.streamedSummary.charts || []);
+            break;
+        case 'summary_done':
+            if (evt.status === 'done') {
+                showFinalSummary(state.streamedSummary);
+            } else if (evt.status === 'pending' && state.queryId) {
+                // 流式等待超时，改为轮询
+                startSummaryPolling(state.queryId);
+            } else {
+                showSummaryError(evt.error);
+            }
+            break;
+        case 'error':
+            hideLoading();
+            showError(evt.error || '查询失败');
+            break;
+        default:
+            break;
+    }
+}
+
+// 追加一批流式推送的结果行
+function appendStreamRows(rows) {
+    const page = toTable(rows);
+    if (!cachedQueryData || page.data.length === 0) return;
+    const dataTable = document.getElementById('data-table');
+    if (cachedQueryData.rows.data.length === 0) {
+        cachedQueryData.rows.columns = page.columns;
+        dataTable.innerHTML = createTable(page);
+        dataTable.dataset.rendered = 'true';
+        const dataContent = document.getElementById('data-content');
+        const dataToggle = document.getElementById('data-toggle');
+        if (dataContent && dataToggle) {
+            dataContent.style.display = 'block';
+            dataToggle.textContent = '▲';
+        }
+    } else {
+        const tbody = document.querySelector('#data-table tbody');
+        if (tbody) tbody.insertAdjacentHTML('beforeend', createTableRows(page.data));
+    }
+    cachedQueryData.rows.data = cachedQueryData.rows.data.concat(page.data);
+    updateRowCount();
+}
+
 // 显示结果
 function displayResults(data) {
+    // 结果行统一为列式格式 {columns, data}
+    data.rows = toTable(data.rows);
     // 保存数据供延迟渲染使用
     cachedQueryData = data;
     // 直接使用结构化的summary数据（已经是字典格式）
@@ -430,9 +720,9 @@ function displayResults(data) {
             summaryToggle.textContent = '▲';
         }
     } else {
-        // 总结尚未就绪，显示占位文本，并启动轮询
+        // 总结尚未就绪，显示占位文本；流式查询由后续 summary 事件推送，否则启动轮询
         summaryText.innerHTML = '<p style="color: #999;">正在生成总结...</p>';
-        if (data.query_id) {
+        if (data.query_id && summaryStatus !== 'streaming') {
             startSummaryPolling(data.query_id);
         }
     }
@@ -450,20 +740,14 @@ function displayResults(data) {
     const rowCount = document.getElementById('row-count');
     const dataTable = document.getElementById('data-table');
     
-    if (data.rows && data.rows.length > 0) {
-        const totalRows = data.rows.length;
-        const maxDisplayRows = 50;
-        
-        if (totalRows > maxDisplayRows) {
-            rowCount.textContent = `(显示前${maxDisplayRows}条，共${totalRows}条)`;
-        } else {
-            rowCount.textContent = `(${totalRows} 条)`;
-        }
-        
+    if (data.rows.data.length > 0) {
+        // 后端只返回第一页，其余行点击“加载更多”时按游标分页获取
+        updateRowCount();
+
         // 直接渲染表格，并展开“查询结果”区域（先给用户看数据）
-        const displayRows = data.rows.slice(0, maxDisplayRows);
-        dataTable.innerHTML = createTable(displayRows);
+        dataTable.innerHTML = createTable(data.rows);
         dataTable.dataset.rendered = 'true';
+        updateLoadMoreButton();
 
         const dataContent = document.getElementById('data-content');
         const dataToggle = document.getElementById('data-toggle');
@@ -485,32 +769,111 @@ function displayResults(data) {
     }, 100);
 }
 
-// 创建表格
+// 将结果行统一为列式格式：兼容列式 {columns, data} 与行对象数组 [{列名: 值}]
+function toTable(rows) {
+    if (!rows) return { columns: [], data: [] };
+    if (!Array.isArray(rows)) return rows;
+    if (rows.length === 0) return { columns: [], data: [] };
+    const columns = Object.keys(rows[0]);
+    return { columns, data: rows.map(row => columns.map(column => row[column])) };
+}
+
+// 创建表格（rows 为列式格式或行对象数组）
 function createTable(rows) {
-    if (rows.length === 0) return '<p>暂无数据</p>';
+    const table = toTable(rows);
+    if (table.data.length === 0) return '<p>暂无数据</p>';
     
-    const headers = Object.keys(rows[0]);
     let html = '<table><thead><tr>';
     
-    headers.forEach(header => {
+    table.columns.forEach(header => {
         html += `<th>${escapeHtml(header)}</th>`;
     });
     html += '</tr></thead><tbody>';
-    
-    rows.forEach(row => {
+    html += createTableRows(table.data);
+    html += '</tbody></table>';
+    return html;
+}
+
+// 生成表格行（用于首屏渲染和分页追加），data 为按列顺序排列的值数组
+function createTableRows(data) {
+    let html = '';
+    data.forEach(values => {
         html += '<tr>';
-        headers.forEach(header => {
-            const value = row[header];
+        values.forEach(value => {
             const displayValue = value === null || value === undefined ? '' : String(value);
             html += `<td>${escapeHtml(displayValue)}</td>`;
         });
         html += '</tr>';
     });
-    
-    html += '</tbody></table>';
     return html;
 }
 
+// 更新查询结果计数（已加载行数 / 总行数）
+function updateRowCount() {
+    const rowCount = document.getElementById('row-count');
+    if (!rowCount || !cachedQueryData) return;
+    const loadedRows = cachedQueryData.rows ? cachedQueryData.rows.data.length : 0;
+    const totalRows = cachedQueryData.total_rows ?? loadedRows;
+    if (totalRows > loadedRows) {
+        rowCount.textContent = `(已加载${loadedRows}条，共${totalRows}条)`;
+    } else {
+        rowCount.textContent = `(${totalRows} 条)`;
+    }
+}
+
+// 根据是否还有下一页，显示或移除“加载更多”按钮
+function updateLoadMoreButton() {
+    const dataTable = document.getElementById('data-table');
+    if (!dataTable) return;
+    let loadMoreBtn = document.getElementById('load-more-rows');
+    if (cachedQueryData && cachedQueryData.next_cursor) {
+        if (!loadMoreBtn) {
+            loadMoreBtn = document.createElement('button');
+            loadMoreBtn.id = 'load-more-rows';
+            loadMoreBtn.className = 'load-more-btn';
+            loadMoreBtn.addEventListener('click', loadMoreRows);
+            dataTable.appendChild(loadMoreBtn);
+        }
+        loadMoreBtn.disabled = false;
+        loadMoreBtn.textContent = '加载更多';
+    } else if (loadMoreBtn) {
+        loadMoreBtn.remove();
+    }
+}
+
+// 按游标获取下一页查询结果并追加到表格
+async function loadMoreRows() {
+    if (!cachedQueryData || !cachedQueryData.next_cursor || !cachedQueryData.query_id) return;
+    const loadMoreBtn = document.getElementById('load-more-rows');
+    if (loadMoreBtn) {
+        loadMoreBtn.disabled = true;
+        loadMoreBtn.textContent = '加载中...';
+    }
+
+    try {
+        const params = new URLSearchParams({ cursor: cachedQueryData.next_cursor, format: 'columnar' });
+        const resp = await fetch(`/api/query/${cachedQueryData.query_id}/rows?${params}`);
+        const data = await resp.json();
+        if (!resp.ok || !data.success) {
+            throw new Error(data.error || '获取查询结果失败');
+        }
+
+        const page = toTable(data.rows);
+        const tbody = document.querySelector('#data-table tbody');
+        if (tbody && page.data.length > 0) {
+            tbody.insertAdjacentHTML('beforeend', createTableRows(page.data));
+        }
+        cachedQueryData.rows.data = cachedQueryData.rows.data.concat(page.data);
+        cachedQueryData.total_rows = data.total_rows;
+        cachedQueryData.next_cursor = data.next_cursor;
+    } catch (err) {
+        showError('加载更多结果失败: ' + err.message);
+    } finally {
+        updateRowCount();
+        updateLoadMoreButton();
+    }
+}
+
 // 渲染总结区域（文本 + 图表）
 function renderSummaryArea(summaryData, charts) {
     const summaryText = document.getElementById('summary-text');
@@ -537,6 +900,53 @@ function renderSummaryArea(summaryData, charts) {
     }
 }
 
+// 总结生成完成：更新缓存、渲染总结并自动展开（轮询与流式接口共用）
+function showFinalSummary(summary) {
+    // 更新缓存数据中的summary
+    if (!cachedQueryData) {
+        cachedQueryData = {};
+    }
+    cachedQueryData.summary = summary;
+
+    const charts = summary.charts || [];
+    const summaryData = {
+        summaryContent: summary.summaryContent || summary.summary_content || '',
+        keyInfo: summary.keyInfo || summary.key_info || '',
+        recordOverview: summary.recordOverview || summary.record_overview || ''
+    };
+
+    // 渲染总结并自动展开
+    renderSummaryArea(summaryData, charts);
+    const summaryContentDiv = document.getElementById('summary-content');
+    const summaryToggle = document.getElementById('summary-toggle');
+    if (summaryContentDiv && summaryToggle) {
+        summaryContentDiv.style.display = 'block';
+        summaryToggle.textContent = '▲';
+    }
+
+    // 同时收起“查询结果”区域
+    const dataContent = document.getElementById('data-content');
+    const dataToggle = document.getElementById('data-toggle');
+    if (dataContent && dataToggle) {
+        dataContent.style.display = 'none';
+        dataToggle.textContent = '▼';
+    }
+
+    // 如果关键信息区域已经展开，立即重新渲染（因为数据已更新）
+    const keyInfoContent = document.getElementById('keyinfo-content');
+    if (keyInfoContent && keyInfoContent.style.display !== 'none') {
+        renderKeyInfo(true); // 强制重新渲染
+    }
+}
+
+// 总结生成失败或已取消
+function showSummaryError(message) {
+    const summaryText = document.getElementById('summary-text');
+    if (summaryText) {
+        summaryText.innerHTML = `<p style="color: #f97316;">总结生成失败：${escapeHtml(message || '未知错误')}</p>`;
+    }
+}
+
 // 启动轮询后端总结接口
 function startSummaryPolling(queryId) {
     const pollInterval = 2000; // 2 秒轮询一次
@@ -550,51 +960,13 @@ function startSummaryPolling(queryId) {
             const data = await resp.json();
 
             if (data.status === 'done') {
-                // 更新缓存数据中的summary
-                if (!cachedQueryData) {
-                    cachedQueryData = {};
-                }
-                cachedQueryData.summary = data.summary || {};
-
-                const charts = (data.summary && data.summary.charts) ? data.summary.charts : [];
-                const summaryData = {
-                    summaryContent: data.summary.summaryContent || data.summary.summary_content || '',
-                    keyInfo: data.summary.keyInfo || data.summary.key_info || '',
-                    recordOverview: data.summary.recordOverview || data.summary.record_overview || ''
-                };
-
-                // 渲染总结并自动展开
-                renderSummaryArea(summaryData, charts);
-                const summaryContentDiv = document.getElementById('summary-content');
-                const summaryToggle = document.getElementById('summary-toggle');
-                if (summaryContentDiv && summaryToggle) {
-                    summaryContentDiv.style.display = 'block';
-                    summaryToggle.textContent = '▲';
-                }
-
-                // 同时收起“查询结果”区域
-                const dataContent = document.getElementById('data-content');
-                const dataToggle = document.getElementById('data-toggle');
-                if (dataContent && dataToggle) {
-                    dataContent.style.display = 'none';
-                    dataToggle.textContent = '▼';
-                }
-
-                // 如果关键信息区域已经展开，立即重新渲染（因为数据已更新）
-                const keyInfoContent = document.getElementById('keyinfo-content');
-                if (keyInfoContent && keyInfoContent.style.display !== 'none') {
-                    renderKeyInfo(true); // 强制重新渲染
-                }
-
+                showFinalSummary(data.summary || {});
                 summaryPollTimer = null;
                 return;
             }
 
-            if (data.status === 'error') {
-                const summaryText = document.getElementById('summary-text');
-                if (summaryText) {
-                    summaryText.innerHTML = `<p style="color: #f97316;">总结生成失败：${data.error || '未知错误'}</p>`;
-                }
+            if (data.status === 'error' || data.status === 'cancelled') {
+                showSummaryError(data.error);
                 summaryPollTimer = null;
                 return;
             }
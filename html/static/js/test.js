@@ -109,6 +109,8 @@ async function testQuestion(questionId) {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                // 批量测试走低优先级通道，不挤占交互式查询
+                'X-Query-Lane': 'batch',
             },
             body: JSON.stringify({ question: question.question })
         });
@@ -119,7 +121,7 @@ async function testQuestion(questionId) {
             testResults[questionId] = {
                 status: 'success',
                 sql: data.sql,
-                rowCount: data.rows ? data.rows.length : 0,
+                rowCount: data.total_rows ?? (data.rows ? data.rows.length : 0),
                 rows: data.rows || [],
                 summary: data.summary,
                 query_id: data.query_id,
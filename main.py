@@ -6,14 +6,24 @@ from sql.sql_field_replacer import SQLFieldReplacer
 from model.summarizer import Summarizer
 from model.llm_client import LLMClient
 from data.database import Database
+from data.entity_index import EntityIndex, AmbiguousEntityError
+from data.json_codec import json_default
+from config.metrics import LLM_SECONDS, RETRIES_TOTAL
 from config.config import params, logger
-from typing import Dict
+from config.structured_log import Event, Lazy, Transcript, format_exception
+from typing import Callable, Dict, Optional
 import json
+import logging
 import sys
 import re
 import os
 
 
+def _describe_params(params_dict: Dict) -> str:
+    """模板参数的调试详情（值与类型）"""
+    return "\n".join(f"  {key}: {value!r} (type: {type(value).__name__})" for key, value in params_dict.items())
+
+
 class AI2SQLService:
     def __init__(self):
         """初始化服务，加载配置和组件"""
@@ -46,10 +56,17 @@ class AI2SQLService:
         self.sql_generator = SQLGenerator(self.param_normalizer)
         self.sql_validator = SQLValidator()
         self.sql_field_replacer = SQLFieldReplacer()
-        self.database = Database(db_config)
+        self.database = Database(db_config, pool_size=params.db_pool_size)
         self.summarizer = Summarizer(self.llm_client)
         self.template_manager = SQLTemplateManager()
 
+        # 内存实体词典：模板参数中的人名/班组/单元名直接解析为ID，无需关联字典表或再调LLM
+        self.entity_index = EntityIndex(self.database, refresh_interval=params.entity_refresh_interval,
+                                        rebuild_interval=params.entity_rebuild_interval)
+        # gunicorn preload 时在 master 中只做首次加载（master 不处理请求，刷新线程会空耗数据库连接），
+        # 刷新线程在 worker fork 后由 reinit_after_fork() 启动
+        self.entity_index.start(background=os.getenv("AI2SQL_PRELOAD") != "1")
+
         # 提取允许的表名（用于SQL验证）
         self.allowed_tables = []
         if self.schema:
@@ -59,8 +76,15 @@ class AI2SQLService:
         if not self.schema:
             logger.warning("警告：schema_prompt.txt 为空，请先填入三张表的结构。")
 
+    def reinit_after_fork(self):
+        """多进程部署时在 worker fork 后调用，重建不能跨进程共享的资源"""
+        self.database.reset_after_fork()
+        self.llm_client.reset_session()
+        self.entity_index.restart_after_fork()
+        logger.info(f"[进程 {os.getpid()}] 已重建数据库连接池、HTTP会话与后台刷新线程")
+
     def query(self, question: str, collect_logs: bool = False,
-              skip_summary: bool = False) -> Dict:
+              skip_summary: bool = False, on_event: Optional[Callable[[str, Dict], None]] = None) -> Dict:
         """
         处理单个查询问题
         
@@ -68,6 +92,8 @@ class AI2SQLService:
             question: 自然语言问题
             collect_logs: 是否收集日志（默认False）
             skip_summary: 是否跳过总结生成（默认False）
+            on_event: 阶段事件回调 (事件名, 数据)，用于流式接口在各阶段完成时即时推送：
+                      template（选定模板）、sql（字段替换后的SQL）、validation（校验结论）
         
         Returns:
             包含查询结果的字典：
@@ -89,25 +115,40 @@ class AI2SQLService:
             "template_info": None,
             "error": None,
             "success": False,
-            "logs": [] if collect_logs else None,
+            "logs": None,
+            "llm_calls": 0,             # 本次查询调用SQL生成大模型的次数（用于成本统计）
         }
         
-        # 日志收集函数
-        def log(message):
-            if collect_logs:
-                result["logs"].append(message)
-            logger.info(message)
+        # 日志：记录结构化事件，消息与大字段在输出时才格式化；collect_logs 时同时记入本次查询的事件记录
+        transcript = Transcript() if collect_logs else None
+
+        def log(name, template, level=logging.INFO, **fields):
+            event = Event(name, template, **fields)
+            if transcript is not None:
+                transcript.append(event)
+            logger.log(level, event)
+
+        # 阶段事件推送，回调异常不影响查询本身
+        def emit(event, **data):
+            if on_event is None:
+                return
+            try:
+                on_event(event, data)
+            except Exception as e:
+                logger.warning(f"阶段事件推送失败 {event}: {e}")
 
         try:
             # 生成SQL提示词
             prompt = self.sql_generator.build_sql_prompt(question, self.schema)
-            llm_output = self.llm_client.complete(prompt, max_tokens=10000)
+            with LLM_SECONDS.time(purpose="sql"):
+                llm_output = self.llm_client.complete(prompt, max_tokens=10000)
+            result["llm_calls"] += 1
             
             # 检查输出是否完整
             if not llm_output or len(llm_output.strip()) < 10:
                 error_msg = "模型输出为空或过短，请检查LLM服务是否正常"
                 result["error"] = error_msg
-                log(f"\n错误：{error_msg}")
+                log("llm_output_empty", "\n错误：{error}", logging.ERROR, error=error_msg)
                 return result
             
             # 检查JSON是否完整（简单检查：是否包含闭合的花括号）
@@ -116,10 +157,11 @@ class AI2SQLService:
                 # 输出可能被截断
                 error_msg = f"模型输出不完整（未以}}结尾），可能被截断。输出内容: {stripped_output[:200]}..."
                 result["error"] = error_msg + "\n建议：1. 检查LLM服务的max_tokens配置\n2. 尝试简化问题\n3. 联系管理员检查模型配置"
-                log(f"\n警告：{error_msg}")
+                log("llm_output_truncated", "\n警告：{error}", logging.WARNING, error=error_msg)
                 return result
 
             # 尝试提取模板信息用于显示
+            template_id, params_dict = None, {}
             try:
                 template_id, params_dict, _free_sql = self.sql_generator.extract_template_and_params(llm_output)
 
@@ -133,13 +175,11 @@ class AI2SQLService:
                     }
 
                     # 始终输出到终端
-                    log(f"\n--- 选择的模板 ---")
-                    log(f"模板ID: {template_id}")
-                    log(f"描述: {template['desc']}")
-                    log(f"参数: {json.dumps(params_dict, ensure_ascii=False)}")
-                    log(f"\n--- 调试：参数详情 ---")
-                    for key, value in params_dict.items():
-                        log(f"  {key}: {repr(value)} (type: {type(value).__name__})")
+                    log("template_selected", "\n--- 选择的模板 ---\n模板ID: {template_id}\n描述: {desc}\n参数: {params}",
+                        template_id=template_id, desc=template['desc'],
+                        params=Lazy(json.dumps, params_dict, ensure_ascii=False))
+                    log("template_params_debug", "\n--- 调试：参数详情 ---\n{details}", logging.DEBUG,
+                        details=Lazy(_describe_params, dict(params_dict)))
                 else:
                     # 自由模式，仅输出解析结果
                     result["template_info"] = {
@@ -147,11 +187,13 @@ class AI2SQLService:
                         "description": "自由生成SQL（未使用预定义模板）",
                         "params": params_dict,
                     }
-                    log(f"\n--- 自由模式（未使用模板） ---")
-                    log(f"解析到的参数: {json.dumps(params_dict, ensure_ascii=False)}")
+                    log("free_mode", "\n--- 自由模式（未使用模板） ---\n解析到的参数: {params}",
+                        params=Lazy(json.dumps, params_dict, ensure_ascii=False))
+                emit("template", template_info=result["template_info"], attempt=1)
 
             except Exception as e:
-                log(f"\n--- 模型输出解析错误 ---\n错误: {e}\n原始输出: {llm_output}")
+                log("llm_output_parse_error", "\n--- 模型输出解析错误 ---\n错误: {error}\n原始输出: {llm_output}",
+                    logging.WARNING, error=e, llm_output=llm_output)
                 # 如果是输出不完整的错误，提供更友好的提示
                 if "不完整" in str(e) or "截断" in str(e) or len(llm_output.strip()) < 50:
                     result["error"] = f"模型输出不完整或格式错误。\n错误: {str(e)}\n输出内容: {llm_output[:200]}...\n\n建议：\n1. 检查LLM服务配置和max_tokens设置\n2. 尝试简化问题\n3. 联系管理员检查模型配置"
@@ -166,24 +208,27 @@ class AI2SQLService:
             sql = ""
             for gen_attempt in range(1, max_sql_gen_retries + 1):
                 if gen_attempt > 1:
-                    log(f"\n提示：第 {gen_attempt} 次尝试重新生成 SQL（上一次未通过校验）")
+                    log("sql_regenerate", "\n提示：第 {attempt} 次尝试重新生成 SQL（上一次未通过校验）", attempt=gen_attempt)
                     # 重新调用LLM生成输出
-                    llm_output = self.llm_client.complete(prompt, max_tokens=3000)
+                    with LLM_SECONDS.time(purpose="sql"):
+                        llm_output = self.llm_client.complete(prompt, max_tokens=3000)
+                    result["llm_calls"] += 1
                     # 再次做基础完整性检查
                     if not llm_output or len(llm_output.strip()) < 10:
                         error_msg = "模型输出为空或过短，请检查LLM服务是否正常"
                         result["error"] = error_msg
-                        log(f"\n错误：{error_msg}")
+                        log("llm_output_empty", "\n错误：{error}", logging.ERROR, error=error_msg)
                         return result
                     stripped_output = llm_output.strip()
                     if stripped_output.startswith('{') and not stripped_output.rstrip().endswith('}'):
                         error_msg = f"模型输出不完整（未以}}结尾），可能被截断。输出内容: {stripped_output[:200]}..."
                         result["error"] = error_msg + "\n建议：1. 检查LLM服务的max_tokens配置\n2. 尝试简化问题\n3. 联系管理员检查模型配置"
-                        log(f"\n警告：{error_msg}")
+                        log("llm_output_truncated", "\n警告：{error}", logging.WARNING, error=error_msg)
                         return result
                     
                     # 输出模型原始输出（重试时）
-                    log(f"\n--- 模型输出（模板选择，第 {gen_attempt} 次） ---\n{llm_output}")
+                    log("llm_output", "\n--- 模型输出（模板选择，第 {attempt} 次） ---\n{llm_output}",
+                        logging.DEBUG, attempt=gen_attempt, llm_output=llm_output)
 
                     # 重新解析模板信息（仅用于展示，容错逻辑保持不变）
                     try:
@@ -195,77 +240,130 @@ class AI2SQLService:
                                 "description": template['desc'],
                                 "params": params_dict,
                             }
-                            log(f"\n--- 选择的模板（第 {gen_attempt} 次） ---")
-                            log(f"模板ID: {template_id}")
-                            log(f"描述: {template['desc']}")
-                            log(f"参数: {json.dumps(params_dict, ensure_ascii=False)}")
+                            log("template_selected",
+                                "\n--- 选择的模板（第 {attempt} 次） ---\n模板ID: {template_id}\n描述: {desc}\n参数: {params}",
+                                attempt=gen_attempt, template_id=template_id, desc=template['desc'],
+                                params=Lazy(json.dumps, params_dict, ensure_ascii=False))
                         else:
                             result["template_info"] = {
                                 "template_id": "free",
                                 "description": "自由生成SQL（未使用预定义模板）",
                                 "params": params_dict,
                             }
-                            log(f"\n--- 自由模式（未使用模板，第 {gen_attempt} 次） ---")
-                            log(f"解析到的参数: {json.dumps(params_dict, ensure_ascii=False)}")
+                            log("free_mode", "\n--- 自由模式（未使用模板，第 {attempt} 次） ---\n解析到的参数: {params}",
+                                attempt=gen_attempt, params=Lazy(json.dumps, params_dict, ensure_ascii=False))
+                        emit("template", template_info=result["template_info"], attempt=gen_attempt)
                     except Exception as e:
-                        log(f"\n--- 第 {gen_attempt} 次模型输出解析错误 ---\n错误: {e}\n原始输出: {llm_output}")
+                        log("llm_output_parse_error",
+                            "\n--- 第 {attempt} 次模型输出解析错误 ---\n错误: {error}\n原始输出: {llm_output}",
+                            logging.WARNING, attempt=gen_attempt, error=e, llm_output=llm_output)
                         result["error"] = f"模型输出解析错误: {e}"
                         return result
 
                 # 输出模型原始输出（第一次时）
                 if gen_attempt == 1:
-                    log(f"\n--- 模型输出（模板选择） ---\n{llm_output}")
+                    log("llm_output", "\n--- 模型输出（模板选择） ---\n{llm_output}", logging.DEBUG, llm_output=llm_output)
+
+                # 命中模板且参数合法：直接使用预编译的参数化模板，跳过SQL解析、字段替换与校验
+                if template_id and template_id.lower() != "free":
+                    try:
+                        resolutions = self.template_manager.resolve_entities(
+                            template_id, params_dict, self.entity_index)
+                        for name, resolution in resolutions.items():
+                            names = list(dict.fromkeys(e.name for e in resolution.candidates))
+                            log("entity_resolved", "实体解析: {param}={query} -> {names} ({status}, {ids} 个ID)",
+                                param=name, query=resolution.query, names='、'.join(names),
+                                status=resolution.status, ids=len(resolution.ids))
+                            # 同名多人：结果包含所有同名人员，附上候选供前端消歧
+                            if len(resolution.candidates) > 1 and result["template_info"] is not None:
+                                result["template_info"].setdefault("candidates", {})[name] = [
+                                    {"id": e.id, "name": e.name, **e.extra} for e in resolution.candidates
+                                ]
+                        sql, sql_args = self.template_manager.prepare(template_id, params_dict, resolutions)
+                        result["sql"] = self.template_manager.render_for_display(sql, sql_args)
+                        log("sql_template", "\n--- SQL（模板 {template_id}，参数化执行） ---\n{sql}\n绑定参数: {args}",
+                            template_id=template_id, sql=sql,
+                            args=Lazy(json.dumps, sql_args, ensure_ascii=False, default=json_default))
+                        emit("sql", sql=result["sql"], mode="template", rewrites=[], attempt=gen_attempt)
+                        emit("validation", passed=True, mode="template", attempt=gen_attempt)
+                        break
+                    except AmbiguousEntityError as e:
+                        # 名称对应多个不同实体：直接请用户澄清，不再重试
+                        result["error"] = str(e)
+                        result["needs_clarification"] = True
+                        if result["template_info"] is not None:
+                            result["template_info"]["candidates"] = {
+                                "ambiguous": [{"id": c.id, "name": c.name, **c.extra}
+                                              for c in e.resolution.candidates]
+                            }
+                        log("entity_ambiguous", "\n提示：{error}", error=e)
+                        return result
+                    except ValueError as e:
+                        RETRIES_TOTAL.inc(reason="template_params_invalid")
+                        log("template_params_invalid", "\n警告：模板参数不可用，回退为解析模型输出中的SQL：{error}",
+                            logging.WARNING, error=e)
 
                 # 生成SQL
+                sql_args = None
                 sql = self.sql_generator.extract_sql(llm_output)
                 
                 # 在验证之前进行字段替换（因为验证不检查字段名，所以可以提前替换）
                 # 但为了保持日志中显示原始SQL，我们先保存原始SQL
                 original_sql = sql
-                sql = self.sql_field_replacer.replace_fields(sql)
-                
+                sql, rewrites = self.sql_field_replacer.rewrite(sql)
+
                 # 如果SQL被替换了，记录替换信息
-                if sql != original_sql:
-                    log(f"\n--- SQL字段替换 ---")
-                    log(f"原始SQL: {original_sql}")
-                    log(f"替换后SQL: {sql}")
+                if rewrites:
+                    log("sql_rewrite", "\n--- SQL字段替换 ---\n原始SQL: {original_sql}\n替换规则: {rules}\n替换后SQL: {sql}",
+                        original_sql=original_sql, sql=sql,
+                        rules=Lazy(lambda pairs: ', '.join(f'{src} -> {dst}' for src, dst in pairs), rewrites))
                 
                 result["sql"] = sql
 
                 # 始终输出SQL到终端
-                log(f"\n--- SQL（第 {gen_attempt} 次） ---\n{sql}")
+                log("sql_generated", "\n--- SQL（第 {attempt} 次） ---\n{sql}", attempt=gen_attempt, sql=sql)
+
+                emit("sql", sql=sql, mode="free", rewrites=[list(pair) for pair in rewrites], attempt=gen_attempt)
 
                 # 验证SQL
-                if self.sql_validator.validate_sql(sql, self.allowed_tables):
+                passed = self.sql_validator.validate_sql(sql, self.allowed_tables)
+                emit("validation", passed=passed, mode="free", attempt=gen_attempt)
+                if passed:
                     break
 
                 # 未通过校验
                 if gen_attempt == max_sql_gen_retries:
                     error_msg = "生成的 SQL 未通过校验（多次重试仍失败）"
                     result["error"] = error_msg
-                    log(f"\n错误：{error_msg}\n最后一次SQL: {sql}")
+                    log("sql_validation_failed", "\n错误：{error}\n最后一次SQL: {sql}", logging.ERROR,
+                        error=error_msg, sql=sql)
                     return result
                 else:
-                    log(f"\n警告：生成的 SQL 未通过校验，将重新调用模型生成 SQL（第 {gen_attempt} 次失败）")
+                    RETRIES_TOTAL.inc(reason="validation_failed")
+                    log("sql_validation_retry", "\n警告：生成的 SQL 未通过校验，将重新调用模型生成 SQL（第 {attempt} 次失败）",
+                        logging.WARNING, attempt=gen_attempt)
 
             # 执行查询，增加最多3次重试机制（适用于偶发性数据库错误）
             max_retries = 3
             last_error = None
             for attempt in range(1, max_retries + 1):
                 try:
-                    rows = self.database.run_query(sql)
+                    rows = self.database.run_query(sql, sql_args)
                     result["rows"] = rows
                     break
                 except Exception as e:
                     last_error = e
-                    log(f"\n警告：第 {attempt} 次执行 SQL 失败：{e}")
+                    log("db_error", "\n警告：第 {attempt} 次执行 SQL 失败：{error}", logging.WARNING,
+                        attempt=attempt, error=e)
                     # 如果已经达到最大重试次数，则抛出，由外层统一处理错误
                     if attempt == max_retries:
                         raise
+                    RETRIES_TOTAL.inc(reason="db_error")
 
             # 始终输出查询结果到终端
-            log(f"\n--- 查询结果（前5行，实际{len(rows)}行） ---")
-            log(json.dumps(rows[:5], ensure_ascii=False, indent=2))
+            log("query_result", "\n--- 查询结果（前5行，实际{row_count}行） ---\n{preview}",
+                row_count=len(rows),
+                preview=Lazy(json.dumps, rows[:5], ensure_ascii=False, indent=2, default=json_default))
 
             # 生成总结（返回结构化字典）
             if not skip_summary:
@@ -273,10 +371,9 @@ class AI2SQLService:
                 result["summary"] = summary_dict
 
                 # 始终输出总结到终端
-                log(f"\n--- 总结 ---")
-                log(f"总结内容：{summary_dict.get('summaryContent', '')}")
-                log(f"关键信息：{summary_dict.get('keyInfo', '')}")
-                log(f"记录概览：{summary_dict.get('recordOverview', '')}")
+                log("summary", "\n--- 总结 ---\n总结内容：{content}\n关键信息：{key_info}\n记录概览：{overview}",
+                    content=summary_dict.get('summaryContent', ''), key_info=summary_dict.get('keyInfo', ''),
+                    overview=summary_dict.get('recordOverview', ''))
 
             # 无论是否生成总结，只要SQL执行成功并拿到结果，就视为success
             result["success"] = True
@@ -285,31 +382,46 @@ class AI2SQLService:
             error_msg = f"查询处理失败: {str(e)}"
             result["error"] = error_msg
             # 始终输出错误信息到终端
-            log(f"\n错误：{error_msg}")
-            import traceback
-            error_trace = traceback.format_exc()
-            log(error_trace)
+            log("query_failed", "\n错误：{error}\n{trace}", logging.ERROR,
+                error=error_msg, trace=Lazy(format_exception, e))
+
+        finally:
+            if transcript is not None:
+                result["logs"] = transcript.lines()
 
         return result
 
     def query_with_retries(self, question: str, collect_logs: bool = False,
-                           max_retries: int = 3, skip_summary: bool = False) -> Dict:
+                           max_retries: int = 3, skip_summary: bool = False,
+                           on_event: Optional[Callable[[str, Dict], None]] = None) -> Dict:
         """
         带整体重试机制的查询：
         - 如果本轮查询出现错误（success=False）→ 视为失败，重试
         - 最多重试 max_retries 次（包括第一次）
+        - on_event 透传给 query()，并在每轮开始时推送 attempt 事件
         """
         last_result: Dict = {}
         attempt_count = 0
+        llm_calls = 0
         for attempt in range(1, max_retries + 1):
             attempt_count = attempt
             logger.info(f"\n=== 第 {attempt} 次尝试执行查询 ===")
-            result = self.query(question, collect_logs=collect_logs, skip_summary=skip_summary)
+            if on_event is not None:
+                on_event("attempt", {"attempt": attempt, "max_retries": max_retries})
+            result = self.query(question, collect_logs=collect_logs, skip_summary=skip_summary,
+                                on_event=on_event)
+            llm_calls += result.get("llm_calls", 0)
+            result["llm_calls"] = llm_calls
             last_result = result
 
+            # 需要用户澄清（如名称有歧义）时重试没有意义，直接返回
+            if result.get("needs_clarification"):
+                break
+
             # 如果本轮查询失败（包括大模型错误、SQL 生成错误、数据库错误等），且还有重试机会，继续重试
             if not result.get("success"):
                 if attempt < max_retries:
+                    RETRIES_TOTAL.inc(reason="query_failed")
                     logger.info("本次查询处理失败，将重新尝试...")
                 continue
 
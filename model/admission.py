@@ -0,0 +1,196 @@
+"""
+查询准入控制：限制同时执行的查询数，防止单个用户（或测试页批量执行）占满所有 worker 线程与LLM并发
+
+    - 全局并发上限 max_concurrent，批量通道（测试页等）另有更低的上限 batch_max_concurrent，
+      保证交互式请求始终有空位
+    - 每个用户的并发上限 per_user（进行中 + 排队中），超出时直接拒绝，不占用排队位置
+    - 有界等待队列：没有空位时排队，交互式通道优先于批量通道，同一通道内先到先得；
+      队列已满或等待超过 queue_timeout 秒时拒绝
+    - 拒绝时抛出 AdmissionRejected，携带建议的重试间隔（按近期平均执行耗时估算），由接口返回 429 + Retry-After
+
+限制按进程生效：gunicorn 多 worker 部署时全局上限为 workers × max_concurrent。
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from config.metrics import ADMISSION_TOTAL, ADMISSION_WAIT_SECONDS
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+_LANE_PRIORITY = {INTERACTIVE: 0, BATCH: 1}
+
+
+class AdmissionRejected(Exception):
+    """请求未被准入（reason: user_limit / queue_full / timeout）"""
+
+    def __init__(self, reason: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    """一次准入凭证，执行结束后交还 release()"""
+    user: str
+    lane: str
+    admitted_at: float = field(default_factory=time.monotonic)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    user: str = field(compare=False)
+    lane: str = field(compare=False)
+    granted: bool = field(default=False, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class AdmissionController:
+    """全局/每用户并发限制 + 带优先级与截止时间的有界等待队列"""
+
+    def __init__(self, max_concurrent: int = 16, per_user: int = 2, queue_size: int = 32,
+                 queue_timeout: float = 30.0, batch_max_concurrent: Optional[int] = None):
+        """
+        Args:
+            max_concurrent: 同时执行的查询上限
+            per_user: 单个用户同时进行（执行中 + 排队中）的查询上限
+            queue_size: 等待队列长度上限
+            queue_timeout: 排队等待的最长时间（秒）
+            batch_max_concurrent: 批量通道同时执行的上限，默认 max_concurrent 的一半
+        """
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.batch_max_concurrent = batch_max_concurrent or max(1, max_concurrent // 2)
+
+        self._cond = threading.Condition()
+        self._waiters: List[_Waiter] = []  # 按 (通道优先级, 到达顺序) 排列的小顶堆
+        self._seq = itertools.count()
+        self._active = {INTERACTIVE: 0, BATCH: 0}
+        self._user_load: Dict[str, int] = {}
+        # 近期单次查询执行耗时（指数滑动平均），用于估算 Retry-After
+        self._avg_service = 5.0
+
+    def reset_after_fork(self):
+        """fork 后在子进程中调用：丢弃父进程的计数与锁"""
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._active = {INTERACTIVE: 0, BATCH: 0}
+        self._user_load = {}
+
+    def _has_capacity(self, lane: str) -> bool:
+        if sum(self._active.values()) >= self.max_concurrent:
+            return False
+        return lane != BATCH or self._active[BATCH] < self.batch_max_concurrent
+
+    def _grant(self):
+        """按优先级把空位分给排队者（批量通道满时，后面的交互式请求仍可越过它）"""
+        changed = False
+        for waiter in sorted(self._waiters):
+            if waiter.cancelled or waiter.granted:
+                continue
+            if sum(self._active.values()) >= self.max_concurrent:
+                break
+            if self._has_capacity(waiter.lane):
+                waiter.granted = True
+                self._active[waiter.lane] += 1
+                changed = True
+        if changed:
+            self._waiters = [w for w in self._waiters if not w.granted and not w.cancelled]
+            heapq.heapify(self._waiters)
+            self._cond.notify_all()
+
+    def _retry_after(self) -> int:
+        """按排队长度与平均执行耗时估算多久后重试（秒）"""
+        rounds = (len(self._waiters) + 1) / self.max_concurrent
+        return max(1, math.ceil(rounds * self._avg_service))
+
+    def _reject(self, user: str, lane: str, reason: str, message: str) -> AdmissionRejected:
+        ADMISSION_TOTAL.inc(lane=lane, result=reason)
+        return AdmissionRejected(reason, message, self._retry_after())
+
+    def _release_user(self, user: str):
+        load = self._user_load.get(user, 0) - 1
+        if load > 0:
+            self._user_load[user] = load
+        else:
+            self._user_load.pop(user, None)
+
+    def acquire(self, user: str, lane: str = INTERACTIVE) -> Ticket:
+        """申请执行名额，必要时排队等待；无法准入时抛出 AdmissionRejected"""
+        lane = lane if lane in _LANE_PRIORITY else INTERACTIVE
+        start = time.monotonic()
+        with self._cond:
+            if self._user_load.get(user, 0) >= self.per_user:
+                raise self._reject(user, lane, "user_limit",
+                                   f"您已有 {self.per_user} 个查询正在进行，请等待完成后再提交")
+            # 没有更高优先级的排队者且有空位时直接执行
+            ahead = any(_LANE_PRIORITY[w.lane] <= _LANE_PRIORITY[lane] for w in self._waiters)
+            if not ahead and self._has_capacity(lane):
+                self._active[lane] += 1
+                self._user_load[user] = self._user_load.get(user, 0) + 1
+                ADMISSION_TOTAL.inc(lane=lane, result="admitted")
+                ADMISSION_WAIT_SECONDS.observe(0.0, lane=lane)
+                return Ticket(user, lane)
+            if len(self._waiters) >= self.queue_size:
+                raise self._reject(user, lane, "queue_full", "系统繁忙，请稍后重试")
+
+            waiter = _Waiter(_LANE_PRIORITY[lane], next(self._seq), user, lane)
+            heapq.heappush(self._waiters, waiter)
+            self._user_load[user] = self._user_load.get(user, 0) + 1
+            self._grant()
+            deadline = start + self.queue_timeout
+            while not waiter.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    waiter.cancelled = True
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                    self._release_user(user)
+                    # 被取消的排队者可能挡住了其他通道，重新分配
+                    self._grant()
+                    raise self._reject(user, lane, "timeout", "排队等待超时，系统繁忙，请稍后重试")
+                self._cond.wait(timeout=remaining)
+        ADMISSION_TOTAL.inc(lane=lane, result="admitted")
+        ADMISSION_WAIT_SECONDS.observe(time.monotonic() - start, lane=lane)
+        return Ticket(user, lane)
+
+    def release(self, ticket: Ticket):
+        """交还执行名额并唤醒排队者"""
+        elapsed = time.monotonic() - ticket.admitted_at
+        with self._cond:
+            self._active[ticket.lane] -= 1
+            self._release_user(ticket.user)
+            self._avg_service = 0.8 * self._avg_service + 0.2 * elapsed
+            self._grant()
+
+    @contextmanager
+    def admit(self, user: str, lane: str = INTERACTIVE):
+        """acquire/release 的上下文管理器形式"""
+        ticket = self.acquire(user, lane)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> Dict:
+        """当前执行中/排队中的请求数"""
+        with self._cond:
+            return {
+                "active": dict(self._active),
+                "waiting": {
+                    lane: sum(1 for w in self._waiters if w.lane == lane) for lane in _LANE_PRIORITY
+                },
+                "users": len(self._user_load),
+                "avg_service_seconds": self._avg_service,
+            }
@@ -1,14 +1,109 @@
+import json
+
+from config.config import params
 from llm_client import LLMClient
+from intent_router import IntentRouter
+from tool_executor import ToolExecutor, parse_tool_calls
 from prompts import *
 
 
 class SQLAgents(LLMClient):
     def __init__(self, description):
         super().__init__(description)
-        self.allow_tools = ["intent_steering", "generate_sql", "summarize"]
+        self.allow_tools = ["intent_steering", "select_base_info", "generate_sql", "summarize"]
+
+        # 系统提示词在每个会话的上下文中始终保留
+        self.system_prompt = main_prompt
+
+        # intent_steering 在本地执行（BM25 检索业务用表，毫秒级），命中时省去一次 LLM 工具调用往返
+        self.intent_router = IntentRouter.from_files()
+
+        # 工具调用循环：同一轮的工具并发执行，每轮有超时，总轮数有上限，结果按会话缓存
+        self.max_steps = getattr(params, "agent_max_steps", 6)
+        self.executor = ToolExecutor(
+            max_workers=getattr(params, "agent_tool_workers", 4),
+            step_timeout=getattr(params, "agent_step_timeout", 30.0),
+            cache_size=getattr(params, "agent_tool_cache_size", 128),
+            max_sessions=getattr(params, "context_max_sessions", 1000),
+            session_ttl=getattr(params, "context_ttl", 3600),
+        )
+        self.executor.register("intent_steering", self.intent_steering)
+        self.executor.register("select_base_info", self.select_base_info)
+
+    def register_tool(self, name: str, handler, cacheable: bool = True):
+        """注册工具实现（如 generate_sql、summarize 由查数服务提供），未注册的工具不会提供给 LLM"""
+        self.executor.register(name, handler, cacheable)
+
+    def available_tools(self) -> list:
+        return [name for name in self.allow_tools if name in self.executor]
+
+    def intent_steering(self, query: str) -> dict:
+        """本地实现的 intent_steering 工具，返回格式与 main_prompt 中的工具说明一致"""
+        steering = self.intent_router.route(query)
+        return {"reference_table": steering["reference_table"], "transaction_table": steering["transaction_table"]}
+
+    def select_base_info(self, table_name: str) -> dict:
+        """返回基础信息表的 schema（取自 schema_prompt.txt）"""
+        table = self.intent_router.tables.get(table_name.strip())
+        if table is None:
+            return {"error": f"不存在的表: {table_name}", "tables": list(self.intent_router.tables)}
+        return {"table_name": table.name, "schema": table.schema}
+
+    def _steer(self, query: str):
+        """
+        本地完成 intent_steering，把结果随问题一起交给 LLM，并且不再向 LLM 提供 intent_steering 工具；
+        本地没有命中任何表时保持原流程，由 LLM 判断是否需要查数
+        """
+        tool_names = self.available_tools()
+        steering = self.intent_router.route(query)
+        if steering["matched"] and "intent_steering" in tool_names:
+            result = {"reference_table": steering["reference_table"], "transaction_table": steering["transaction_table"]}
+            query = f"{query}\n\n[intent_steering 已完成，无需再调用] {json.dumps(result, ensure_ascii=False)}"
+            tool_names.remove("intent_steering")
+        return query, tool_names
+
+    def ask(self, query: str, session_id: str):
+        """单轮请求：本地完成 intent_steering 后请求 LLM，返回接口原始响应（不执行工具）"""
+        query, tool_names = self._steer(query)
+        return self.response(query, tool_names, session_id)
 
-        self.remember("system", main_prompt)
+    def run(self, query: str, session_id: str) -> dict:
+        """
+        工具调用循环：请求 LLM → 并发执行本轮返回的所有工具调用 → 结果写回上下文 → 再次请求，
+        直到 LLM 不再调用工具或达到 max_steps 轮
 
-    def parsing_resp(self, response):
-        pass
+        Returns:
+            {"answer": 最终回复, "steps": 执行的工具轮数, "tool_calls": 每次调用的名称/状态/耗时, "error": 错误或 None}
+        """
+        query, tool_names = self._steer(query)
+        response = self.response(query, tool_names, session_id)
+        trace = []
+        for step in range(self.max_steps + 1):
+            message = self.parsing_resp(response)
+            if message["error"]:
+                return {"answer": "", "steps": step, "tool_calls": trace, "error": message["error"]}
+            if not message["tool_calls"]:
+                return {"answer": message["content"], "steps": step, "tool_calls": trace, "error": None}
+            if step == self.max_steps:
+                break
+            results = self.executor.run(message["tool_calls"], session_id)
+            for result in results:
+                self.remember("tool", result["content"], session_id, tool_call_id=result["tool_call_id"])
+                trace.append({"step": step + 1, **{k: result[k] for k in ("name", "status", "seconds")}})
+            response = self.response(None, tool_names, session_id)
+        return {"answer": "", "steps": self.max_steps, "tool_calls": trace,
+                "error": f"超过最大工具调用轮数（{self.max_steps}）"}
 
+    def parsing_resp(self, response) -> dict:
+        """解析接口响应：{"content": 文本回复, "tool_calls": 原始 tool_calls 列表, "calls": 规范化的调用, "error"}"""
+        if not isinstance(response, dict) or not response.get("choices"):
+            error = (response.get("error") or response) if isinstance(response, dict) else response
+            return {"content": "", "tool_calls": [], "calls": [], "error": str(error)}
+        message = ((response.get("choices") or [{}])[0]).get("message") or {}
+        tool_calls = message.get("tool_calls") or []
+        return {
+            "content": message.get("content") or "",
+            "tool_calls": tool_calls,
+            "calls": parse_tool_calls(tool_calls),
+            "error": None,
+        }
@@ -0,0 +1,219 @@
+"""
+多轮对话上下文：按会话隔离，提示词长度有上限
+
+    - 每个会话一个 ConversationContext，LLMClient 不再在实例上共享一个无限增长的 context 列表
+    - 按 token 预算保留最近的若干轮（滑动窗口），超出预算的旧消息增量折叠进滚动摘要，
+      每轮请求的提示词 = 系统提示词 + 摘要 + 最近消息，长度不随对话轮数增长
+    - 历史中的 SQL 与查询结果只保留简短引用（如 [SQL#2]、[结果#3: 120行]），完整内容留在 artifacts 中，
+      需要时按引用取回
+    - 工具调用：助手消息可携带 tool_calls，工具结果消息携带 tool_call_id；折叠旧消息时不会留下
+      失去对应 tool_calls 的工具结果（否则 LLM 接口会拒绝请求）
+    - ContextStore：会话ID -> 上下文，LRU + 空闲超时淘汰
+
+token 数按字符粗略估算（中文每字约1个token，其余约4个字符1个token），只用于预算控制，不追求与模型分词一致。
+"""
+
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]")
+_SQL_PATTERN = re.compile(r"\b(SELECT|WITH)\b[\s\S]+?\bFROM\b[\s\S]*", re.IGNORECASE)
+
+# 超过该 token 数的 SQL/结果 才替换为引用
+REF_MIN_TOKENS = 60
+# 每个会话保留的 SQL/结果 原文数量上限（更早的引用只剩摘要中的简述）
+MAX_ARTIFACTS = 50
+# 每条消息固定开销（role 等字段）
+_MESSAGE_OVERHEAD = 4
+
+
+def count_tokens(text: str) -> int:
+    """粗略估算 token 数：中文字符各计 1，其余字符每 4 个计 1"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class _Message:
+    role: str
+    content: str
+    tokens: int
+    extra: Dict = field(default_factory=dict)  # tool_calls / tool_call_id 等随消息原样发送的字段
+
+    def to_dict(self) -> Dict:
+        return {"role": self.role, "content": self.content, **self.extra}
+
+
+def extractive_summary(previous: str, messages: List[Dict]) -> str:
+    """默认的增量摘要：每条被折叠的消息保留一行要点（不调用LLM）"""
+    lines = [previous] if previous else []
+    for message in messages:
+        content = " ".join(message["content"].split())
+        if len(content) > 80:
+            content = content[:80] + "…"
+        prefix = {"user": "用户", "assistant": "助手", "tool": "工具"}.get(message["role"], message["role"])
+        lines.append(f"{prefix}：{content}")
+    return "\n".join(lines)
+
+
+class ConversationContext:
+    """单个会话的上下文：滑动窗口 + 滚动摘要 + SQL/结果引用"""
+
+    def __init__(self, system_prompt: str = "", max_tokens: int = 6000, min_recent: int = 4,
+                 summary_max_tokens: int = 800,
+                 summarize: Callable[[str, List[Dict]], str] = extractive_summary):
+        """
+        Args:
+            system_prompt: 系统提示词（始终保留，不计入可折叠部分）
+            max_tokens: 每轮提示词（系统提示词 + 摘要 + 最近消息）的 token 预算
+            min_recent: 至少保留的最近消息条数，即使超出预算也不折叠
+            summary_max_tokens: 滚动摘要的 token 上限，超出时丢弃摘要中最早的内容
+            summarize: 增量摘要函数 (已有摘要, 新折叠的消息) -> 新摘要
+        """
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.min_recent = min_recent
+        self.summary_max_tokens = summary_max_tokens
+        self.summarize = summarize
+
+        self.lock = threading.Lock()
+        self.summary = ""
+        self.messages: List[_Message] = []
+        self.artifacts: "OrderedDict[str, str]" = OrderedDict()
+        self.last_used = time.monotonic()
+        self._ref_seq = 0
+        self._tokens = 0
+
+    def _ref(self, kind: str, content: str, label: str) -> str:
+        self._ref_seq += 1
+        ref = f"{kind}#{self._ref_seq}"
+        self.artifacts[ref] = content
+        while len(self.artifacts) > MAX_ARTIFACTS:
+            self.artifacts.popitem(last=False)
+        return f"[{ref}{label}]"
+
+    def _shorten(self, role: str, content: str) -> str:
+        """历史中的大段SQL/查询结果替换为引用"""
+        if count_tokens(content) < REF_MIN_TOKENS:
+            return content
+        if role == "tool":
+            try:
+                data = json.loads(content)
+            except ValueError:
+                data = None
+            rows = data.get("rows") if isinstance(data, dict) else data if isinstance(data, list) else None
+            if rows is not None:
+                return self._ref("结果", content, f": {len(rows)}行")
+        match = _SQL_PATTERN.search(content)
+        if match and count_tokens(match.group(0)) >= REF_MIN_TOKENS:
+            sql = match.group(0)
+            head = " ".join(sql.split())[:40]
+            return content[:match.start()] + self._ref("SQL", sql, f": {head}…")
+        return content
+
+    def add(self, role: str, content, **extra) -> None:
+        """追加一条消息；content 非字符串时按 JSON 保存，extra 为 tool_calls / tool_call_id 等附加字段"""
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        content = self._shorten(role, content)
+        tokens = count_tokens(content) + _MESSAGE_OVERHEAD
+        if extra:
+            tokens += count_tokens(json.dumps(extra, ensure_ascii=False, default=str))
+        message = _Message(role, content, tokens, extra)
+        self.messages.append(message)
+        self._tokens += message.tokens
+        self.last_used = time.monotonic()
+        self._compact()
+
+    def _budget_left(self) -> int:
+        return self.max_tokens - count_tokens(self.system_prompt) - count_tokens(self.summary) - self._tokens
+
+    def _compact(self):
+        """
+        最近消息超出窗口时，把最早的消息增量折叠进摘要（每次只处理新移出窗口的消息）
+
+        预算划分：系统提示词之外，为摘要预留 min(summary_max_tokens, 剩余预算的1/3)，其余为最近消息窗口
+        """
+        available = self.max_tokens - count_tokens(self.system_prompt)
+        window = available - min(self.summary_max_tokens, available // 3)
+        evicted: List[_Message] = []
+        while self._tokens > window and len(self.messages) > self.min_recent:
+            message = self.messages.pop(0)
+            self._tokens -= message.tokens
+            evicted.append(message)
+        # 对应的 tool_calls 已被折叠的工具结果一并折叠
+        while evicted and self.messages and self.messages[0].role == "tool":
+            message = self.messages.pop(0)
+            self._tokens -= message.tokens
+            evicted.append(message)
+        if evicted:
+            self.summary = self.summarize(self.summary, [m.to_dict() for m in evicted])
+        # 摘要不超过自身上限，也不超过预算扣除最近消息后的剩余部分；超出时丢弃最早的内容
+        limit = max(0, min(self.summary_max_tokens, available - self._tokens))
+        while count_tokens(self.summary) > limit and "\n" in self.summary:
+            self.summary = self.summary.split("\n", 1)[1]
+        if count_tokens(self.summary) > limit:
+            self.summary = self.summary[len(self.summary) - limit:] if limit else ""
+
+    def build_messages(self, query: Optional[str] = None) -> List[Dict]:
+        """组装本轮请求的消息列表；query 非空时先作为用户消息加入上下文"""
+        if query is not None:
+            self.add("user", query)
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        if self.summary:
+            messages.append({"role": "system", "content": f"此前对话摘要（较早的SQL与结果以引用表示）：\n{self.summary}"})
+        messages.extend(m.to_dict() for m in self.messages)
+        return messages
+
+    def artifact(self, ref: str) -> Optional[str]:
+        """按引用取回完整的SQL或查询结果（ref 如 "SQL#2"）"""
+        return self.artifacts.get(ref.strip("[]").split(":")[0])
+
+    def stats(self) -> Dict:
+        return {
+            "messages": len(self.messages),
+            "message_tokens": self._tokens,
+            "summary_tokens": count_tokens(self.summary),
+            "prompt_tokens": self.max_tokens - self._budget_left(),
+            "artifacts": len(self.artifacts),
+        }
+
+
+class ContextStore:
+    """会话ID -> ConversationContext，超过 max_sessions 按 LRU 淘汰，空闲超过 ttl 秒的会话过期"""
+
+    def __init__(self, factory: Callable[[], ConversationContext], max_sessions: int = 1000, ttl: float = 3600):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._contexts: "OrderedDict[str, ConversationContext]" = OrderedDict()
+
+    def get(self, session_id: str) -> ConversationContext:
+        now = time.monotonic()
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is not None and now - context.last_used > self.ttl:
+                context = None
+            if context is None:
+                context = self._contexts[session_id] = self.factory()
+            self._contexts.move_to_end(session_id)
+            while len(self._contexts) > self.max_sessions:
+                self._contexts.popitem(last=False)
+            return context
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._contexts.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._contexts)
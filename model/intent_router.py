@@ -0,0 +1,254 @@
+"""
+本地意图路由：在进程内实现 intent_steering，按用户问题检索最相关的业务用表，省去一次 LLM 往返
+
+    - 索引：schema_prompt.txt 中每张表一个文档（表名、字段名与字段说明），加上 模块说明.txt 中
+      提到该表的行（意图映射提示，如“查询跟班任务内容：跟班作业记录表.重点部位…”）
+    - 检索：BM25（Okapi，k1=1.5，b=0.75）；中文分词优先用 jieba（搜索模式，表名与字段名加入词典），
+      并始终加入双字切分，未登录词也能匹配；未安装 jieba 时只用双字切分
+    - 分类：模块说明中被列为“主体表”的是业务数据表（transaction_table），其余为基础字典表（reference_table）
+    - 选中业务数据表后，其字段说明中“对应 某表.字段”引用到的字典表一并返回（关联查询需要）
+    - 没有任何表命中时 matched 为 False，调用方可直接回答，不进入查数流程
+
+返回格式与 model/prompts.py 中 intent_steering 工具一致：
+    {'reference_table': ['基础字典表'], 'transaction_table': ['业务数据表']}
+
+使用方法: python model/intent_router.py "查询李明的跟带班记录" [--bench 1000]
+"""
+
+import argparse
+import json
+import logging
+import math
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+SCHEMA_PATH = DATA_DIR / "schema_prompt.txt"
+MODULE_PATH = DATA_DIR / "管控计划模块" / "模块说明.txt"
+
+_SPAN_PATTERN = re.compile(r"[\u4e00-\u9fff]+|[A-Za-z0-9_]+")
+_CORRECTION_PATTERN = re.compile(r"\[#指正#[^\]]*\]")
+_REFERENCE_PATTERN = re.compile(r"对应\s*([\u4e00-\u9fffA-Za-z0-9_]+)\.")
+_FIELD_PATTERN = re.compile(r"^-\s*([^\s(（:：]+)")
+# 在几乎所有文档中都会出现、对区分表没有帮助的词
+_STOPWORDS = {"查询", "对应", "通过", "表示", "以及", "哪些", "什么", "多少", "是否", "一下", "记录", "信息", "情况"}
+# 口语说法改写为模块说明中的业务用语（模块说明 1.5：工作内容包含跟班任务内容与带班任务内容）
+_QUERY_REWRITES = {
+    "跟带班": "跟班 带班",
+    "做了什么": "工作内容",
+    "干了什么": "工作内容",
+    "在做什么": "工作内容",
+    "在干什么": "工作内容",
+}
+# 表名在文档中的权重（重复次数）
+_NAME_BOOST = 3
+
+
+def tokenize(text: str) -> List[str]:
+    """中文：jieba 搜索模式分词 + 双字切分；英文/数字：按词小写"""
+    tokens = []
+    for span in _SPAN_PATTERN.findall(text):
+        if span.isascii():
+            tokens.append(span.lower())
+            continue
+        if JIEBA_AVAILABLE:
+            tokens.extend(w for w in jieba.lcut_for_search(span) if len(w) > 1 and w not in _STOPWORDS)
+        if len(span) == 1:
+            tokens.append(span)
+        tokens.extend(b for b in (span[i:i + 2] for i in range(len(span) - 1)) if b not in _STOPWORDS)
+    return tokens
+
+
+class BM25:
+    """Okapi BM25"""
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.freqs = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = sum(self.lengths) / len(documents) if documents else 0.0
+        df = Counter(term for freq in self.freqs for term in freq)
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+    def scores(self, query: Iterable[str]) -> List[float]:
+        terms = [t for t in set(query) if t in self.idf]
+        result = []
+        for freq, length in zip(self.freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length)
+            score = 0.0
+            for term in terms:
+                tf = freq.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            result.append(score)
+        return result
+
+
+@dataclass
+class TableDoc:
+    name: str
+    text: str
+    schema: str = ""
+    fields: List[str] = field(default_factory=list)
+    references: List[str] = field(default_factory=list)
+    transaction: bool = False
+
+
+def parse_schema(text: str) -> Dict[str, TableDoc]:
+    """按空行切分 schema_prompt.txt 的表块：表名、字段名、字段说明与引用的其他表"""
+    tables: Dict[str, TableDoc] = {}
+    for block in re.split(r"\n\s*\n", text):
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if not lines or not lines[0].startswith("表名"):
+            continue
+        name = re.split(r"[:：]", lines[0], 1)[1].strip()
+        doc = TableDoc(name=name, text="", schema=block.strip())
+        body = []
+        for line in lines[1:]:
+            line = _CORRECTION_PATTERN.sub("", line)
+            match = _FIELD_PATTERN.match(line)
+            if match:
+                doc.fields.append(match.group(1))
+            doc.references.extend(_REFERENCE_PATTERN.findall(line))
+            # “对应 某表.字段” 是关联关系，不计入本表的检索文本，避免被其他表的名称命中
+            body.append(re.sub(r"对应\s*\S+", "", line))
+        doc.text = "\n".join(body)
+        tables[name] = doc
+    for doc in tables.values():
+        doc.references = list(dict.fromkeys(r for r in doc.references if r in tables and r != doc.name))
+    return tables
+
+
+def _mentioned(line: str, names: List[str]) -> List[str]:
+    """行中提到的表名（长表名优先匹配，避免“每日管控计划”误匹配“每日管控计划_子表”）"""
+    found = []
+    for name in names:
+        if name in line:
+            found.append(name)
+            line = line.replace(name, " ")
+    return found
+
+
+class IntentRouter:
+    """基于 BM25 的本地 intent_steering"""
+
+    def __init__(self, schema_text: str, module_text: str = "", max_tables: int = 3, min_ratio: float = 0.5):
+        """
+        Args:
+            schema_text: schema_prompt.txt 内容
+            module_text: 模块说明.txt 内容（意图映射提示）
+            max_tables: 最多返回的业务数据表数
+            min_ratio: 得分不低于最高分该比例的表才返回
+        """
+        self.max_tables = max_tables
+        self.min_ratio = min_ratio
+        self.tables = parse_schema(schema_text)
+        names = sorted(self.tables, key=len, reverse=True)
+        hints: Dict[str, List[str]] = {name: [] for name in self.tables}
+        for line in module_text.splitlines():
+            mentioned = _mentioned(line, names)
+            for name in mentioned:
+                # 同一行中其他表的表名不计入本表，避免“通过A表关联到B表”让两张表互相命中
+                hint = line.replace(name, "\0")
+                for other in mentioned:
+                    hint = hint.replace(other, " ")
+                hints[name].append(hint.replace("\0", name).strip())
+            if "主体表" in line:
+                for name in mentioned:
+                    self.tables[name].transaction = True
+        if not any(doc.transaction for doc in self.tables.values()):
+            # 模块说明缺失时按表名区分：字典/信息/清单类为基础字典表
+            for doc in self.tables.values():
+                doc.transaction = not re.search(r"字典|信息表|清单", doc.name)
+
+        if JIEBA_AVAILABLE:
+            for doc in self.tables.values():
+                jieba.add_word(doc.name)
+                for name in doc.fields:
+                    jieba.add_word(name)
+        self._names = list(self.tables)
+        documents = []
+        for name in self._names:
+            doc = self.tables[name]
+            text = "\n".join([name] * _NAME_BOOST + [doc.text] + hints[name])
+            documents.append(tokenize(text))
+        self.index = BM25(documents)
+
+    @classmethod
+    def from_files(cls, schema_path: Path = SCHEMA_PATH, module_path: Optional[Path] = MODULE_PATH,
+                   **kwargs) -> "IntentRouter":
+        schema_text = Path(schema_path).read_text(encoding="utf-8")
+        module_text = ""
+        if module_path is not None and Path(module_path).exists():
+            module_text = Path(module_path).read_text(encoding="utf-8")
+        return cls(schema_text, module_text, **kwargs)
+
+    def rank(self, query: str) -> List[tuple]:
+        """所有表按得分从高到低排序：[(表名, 得分), ...]"""
+        for phrase, replacement in _QUERY_REWRITES.items():
+            query = query.replace(phrase, f" {replacement} ")
+        scores = self.index.scores(tokenize(query))
+        return sorted(zip(self._names, scores), key=lambda item: -item[1])
+
+    def route(self, query: str) -> Dict:
+        """
+        intent_steering：返回与问题最相关的业务数据表与所需的基础字典表
+
+        Returns:
+            {"matched": bool, "reference_table": [...], "transaction_table": [...], "scores": {表名: 得分}}
+        """
+        ranked = [(name, score) for name, score in self.rank(query) if score > 0]
+        # 业务数据表与字典表分别按各自的最高分筛选：字典表命中很高（如人名、工序名）时不挤掉业务数据表
+        selected = {}
+        for transaction in (True, False):
+            group = [(name, score) for name, score in ranked if self.tables[name].transaction == transaction]
+            top = group[0][1] if group else 0.0
+            selected[transaction] = [name for name, score in group if score >= top * self.min_ratio]
+        transactions = selected[True][:self.max_tables]
+        references = list(selected[False])
+        for name in transactions:
+            references.extend(self.tables[name].references)
+        references = [name for name in dict.fromkeys(references) if not self.tables[name].transaction]
+        return {
+            "matched": bool(ranked),
+            "reference_table": references,
+            "transaction_table": transactions,
+            "scores": {name: round(score, 3) for name, score in ranked},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地意图路由（intent_steering）")
+    parser.add_argument("query", help="用户问题")
+    parser.add_argument("--schema", type=Path, default=SCHEMA_PATH, help="schema_prompt.txt 路径")
+    parser.add_argument("--module", type=Path, default=MODULE_PATH, help="模块说明.txt 路径")
+    parser.add_argument("--bench", type=int, default=0, help="重复检索次数，输出单次平均耗时")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    router = IntentRouter.from_files(args.schema, args.module)
+    build_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps(router.route(args.query), ensure_ascii=False, indent=2))
+    print(f"索引 {len(router.tables)} 张表，构建 {build_ms:.1f}ms，分词: {'jieba+双字' if JIEBA_AVAILABLE else '双字'}")
+    if args.bench:
+        start = time.perf_counter()
+        for _ in range(args.bench):
+            router.route(args.query)
+        print(f"单次检索 {(time.perf_counter() - start) * 1000 / args.bench:.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from config.config import params, logger
 from llm_tools import tool_list
+from conversation import ContextStore, ConversationContext
 import requests
 
 
@@ -14,19 +15,45 @@ class LLMClient:
         self.llm_model = params.llm_model
         self.llm_api_key = params.llm_api_key
 
-        # 上下文
-        self.context = []
+        # 上下文：按会话隔离，每轮提示词不超过 token 预算（旧消息折叠为摘要，SQL/结果保留为引用）
+        self.system_prompt = ""
+        self.context_max_tokens = getattr(params, "context_max_tokens", 6000)
+        self.context_min_recent = getattr(params, "context_min_recent", 4)
+        self.context_summary_max_tokens = getattr(params, "context_summary_max_tokens", 800)
+        self.contexts = ContextStore(
+            self._new_context,
+            max_sessions=getattr(params, "context_max_sessions", 1000),
+            ttl=getattr(params, "context_ttl", 3600),
+        )
 
         # 个性化工具
         self.allow_tools = []
 
-    def response(self, query: str, tool_names: list[str]):
-        # 根据上下文与工具构建请求体并生成回复
-        self.remember("user", query)
+        # HTTP 会话：复用到LLM服务的 keep-alive 连接
+        self.session = requests.Session()
+
+    def reset_session(self):
+        """fork 后在子进程中调用：丢弃从父进程继承的连接池，重新建立会话"""
+        self.session = requests.Session()
+
+    def _new_context(self) -> ConversationContext:
+        return ConversationContext(
+            system_prompt=self.system_prompt,
+            max_tokens=self.context_max_tokens,
+            min_recent=self.context_min_recent,
+            summary_max_tokens=self.context_summary_max_tokens,
+        )
+
+    def response(self, query: str, tool_names: list[str], session_id: str):
+        # 根据会话上下文与工具构建请求体并生成回复；同一实例可被多个会话并发使用
+        # session_id 必须由调用方给出（如登录会话ID），不提供默认值，避免不同请求共用同一上下文
+        context = self.contexts.get(session_id)
+        with context.lock:
+            messages = context.build_messages(query)
 
         payload = {
             "model": self.llm_model,
-            "messages": self.context,
+            "messages": messages,
             "tools": self.tool_add(tool_names),
         }
 
@@ -35,12 +62,24 @@ class LLMClient:
             "Content-Type": "application/json"
         }
 
-        response = requests.post(self.llm_url, json=payload, headers=headers).json()
-        self.remember("assistant", response)
-        return response.json()
+        response = self.session.post(self.llm_url, json=payload, headers=headers).json()
+        if not response.get("choices"):
+            # 接口错误（无 choices）：原样返回给调用方处理，不写入会话上下文，避免错误内容作为助手回复进入后续提示词
+            logger.warning(f"[LLM] 接口返回错误，未写入会话上下文: {response.get('error', response)}")
+            return response
+        message = response["choices"][0].get("message") or {}
+        if message.get("tool_calls"):
+            # 保留 tool_calls 原样：后续工具结果消息通过 tool_call_id 与之对应
+            self.remember("assistant", message.get("content") or "", session_id, tool_calls=message["tool_calls"])
+        else:
+            self.remember("assistant", message.get("content") or "", session_id)
+        return response
 
-    def remember(self, role: str, content: str):
-        self.context.append({role: content})
+    def remember(self, role: str, content, session_id: str, **extra):
+        """向会话上下文追加一条消息（工具执行结果用 role="tool" 并带 tool_call_id，大结果集只保留引用）"""
+        context = self.contexts.get(session_id)
+        with context.lock:
+            context.add(role, content, **extra)
 
     def tool_add(self, tool_names: list[str]):
         tool_dict = tool_list
@@ -61,4 +100,4 @@ class LLMClient:
 
 if __name__ == '__main__':
     test_agent = LLMClient("测试", params=params)
-    test_agent.response("你好")
\ No newline at end of file
+    test_agent.response("你好", [], session_id="test")
\ No newline at end of file
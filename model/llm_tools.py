@@ -1,5 +1,15 @@
 tool_list = \
     {
+        "intent_steering":
+            {
+                "description": "意图分析工具，根据用户的问题返回最相关的业务用表（基础字典表与业务数据表）的表名",
+                "parameters": {"query": "用户的问题"}
+            },
+        "select_base_info":
+            {
+                "description": "选中需要的基础信息表（基础字典表），返回该表的schema；需要多张表时在同一轮中分别调用",
+                "parameters": {"table_name": "基础信息表的表名，例如 大桥局人员信息表"}
+            },
         "select_templates":
             {
                 "description": "当用户的问题能够匹配模板时，选择**一个**最匹配问题的模板",
@@ -10,4 +20,9 @@ tool_list = \
                 "description": "当用户的问题不匹配模板时，**必须**参考sql生成规则自由生成sql",
                 "parameters": {"sql": "此处应为生成的sql查询语句"}
             },
+        "summarize":
+            {
+                "description": "总结工具，自动获取刚刚的查询结果，返回总结与图表",
+                "parameters": {}
+            },
     }
\ No newline at end of file
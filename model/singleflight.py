@@ -0,0 +1,86 @@
+"""
+请求合并（singleflight）：同一时刻的相同问题只执行一次完整的 LLM → SQL → 数据库 流程
+
+看板刷新或多人同时提交相同问题时，后到的请求不再重复执行，而是等待正在进行的那一次，
+共享其结果（总结由 SummaryExecutor 按问题/SQL/结果去重，同样只生成一次）。
+"""
+
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# 问题末尾的标点与语气词不影响语义
+_TRAILING_PATTERN = re.compile(r"[\s?？!！。.,，;；~～]+$")
+_SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """问题归一化：全角转半角、合并空白、去掉末尾标点、英文小写"""
+    text = unicodedata.normalize("NFKC", question or "")
+    text = _SPACE_PATTERN.sub(" ", text).strip()
+    return _TRAILING_PATTERN.sub("", text).lower()
+
+
+def coalesce_key(question: str, role: Optional[str] = None) -> str:
+    """合并键：归一化问题 + 用户角色（不同角色可见数据可能不同，不能共享结果）"""
+    return f"{role or ''}\x00{normalize_question(question)}"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """按键合并并发调用：同一键同时只执行一次，其余调用等待并共享结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._metrics = {"executed": 0, "shared": 0, "errors": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行 fn，或等待同一键正在进行的调用
+
+        Returns:
+            (结果, 是否为共享结果)；正在进行的调用抛出异常时，等待者收到同一异常
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._metrics["shared"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._metrics["executed"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._metrics["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict:
+        """executed: 实际执行次数；shared: 合并掉（节省）的调用次数；in_flight: 正在进行的调用数"""
+        with self._lock:
+            return {**self._metrics, "in_flight": len(self._calls)}
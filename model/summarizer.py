@@ -2,6 +2,8 @@ import json
 from typing import Dict, List
 
 from model.llm_client import LLMClient
+from data.json_codec import json_default
+from config.metrics import LLM_SECONDS
 from config.config import logger
 
 
@@ -36,7 +38,7 @@ class Summarizer:
                     执行的SQL：{sql}
                     查询结果：共找到 {total_rows} 行数据（显示前{min(30, total_rows)}行）
                     数据内容（JSON格式）：
-                    {json.dumps(preview, ensure_ascii=False, indent=2)}
+                    {json.dumps(preview, ensure_ascii=False, indent=2, default=json_default)}
                     
                     【图表工具说明】
                     你可以在总结中使用图表来可视化数据，让数据更直观易懂。支持的图表类型：
@@ -99,7 +101,8 @@ class Summarizer:
                     - 如果某个字段没有内容，可以设置为空字符串
                     - 所有内容都用中文回答"""
 
-        response = self.llm_client.complete(prompt, max_tokens=10000, temperature=0.2)
+        with LLM_SECONDS.time(purpose="summary"):
+            response = self.llm_client.complete(prompt, max_tokens=10000, temperature=0.2)
         logger.info("[LLM总结] LLM调用完成")
         # 尝试解析JSON响应
         try:
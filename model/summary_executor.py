@@ -0,0 +1,224 @@
+"""
+总结任务执行器：固定数量的工作线程 + 有界队列
+
+    - 限制同时进行的总结LLM调用数，队列满时直接拒绝，避免突发请求压垮LLM服务
+    - SQL生成优先：有用户正在等待SQL生成（foreground）时，总结任务暂缓出队，
+      最多暂缓 max_defer 秒，避免总结长期饥饿
+    - 去重：问题、SQL与结果相同的总结只生成一次，结果写回所有等待的查询ID
+    - 取消：排队期间客户端超过 abandon_after 秒未轮询的任务直接丢弃
+    - 完成通知：wait(query_id) 阻塞到总结写回，流式接口无需反复轮询存储
+    - 统计排队等待时间等指标（stats()）
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from config.config import logger
+from data.json_codec import json_default
+from config.metrics import SUMMARY_QUEUE_WAIT_SECONDS, SUMMARY_SECONDS, record_cache
+
+EMPTY_SUMMARY = {"summaryContent": "", "keyInfo": "", "recordOverview": "", "charts": []}
+
+
+@dataclass
+class _SummaryTask:
+    key: str
+    question: str
+    sql: str
+    rows: List[Dict]
+    query_ids: List[str] = field(default_factory=list)
+    submitted_at: float = field(default_factory=time.monotonic)
+    submitted_wall: float = field(default_factory=time.time)
+
+
+def summary_key(question: str, sql: str, rows: List[Dict]) -> str:
+    """总结去重键：总结只依赖问题、SQL、总行数与前30行预览（与 Summarizer 一致）"""
+    payload = json.dumps([question, sql, len(rows), rows[:30]],
+                         ensure_ascii=False, default=json_default, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryExecutor:
+    """有界的总结任务执行器"""
+
+    def __init__(self, summarize: Callable[[str, str, List[Dict]], Dict],
+                 on_result: Callable[[str, Dict], None],
+                 last_polled: Optional[Callable[[str], Optional[float]]] = None,
+                 workers: int = 2, queue_size: int = 32,
+                 yield_threshold: int = 2, max_defer: float = 10.0, abandon_after: float = 15.0):
+        """
+        Args:
+            summarize: 生成总结的函数 (question, sql, rows) -> summary dict
+            on_result: 写回总结状态的回调 (query_id, {"status", "summary", "error"})
+            last_polled: 返回查询ID最近一次被轮询的时间戳（time.time()），None 表示不做取消判断
+            workers: 工作线程数，即同时进行的总结LLM调用上限
+            queue_size: 排队任务上限
+            yield_threshold: 正在进行的SQL生成请求数达到该值时，总结任务暂缓出队
+            max_defer: 单个任务因让路SQL生成而暂缓的最长时间（秒）
+            abandon_after: 排队中的任务超过该时间无人轮询则取消（秒）
+        """
+        self.summarize = summarize
+        self.on_result = on_result
+        self.last_polled = last_polled
+        self.workers = workers
+        self.queue_size = queue_size
+        self.yield_threshold = yield_threshold
+        self.max_defer = max_defer
+        self.abandon_after = abandon_after
+
+        self._cond = threading.Condition()
+        self._pending: "OrderedDict[str, _SummaryTask]" = OrderedDict()  # 排队中的任务，key -> 任务
+        self._running: Dict[str, _SummaryTask] = {}
+        self._foreground = 0
+        # 查询ID -> 总结写回后置位的事件（只包含本进程中排队/进行中的任务）
+        self._done: Dict[str, threading.Event] = {}
+        self._threads: List[threading.Thread] = []
+        self._metrics = {
+            "submitted": 0, "deduplicated": 0, "rejected": 0, "cancelled": 0,
+            "completed": 0, "failed": 0, "deferred": 0,
+            "queue_wait_total": 0.0, "queue_wait_max": 0.0,
+        }
+
+    def start(self):
+        """启动工作线程（fork 后在子进程中重新调用）"""
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"summary-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def restart_after_fork(self):
+        """fork 后在子进程中调用：线程不会随 fork 复制，重建条件变量与工作线程"""
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()
+        self._running = {}
+        self._foreground = 0
+        self._done = {}
+        self.start()
+
+    @contextmanager
+    def foreground(self):
+        """标记一次正在进行的SQL生成请求，期间总结任务为其让路"""
+        with self._cond:
+            self._foreground += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._foreground -= 1
+                self._cond.notify_all()
+
+    def submit(self, query_id: str, question: str, sql: str, rows: List[Dict]) -> bool:
+        """提交总结任务；与排队中/进行中的任务相同则合并，队列已满返回 False"""
+        key = summary_key(question, sql, rows)
+        with self._cond:
+            self._metrics["submitted"] += 1
+            task = self._pending.get(key) or self._running.get(key)
+            record_cache("summary_dedup", task is not None)
+            if task is not None:
+                task.query_ids.append(query_id)
+                self._done.setdefault(query_id, threading.Event())
+                self._metrics["deduplicated"] += 1
+                return True
+            if len(self._pending) >= self.queue_size:
+                self._metrics["rejected"] += 1
+                return False
+            self._pending[key] = _SummaryTask(key=key, question=question, sql=sql, rows=rows, query_ids=[query_id])
+            self._done.setdefault(query_id, threading.Event())
+            self._cond.notify()
+        return True
+
+    def wait(self, query_id: str, timeout: float) -> Optional[bool]:
+        """
+        等待查询ID的总结写回
+
+        Returns:
+            True 已写回；False 超时；None 本进程中没有该查询的任务（已完成，或由其他 worker 提交），调用方应直接读取存储
+        """
+        with self._cond:
+            event = self._done.get(query_id)
+        if event is None:
+            return None
+        return event.wait(timeout)
+
+    def _abandoned(self, task: _SummaryTask) -> bool:
+        """所有等待该任务的查询在 abandon_after 秒内都没有轮询过"""
+        if self.last_polled is None:
+            return False
+        deadline = time.time() - self.abandon_after
+        if task.submitted_wall > deadline:
+            return False
+        return all((self.last_polled(qid) or 0) < deadline for qid in task.query_ids)
+
+    def _next_task(self) -> _SummaryTask:
+        """取出下一个任务：有SQL生成请求在进行时暂缓，最多等待到队首任务的 max_defer 到期"""
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                head = next(iter(self._pending.values()))
+                defer_left = head.submitted_at + self.max_defer - time.monotonic()
+                if self._foreground >= self.yield_threshold and defer_left > 0:
+                    self._metrics["deferred"] += 1
+                    self._cond.wait(timeout=defer_left)
+                    continue
+                task = self._pending.pop(head.key)
+                self._running[task.key] = task
+                wait = time.monotonic() - task.submitted_at
+                self._metrics["queue_wait_total"] += wait
+                self._metrics["queue_wait_max"] = max(self._metrics["queue_wait_max"], wait)
+                SUMMARY_QUEUE_WAIT_SECONDS.observe(wait)
+                return task
+
+    def _worker(self):
+        while True:
+            task = self._next_task()
+            try:
+                if self._abandoned(task):
+                    self._finish(task, "cancelled", EMPTY_SUMMARY, "客户端已停止轮询，总结已取消")
+                    continue
+                logger.debug(f"[总结队列] 开始生成总结，排队 {time.monotonic() - task.submitted_at:.2f}s，"
+                             f"合并查询 {len(task.query_ids)} 个")
+                with SUMMARY_SECONDS.time():
+                    summary = self.summarize(task.question, task.sql, task.rows)
+                self._finish(task, "done", summary, None)
+            except Exception as e:
+                self._finish(task, "error", EMPTY_SUMMARY, str(e))
+
+    def _finish(self, task: _SummaryTask, status: str, summary: Dict, error: Optional[str]):
+        with self._cond:
+            self._running.pop(task.key, None)
+            metric = {"done": "completed", "error": "failed", "cancelled": "cancelled"}[status]
+            self._metrics[metric] += 1
+            query_ids = list(task.query_ids)
+        for query_id in query_ids:
+            try:
+                self.on_result(query_id, {"status": status, "summary": summary, "error": error})
+            except Exception as e:
+                logger.warning(f"[总结队列] 写回总结状态失败 {query_id}: {e}")
+            # 写回之后再通知，等待方被唤醒时一定能从存储中读到结果
+            with self._cond:
+                event = self._done.pop(query_id, None)
+            if event is not None:
+                event.set()
+
+    def stats(self) -> Dict:
+        """执行器指标：队列深度、进行中任务数、排队等待时间等"""
+        with self._cond:
+            started = self._metrics["completed"] + self._metrics["failed"] + self._metrics["cancelled"] \
+                + len(self._running)
+            return {
+                **self._metrics,
+                "queue_depth": len(self._pending),
+                "running": len(self._running),
+                "foreground": self._foreground,
+                "queue_wait_avg": self._metrics["queue_wait_total"] / started if started else 0.0,
+            }
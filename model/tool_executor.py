@@ -0,0 +1,166 @@
+"""
+工具执行器：执行 LLM 在一轮回复中返回的工具调用
+
+    - 同一轮中的多个工具调用相互独立（如同时查询几张基础信息表），在有界线程池中并发执行，
+      一轮的耗时取决于最慢的工具而不是所有工具耗时之和
+    - 每一轮有超时（step_timeout）：超时的调用以错误结果返回给 LLM，不阻塞整轮；
+      Python 线程无法强制终止，超时的工具仍会占用一个线程直到自己结束，因此线程池有上限
+    - 结果按会话缓存：同一会话中名称与参数都相同的调用直接返回缓存结果（可按工具关闭缓存），
+      同一轮中重复的调用只执行一次
+    - 结果按调用顺序返回，附带 tool_call_id，调用方据此写回上下文
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from config.metrics import AGENT_TOOL_CALLS_TOTAL, AGENT_TOOL_SECONDS
+from conversation import ContextStore
+
+
+@dataclass
+class _Tool:
+    handler: Callable[..., Any]
+    cacheable: bool = True
+
+
+class _ToolCache:
+    """单个会话的工具结果缓存（LRU），last_used 供 ContextStore 判断过期"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, str]" = OrderedDict()
+        self.last_used = time.monotonic()
+
+    def get(self, key: str):
+        with self.lock:
+            self.last_used = time.monotonic()
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+def parse_tool_calls(tool_calls: List[Dict]) -> List[Dict]:
+    """把接口返回的 tool_calls 规范为 [{"id", "name", "arguments": dict, "error"}]（arguments 为 JSON 字符串）"""
+    calls = []
+    for index, call in enumerate(tool_calls or []):
+        function = call.get("function") or {}
+        arguments, error = function.get("arguments") or {}, None
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments) if arguments.strip() else {}
+            except ValueError:
+                arguments, error = {}, f"工具参数不是合法的JSON: {function.get('arguments')[:200]}"
+        calls.append({
+            "id": call.get("id") or f"call_{index}",
+            "name": function.get("name", ""),
+            "arguments": arguments if isinstance(arguments, dict) else {},
+            "error": error,
+        })
+    return calls
+
+
+class ToolExecutor:
+    """并发执行工具调用（有界线程池 + 每轮超时 + 按会话缓存）"""
+
+    def __init__(self, max_workers: int = 4, step_timeout: float = 30.0,
+                 cache_size: int = 128, max_sessions: int = 1000, session_ttl: float = 3600):
+        """
+        Args:
+            max_workers: 同时执行的工具调用上限
+            step_timeout: 一轮工具调用的最长等待时间（秒）
+            cache_size: 每个会话缓存的工具结果数
+            max_sessions / session_ttl: 保留缓存的会话数上限与空闲过期时间（秒）
+        """
+        self.step_timeout = step_timeout
+        self._tools: Dict[str, _Tool] = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+        self._caches = ContextStore(lambda: _ToolCache(cache_size), max_sessions=max_sessions, ttl=session_ttl)
+
+    def register(self, name: str, handler: Callable[..., Any], cacheable: bool = True):
+        """注册工具：handler(**arguments) 返回可 JSON 序列化的结果"""
+        self._tools[name] = _Tool(handler, cacheable)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def _invoke(self, name: str, arguments: Dict) -> tuple:
+        """执行工具，返回 (结果JSON字符串, 耗时秒)"""
+        start = time.perf_counter()
+        try:
+            result = self._tools[name].handler(**arguments)
+        finally:
+            elapsed = time.perf_counter() - start
+            AGENT_TOOL_SECONDS.observe(elapsed, tool=name)
+        content = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False, default=str)
+        return content, elapsed
+
+    def run(self, tool_calls: List[Dict], session_id: str) -> List[Dict]:
+        """
+        执行一轮工具调用
+
+        Returns:
+            按调用顺序的结果：[{"tool_call_id", "name", "content", "status": ok|cached|error|timeout, "seconds"}]
+        """
+        calls = parse_tool_calls(tool_calls)
+        cache = self._caches.get(session_id)
+        results: List[Dict] = []
+        futures = {}
+        inflight = {}
+        start = time.perf_counter()
+        for call in calls:
+            result = {"tool_call_id": call["id"], "name": call["name"], "content": "", "status": "ok", "seconds": 0.0}
+            results.append(result)
+            tool = self._tools.get(call["name"])
+            if call["error"] or tool is None:
+                result["status"] = "error"
+                result["content"] = json.dumps({"error": call["error"] or f"未知工具: {call['name']}"}, ensure_ascii=False)
+                continue
+            key = json.dumps([call["name"], call["arguments"]], ensure_ascii=False, sort_keys=True, default=str)
+            cached = cache.get(key) if tool.cacheable else None
+            if cached is not None:
+                result["status"], result["content"] = "cached", cached
+                continue
+            future = inflight.get(key)
+            if future is None:
+                future = inflight[key] = self._pool.submit(self._invoke, call["name"], call["arguments"])
+            futures[id(result)] = (future, result, key, tool)
+
+        _, pending = wait(inflight.values(), timeout=self.step_timeout)
+        for future, result, key, tool in futures.values():
+            if future in pending:
+                future.cancel()
+                result["seconds"] = round(time.perf_counter() - start, 3)
+                result["status"] = "timeout"
+                result["content"] = json.dumps({"error": f"工具执行超时（{self.step_timeout:.0f}s）"}, ensure_ascii=False)
+                continue
+            try:
+                result["content"], seconds = future.result()
+                result["seconds"] = round(seconds, 3)
+                if tool.cacheable:
+                    cache.put(key, result["content"])
+            except Exception as e:
+                result["status"] = "error"
+                result["content"] = json.dumps({"error": f"工具执行失败: {e}"}, ensure_ascii=False)
+        for result in results:
+            AGENT_TOOL_CALLS_TOTAL.inc(tool=result["name"], result=result["status"])
+        return results
+
+    def drop_session(self, session_id: str):
+        self._caches.drop(session_id)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,438 @@
+"""
+索引顾问与执行计划回归检查：对模板 M1–M6（含按实体ID过滤的版本）及查询历史中的SQL执行 EXPLAIN
+
+在本地 MySQL 中按生产字段名建立同构表并灌入合成数据，然后：
+    1. 静态检查SQL中的不可走索引写法（ORDER BY COALESCE、JOIN ON 中的 OR、
+       对列套函数、前导通配符 LIKE）
+    2. EXPLAIN 每条SQL，标记全表扫描、Using temporary、Using filesort
+    3. 根据被全表扫描的表及其过滤/关联列给出建索引 DDL
+    4. 与执行计划基线比较，模板计划变差时以非零状态码退出（可用于CI）；
+       基线只由 --update-baseline 写入；基线文件不存在时 --check 报错退出，不会自动建立
+
+使用方法:
+    python -m sql.index_advisor --seed --rows 20000          # 建表并灌入合成数据
+    python -m sql.index_advisor                              # 输出诊断与索引建议
+    python -m sql.index_advisor --history memory/query_history.db
+    python -m sql.index_advisor --update-baseline            # 记录当前计划为基线
+    python -m sql.index_advisor --check                      # 计划回归检查（需先用 --update-baseline 建立基线）
+    python -m sql.index_advisor --apply-ddl                  # 在本地库执行建议的索引DDL
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sql.sql_templates import SQL_ID_DICT, SQL_TEMPLATES, SQLTemplateManager
+
+BASELINE_PATH = Path(__file__).resolve().parent / "plan_baseline.json"
+
+# 访问类型从好到坏排序（MySQL EXPLAIN type 列）
+ACCESS_TYPE_RANK = {
+    "system": 0, "const": 1, "eq_ref": 2, "ref": 3, "fulltext": 4, "ref_or_null": 5,
+    "index_merge": 6, "unique_subquery": 7, "index_subquery": 8, "range": 9, "index": 10, "ALL": 11,
+}
+
+# 全表扫描行数低于该值时不报告（字典小表全扫描无碍）
+FULL_SCAN_MIN_ROWS = 1000
+
+# 模板EXPLAIN使用的示例参数（与合成数据中的取值对应）
+SAMPLE_PARAMS = {
+    "M1": {"person_name": "人员1"},
+    "M2": {"person_name": "人员1"},
+    "M3": {"person_name": "人员1"},
+    "M4": {"person_name": "人员1"},
+    "M5": {"team_name": "班组1"},
+    "M6": {"date": "2025-04-01", "unit_name": "隧道"},
+}
+
+# 按实体ID过滤的模板版本（SQL_ID_DICT，实体词典就绪时运行时使用）绑定的示例ID列表（与合成数据对应）
+SAMPLE_ENTITY_IDS = {
+    "person": ["BM-00001", "BM-00002", "BM-00003"],
+    "team": ["T0001", "T0002"],
+    "unit": [1, 2, 3],
+}
+
+# 合成库表结构：字段名与生产库实际字段名一致（已做 SQLFieldReplacer 替换），只建主键
+SYNTHETIC_SCHEMA = {
+    "大桥局人员信息表": """
+        ID INT PRIMARY KEY, 档案编号 VARCHAR(64), 姓名 VARCHAR(32), 岗位 VARCHAR(32), 职务 VARCHAR(32),
+        手机号 VARCHAR(20), 状态 VARCHAR(16), 所属部门 VARCHAR(64), 所属项目 VARCHAR(64)""",
+    "责任单元字典": """
+        ID INT PRIMARY KEY, 责任单元名称 VARCHAR(128), 所属项目 VARCHAR(64)""",
+    "班前讲话班组字典": """
+        ID INT PRIMARY KEY, 班组ID VARCHAR(64), 班组 VARCHAR(64), 安全责任单元 INT""",
+    "每日管控计划": """
+        ID INT PRIMARY KEY, 计划日期 DATE, 管控单元id INT, 管控责任人 VARCHAR(64),
+        施工计划作业内容 VARCHAR(255), 状态 VARCHAR(16)""",
+    "每日管控计划_子表": """
+        ID INT PRIMARY KEY, 每日管控计划_ID INT, 分项名称 VARCHAR(128), 工序名称 VARCHAR(128),
+        风险研判 VARCHAR(255), 管控措施 VARCHAR(255), 关键工序 TINYINT, 领导带班 TINYINT, 跟班作业 TINYINT,
+        带班领导档案 VARCHAR(64), 跟班人档案 VARCHAR(64)""",
+    "带班作业记录表": """
+        ID INT PRIMARY KEY, 工单子表ID INT, 工单ID INT, 带班日期 DATE, 带班作业工序及地点 VARCHAR(255),
+        带班期间工作内容 VARCHAR(255), 带班注意事项及要求 VARCHAR(255), 带班人员 VARCHAR(64),
+        带班领导 VARCHAR(64), 状态 VARCHAR(16), FGC_CreateDate DATETIME, FGC_LastModifyDate DATETIME""",
+    "跟班作业记录表": """
+        ID INT PRIMARY KEY, 工单子表ID INT, 工单ID INT, 日期 DATE, 班组 VARCHAR(64),
+        重点部位_关键工序_特殊时段情况 VARCHAR(255), 安全质量__管控情况__ VARCHAR(255),
+        过程偏离或达不到安全质量目标情况及处理措施 VARCHAR(255), 跟班人员 VARCHAR(32),
+        跟班人员档案编号 VARCHAR(64), 状态 VARCHAR(16), FGC_CreateDate DATETIME, FGC_LastModifyDate DATETIME""",
+}
+
+# 静态检查规则：(规则名, 正则, 说明)
+STATIC_RULES = [
+    ("order_by_expression", re.compile(r"ORDER\s+BY\s+COALESCE\s*\(", re.I),
+     "ORDER BY COALESCE(...) 无法利用索引排序，必然 filesort；"
+     "建议新增 STORED 生成列保存排序时间并建索引，或改为按单列排序"),
+    ("or_in_join", re.compile(r"\bON\s*\([^)]*\bOR\b", re.I),
+     "JOIN ON 条件中含 OR，优化器无法对两侧同时使用索引；建议拆成 UNION ALL 两个分支"),
+    ("function_on_column", re.compile(r"\b(DATE|YEAR|MONTH|LOWER|UPPER|SUBSTR|LEFT)\s*\(\s*[\w\u4e00-\u9fa5`]+\.", re.I),
+     "对列套用函数（如 DATE(col)）会使该列索引失效；建议改为范围条件 col >= d AND col < d + INTERVAL 1 DAY"),
+    ("leading_wildcard_like", re.compile(r"LIKE\s+(?:'%|%\(\w+\)s)", re.I),
+     "前导通配符 LIKE '%x%' 无法使用B树索引；建议先在字典表中解析出ID再按ID过滤"),
+]
+
+_ALIAS_PATTERN = re.compile(
+    r"(?:FROM|JOIN)\s+`?([\w\u4e00-\u9fa5]+)`?(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|LEFT|RIGHT|INNER|JOIN|ORDER|GROUP|UNION|LIMIT)\b)([\w\u4e00-\u9fa5]+))?",
+    flags=re.I,
+)
+
+
+def static_findings(sql: str) -> List[Dict]:
+    """静态检查SQL中的不可走索引写法"""
+    return [{"rule": name, "detail": detail} for name, pattern, detail in STATIC_RULES if pattern.search(sql)]
+
+
+def alias_map(sql: str) -> Dict[str, str]:
+    """解析 FROM/JOIN 子句，返回 别名 -> 表名（无别名时表名映射到自身）"""
+    mapping = {}
+    for table, alias in _ALIAS_PATTERN.findall(sql):
+        if table.upper() == "SELECT":
+            continue
+        mapping[alias or table] = table
+        mapping.setdefault(table, table)
+    return mapping
+
+
+def candidate_columns(sql: str, alias: str) -> List[str]:
+    """找出某个别名上参与过滤或关联的列（按出现顺序去重）"""
+    a = re.escape(alias)
+    col = r"`?([\w\u4e00-\u9fa5]+)`?"
+    patterns = [
+        rf"(?<![\w\u4e00-\u9fa5]){a}\.{col}\s*(?:=|>=|<=|>|<|\bIN\b|\bLIKE\b)",
+        rf"(?:=|>=|<=|>|<)\s*{a}\.{col}",
+        rf"\(\s*{a}\.{col}\s*\)\s*=",
+    ]
+    columns: List[str] = []
+    for pattern in patterns:
+        for column in re.findall(pattern, sql, flags=re.I):
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def summarize_plan(rows: List[Dict]) -> List[Dict]:
+    """提取EXPLAIN结果中用于比较的字段"""
+    return [{
+        "id": row.get("id"),
+        "table": row.get("table"),
+        "type": row.get("type") or "",
+        "key": row.get("key"),
+        "rows": int(row.get("rows") or 0),
+        "extra": row.get("Extra") or "",
+    } for row in rows]
+
+
+def plan_findings(plan: List[Dict]) -> List[Dict]:
+    """标记执行计划中的全表扫描与临时表/文件排序"""
+    findings = []
+    for step in plan:
+        if step["type"] == "ALL" and step["rows"] >= FULL_SCAN_MIN_ROWS:
+            findings.append({"rule": "full_scan", "table": step["table"], "rows": step["rows"]})
+        for flag, rule in (("Using temporary", "temporary"), ("Using filesort", "filesort")):
+            if flag in step["extra"]:
+                findings.append({"rule": rule, "table": step["table"], "rows": step["rows"]})
+    return findings
+
+
+def recommend_indexes(sql: str, plan: List[Dict]) -> List[str]:
+    """对全表扫描（或未用索引关联）的表，按其过滤/关联列给出建索引DDL"""
+    aliases = alias_map(sql)
+    ddl = []
+    for step in plan:
+        if step["type"] not in ("ALL", "index") or step["table"] not in aliases:
+            continue
+        table = aliases[step["table"]]
+        for column in candidate_columns(sql, step["table"]):
+            if column.upper() == "ID":
+                continue
+            statement = f"CREATE INDEX `idx_{table}_{column}` ON `{table}` (`{column}`);"
+            if statement not in ddl:
+                ddl.append(statement)
+    return ddl
+
+
+def compare_plans(baseline: List[Dict], current: List[Dict]) -> List[str]:
+    """比较执行计划，返回变差项说明（空列表表示未变差）"""
+    regressions = []
+    base_by_table = {(step["id"], step["table"]): step for step in baseline}
+    for step in current:
+        base = base_by_table.get((step["id"], step["table"]))
+        if base is None:
+            if step["type"] == "ALL" and step["rows"] >= FULL_SCAN_MIN_ROWS:
+                regressions.append(f"{step['table']}: 新增全表扫描")
+            continue
+        if ACCESS_TYPE_RANK.get(step["type"], 99) > ACCESS_TYPE_RANK.get(base["type"], 99):
+            regressions.append(f"{step['table']}: 访问类型 {base['type']} -> {step['type']}")
+        if base["key"] and not step["key"]:
+            regressions.append(f"{step['table']}: 不再使用索引 {base['key']}")
+        for flag in ("Using temporary", "Using filesort"):
+            if flag in step["extra"] and flag not in base["extra"]:
+                regressions.append(f"{step['table']}: 新增 {flag}")
+    return regressions
+
+
+def id_variant(template_id: str) -> Tuple[str, Dict]:
+    """模板的实体ID版本及绑定参数：解析规则中的名称参数替换为示例ID列表"""
+    meta = SQL_TEMPLATES[template_id]
+    rules = meta.get("resolve", {})
+    specs = meta.get("params", {})
+    args = {}
+    for name in meta["required_params"]:
+        if name in rules:
+            args[rules[name]["bind"]] = SAMPLE_ENTITY_IDS[rules[name]["entity"]]
+        else:
+            args[name] = SQLTemplateManager.normalize_param(name, SAMPLE_PARAMS[template_id][name], specs.get(name, {}))
+    return SQLTemplateManager.get_compiled_sql(template_id, by_id=True), args
+
+
+class IndexAdvisor:
+    """连接本地MySQL，灌入合成数据并分析模板与历史SQL的执行计划"""
+
+    def __init__(self, db_conf: Dict):
+        import pymysql
+
+        self.conn = pymysql.connect(
+            host=db_conf["host"],
+            port=int(db_conf["port"]),
+            user=db_conf["user"],
+            password=db_conf["password"],
+            database=db_conf["db"],
+            charset="utf8mb4",
+            cursorclass=pymysql.cursors.DictCursor,
+            autocommit=True,
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def seed(self, rows: int, rng_seed: int = 42):
+        """重建合成表并灌入数据：人员/班组/单元为字典规模，记录表为 rows 行"""
+        rng = random.Random(rng_seed)
+        people = max(rows // 20, 50)
+        teams = max(rows // 100, 20)
+        units = max(rows // 200, 10)
+        plans = max(rows // 4, 100)
+        start = date(2025, 1, 1)
+
+        def day(i: int) -> date:
+            return start + timedelta(days=i % 365)
+
+        def ts(i: int) -> datetime:
+            return datetime.combine(day(i), datetime.min.time()) + timedelta(minutes=rng.randint(0, 1439))
+
+        def archive(i: int) -> str:
+            return f"BM-{i:05d}"
+
+        def follow_row(i: int) -> tuple:
+            person = rng.randint(1, people)
+            return (i, rng.randint(1, plans * 2), rng.randint(1, plans), day(i), f"T{rng.randint(1, teams):04d}",
+                    f"关键工序{i}", "管控情况", "无", f"人员{person}", archive(person), "已提交", ts(i), ts(i))
+
+        data = {
+            "大桥局人员信息表": [
+                (i, archive(i), f"人员{i}", "技术员", "员工", f"138{i:08d}", "在职", f"部门{i % 10}", f"项目{i % 5}")
+                for i in range(1, people + 1)],
+            "责任单元字典": [
+                (i, f"{rng.choice(['隧道', '桥梁', '路基'])}单元{i}", f"项目{i % 5}") for i in range(1, units + 1)],
+            "班前讲话班组字典": [
+                (i, f"T{i:04d}", f"班组{i}", rng.randint(1, units)) for i in range(1, teams + 1)],
+            "每日管控计划": [
+                (i, day(i), rng.randint(1, units), archive(rng.randint(1, people)), f"作业内容{i}", "已完成")
+                for i in range(1, plans + 1)],
+            "每日管控计划_子表": [
+                (i, rng.randint(1, plans), f"分项{i}", f"工序{i}", "风险", "措施", 1, 1, 1,
+                 archive(rng.randint(1, people)), archive(rng.randint(1, people)))
+                for i in range(1, plans * 2 + 1)],
+            "带班作业记录表": [
+                (i, rng.randint(1, plans * 2), rng.randint(1, plans), day(i), f"工序地点{i}", "内容", "要求",
+                 archive(rng.randint(1, people)), archive(rng.randint(1, people)), "已提交", ts(i), ts(i))
+                for i in range(1, rows + 1)],
+            "跟班作业记录表": [follow_row(i) for i in range(1, rows + 1)],
+        }
+
+        with self.conn.cursor() as cur:
+            for table, columns in SYNTHETIC_SCHEMA.items():
+                cur.execute(f"DROP TABLE IF EXISTS `{table}`")
+                cur.execute(f"CREATE TABLE `{table}` ({columns}) DEFAULT CHARSET=utf8mb4")
+                values = data[table]
+                placeholders = ", ".join(["%s"] * len(values[0]))
+                for i in range(0, len(values), 1000):
+                    cur.executemany(f"INSERT INTO `{table}` VALUES ({placeholders})", values[i:i + 1000])
+                cur.execute(f"ANALYZE TABLE `{table}`")
+                cur.fetchall()
+
+    def explain(self, sql: str, args: Optional[Dict] = None) -> List[Dict]:
+        with self.conn.cursor() as cur:
+            cur.execute(f"EXPLAIN {sql}", args)
+            return summarize_plan(list(cur.fetchall()))
+
+    def analyze(self, name: str, sql: str, args: Optional[Dict] = None) -> Dict:
+        """对单条SQL做静态检查、EXPLAIN 与索引建议"""
+        plan = self.explain(sql, args)
+        return {
+            "name": name,
+            "static": static_findings(sql),
+            "plan": plan,
+            "findings": plan_findings(plan),
+            "ddl": recommend_indexes(sql, plan),
+        }
+
+    def analyze_templates(self) -> List[Dict]:
+        """分析所有模板；有 SQL_ID_DICT 版本的模板另以 "<模板ID>:id" 为名分析ID版本"""
+        reports = []
+        for template_id in SQL_TEMPLATES:
+            sql, args = SQLTemplateManager.prepare(template_id, SAMPLE_PARAMS[template_id])
+            reports.append(self.analyze(template_id, sql, args))
+            if template_id in SQL_ID_DICT:
+                sql, args = id_variant(template_id)
+                reports.append(self.analyze(f"{template_id}:id", sql, args))
+        return reports
+
+    def analyze_history(self, paths: List[Path], limit: int = 50) -> List[Dict]:
+        """分析查询历史中出现次数最多的自由SQL（按指纹去重）"""
+        from sql.template_miner import load_history, mine_shapes
+
+        reports = []
+        for shape in mine_shapes(load_history(paths), min_count=1)[:limit]:
+            sample = next(iter(shape.questions), shape.fingerprint)
+            try:
+                args = {
+                    slot["name"]: SQLTemplateManager.normalize_param(slot["name"], slot["example"], slot["spec"])
+                    for slot in shape.slots
+                }
+                reports.append(self.analyze(f"free:{shape.fingerprint} {sample}", shape.template_sql, args))
+            except Exception as e:
+                reports.append({"name": f"free:{shape.fingerprint}", "error": str(e)})
+        return reports
+
+    def apply_ddl(self, statements: List[str]):
+        with self.conn.cursor() as cur:
+            for statement in statements:
+                cur.execute(statement)
+
+
+def print_report(report: Dict):
+    print(f"\n=== {report['name']} ===")
+    if report.get("error"):
+        print(f"  EXPLAIN 失败: {report['error']}")
+        return
+    for item in report["static"]:
+        print(f"  [静态] {item['rule']}: {item['detail']}")
+    for step in report["plan"]:
+        print(f"  [计划] id={step['id']} table={step['table']} type={step['type']} "
+              f"key={step['key']} rows={step['rows']} extra={step['extra']}")
+    for item in report["findings"]:
+        print(f"  [问题] {item['rule']} @ {item['table']}（约 {item['rows']} 行）")
+    for statement in report["ddl"]:
+        print(f"  [建议] {statement}")
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> Dict[str, List[Dict]]:
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return {}
+
+
+def save_baseline(reports: List[Dict], path: Path = BASELINE_PATH):
+    path.write_text(json.dumps({r["name"]: r["plan"] for r in reports}, ensure_ascii=False, indent=2),
+                    encoding="utf-8")
+
+
+def check_regressions(reports: List[Dict], baseline: Dict[str, List[Dict]]) -> List[Tuple[str, str]]:
+    regressions = []
+    for report in reports:
+        if report["name"] not in baseline:
+            continue
+        for item in compare_plans(baseline[report["name"]], report["plan"]):
+            regressions.append((report["name"], item))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模板SQL索引顾问与执行计划回归检查（仅用于本地MySQL）")
+    parser.add_argument("--db_host", default="127.0.0.1")
+    parser.add_argument("--db_port", type=int, default=3306)
+    parser.add_argument("--db_user", default="root")
+    parser.add_argument("--db_password", default="")
+    parser.add_argument("--db_name", default="ai2sql_advisor")
+    parser.add_argument("--seed", action="store_true", help="重建合成表并灌入数据")
+    parser.add_argument("--rows", type=int, default=20000, help="带班/跟班记录表的合成行数")
+    parser.add_argument("--history", nargs="*", type=Path, default=[], help="需要一并分析的查询历史文件")
+    parser.add_argument("--apply-ddl", action="store_true", help="在本地库执行建议的索引DDL后重新分析")
+    parser.add_argument("--update-baseline", action="store_true", help="将当前模板执行计划写入基线")
+    parser.add_argument("--check", action="store_true",
+                        help="与基线比较，模板计划变差或基线不存在时返回非零状态码")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="执行计划基线文件")
+    args = parser.parse_args()
+
+    advisor = IndexAdvisor({
+        "host": args.db_host, "port": args.db_port, "user": args.db_user,
+        "password": args.db_password, "db": args.db_name,
+    })
+    try:
+        if args.seed:
+            print(f"正在灌入合成数据（记录表 {args.rows} 行）...")
+            advisor.seed(args.rows)
+
+        reports = advisor.analyze_templates()
+        if args.apply_ddl:
+            statements = sorted({s for r in reports for s in r["ddl"]})
+            advisor.apply_ddl(statements)
+            print(f"已执行 {len(statements)} 条索引DDL")
+            reports = advisor.analyze_templates()
+
+        for report in reports + advisor.analyze_history(args.history):
+            print_report(report)
+
+        if args.update_baseline:
+            save_baseline(reports, args.baseline)
+            print(f"\n执行计划基线已写入: {args.baseline}")
+
+        if args.check:
+            baseline = load_baseline(args.baseline)
+            if not baseline:
+                print(f"\n未找到执行计划基线: {args.baseline}\n"
+                      f"请先运行 python -m sql.index_advisor --update-baseline 建立基线并提交该文件", file=sys.stderr)
+                sys.exit(2)
+            missing = [r["name"] for r in reports if r["name"] not in baseline]
+            if missing:
+                print(f"\n以下模板不在基线中，未做比较（可用 --update-baseline 补充）: {', '.join(missing)}")
+            regressions = check_regressions(reports, baseline)
+            if regressions:
+                print("\n执行计划回归：")
+                for name, item in regressions:
+                    print(f"  - [{name}] {item}")
+                sys.exit(1)
+            print("\n执行计划检查通过：所有模板均未劣化")
+    finally:
+        advisor.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,133 @@
 """SQL字段替换器，用于将schema中的字段名替换为数据库中的实际字段名"""
 
 import re
-from typing import Dict
+from typing import Dict, List, Optional, Pattern, Tuple
+
+
+# 需要原样跳过的SQL片段：字符串字面量、注释
+# 'abc''d' / 'a\'b'、"abc"、-- 注释、# 注释、/* 块注释 */
+_SKIP_PATTERN = (
+    r"'(?:[^'\\]|\\.|'')*'"
+    r'|"(?:[^"\\]|\\.|"")*"'
+    r"|--[^\n]*"
+    r"|#[^\n]*"
+    r"|/\*.*?\*/"
+)
+
+# 标识符边界：前后不能是反引号、字母、数字、下划线或中文
+_IDENT_CHARS = r"`\w\u4e00-\u9fa5"
 
 
 class SQLFieldReplacer:
     """SQL字段替换器类，负责将schema中的字段名替换为数据库实际字段名"""
-    
+
     # 字段替换字典：key为schema中的字段名，value为数据库中的实际字段名
     FIELD_REPLACEMENT_MAP = {
         "带班人员档案编号": "带班人员",
         "带班领导档案编号": "带班领导",
         "管控责任人档案编号": "管控责任人"
     }
-    
+
+    # 预编译的单遍替换正则及其查找表（仅在替换规则变化时重建）
+    _pattern: Optional[Pattern] = None
+    _lookup: Dict[str, str] = {}
+
+    @classmethod
+    def _compile(cls) -> Pattern:
+        """
+        将替换字典编译为一个交替正则，一次扫描完成所有替换
+
+        字符串字面量与注释作为 skip 分支整体匹配并原样保留；
+        字段名按长度从长到短排列，避免短字段名抢先匹配
+        （例如："带班人员档案编号" 应该在 "带班人员" 之前匹配）
+        """
+        if cls._pattern is not None:
+            return cls._pattern
+
+        fields = sorted(cls.FIELD_REPLACEMENT_MAP, key=len, reverse=True)
+        cls._lookup = {k.lower(): v for k, v in cls.FIELD_REPLACEMENT_MAP.items()}
+
+        if fields:
+            alternation = "|".join(re.escape(f) for f in fields)
+            # 反引号包裹的字段名 `字段名` 与裸字段名（含 表名.字段名 形式）
+            field_branch = (
+                rf"|`(?P<quoted>{alternation})`"
+                rf"|(?<![{_IDENT_CHARS}])(?P<field>{alternation})(?![{_IDENT_CHARS}])"
+            )
+        else:
+            field_branch = ""
+
+        cls._pattern = re.compile(
+            rf"(?P<skip>{_SKIP_PATTERN}){field_branch}",
+            flags=re.IGNORECASE | re.DOTALL,
+        )
+        return cls._pattern
+
+    @classmethod
+    def rewrite(cls, sql: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """
+        单遍替换SQL中的字段名，跳过字符串字面量与注释
+
+        Args:
+            sql: 原始SQL语句
+
+        Returns:
+            (替换后的SQL语句, 实际发生的替换列表 [(schema字段名, 数据库字段名), ...])
+        """
+        if not sql:
+            return sql, []
+
+        pattern = cls._compile()
+        lookup = cls._lookup
+        applied: List[Tuple[str, str]] = []
+
+        def _sub(match: re.Match) -> str:
+            if match.lastgroup == "skip":
+                return match.group(0)
+            if match.lastgroup == "quoted":
+                source = match.group("quoted")
+                target = lookup[source.lower()]
+                applied.append((source, target))
+                return f"`{target}`"
+            source = match.group("field")
+            target = lookup[source.lower()]
+            applied.append((source, target))
+            return target
+
+        return pattern.sub(_sub, sql), applied
+
     @classmethod
     def replace_fields(cls, sql: str) -> str:
         """
         替换SQL中的字段名
-        
+
         Args:
             sql: 原始SQL语句
-            
+
         Returns:
             替换后的SQL语句
         """
-        if not sql:
-            return sql
-        
-        result_sql = sql
-        
-        # 按照字段名长度从长到短排序，避免短字段名被错误替换
-        # 例如："带班人员档案编号" 应该在 "带班人员" 之前处理
-        sorted_replacements = sorted(
-            cls.FIELD_REPLACEMENT_MAP.items(),
-            key=lambda x: len(x[0]),
-            reverse=True
-        )
-        
-        for schema_field, db_field in sorted_replacements:
-            # 使用正则表达式进行精确替换，确保只替换字段名，不替换其他部分
-            # 匹配模式：表名.字段名 或 字段名（在SELECT、WHERE、JOIN、ORDER BY等位置）
-            
-            # 1. 匹配 "表名.字段名" 格式（带或不带反引号，支持中文表名和字段名）
-            # 匹配：带班作业记录表.带班人员档案编号 或 `带班作业记录表`.`带班人员档案编号`
-            table_field_pattern = rf"([`\w\u4e00-\u9fa5]+)\.{re.escape(schema_field)}"
-            result_sql = re.sub(
-                table_field_pattern,
-                rf"\1.{db_field}",
-                result_sql,
-                flags=re.IGNORECASE
-            )
-            
-            # 2. 匹配单独的字段名（在SELECT、WHERE、JOIN、ORDER BY等位置）
-            # 使用单词边界确保精确匹配，但要注意中文字符的边界处理
-            # 对于中文字段名，我们需要匹配前后不是中文字符、字母、数字、下划线的位置
-            # 或者使用更简单的方法：匹配前后是空格、逗号、等号、括号等的位置
-            standalone_pattern = rf"(?<![`\w\u4e00-\u9fa5]){re.escape(schema_field)}(?![`\w\u4e00-\u9fa5])"
-            result_sql = re.sub(standalone_pattern, db_field, result_sql, flags=re.IGNORECASE)
-        
-        return result_sql
-    
+        return cls.rewrite(sql)[0]
+
     @classmethod
     def add_replacement(cls, schema_field: str, db_field: str):
         """
         添加新的字段替换规则
-        
+
         Args:
             schema_field: schema中的字段名
             db_field: 数据库中的实际字段名
         """
         cls.FIELD_REPLACEMENT_MAP[schema_field] = db_field
-    
+        # 规则变化后使预编译正则失效，下次替换时重建
+        cls._pattern = None
+
     @classmethod
     def get_replacements(cls) -> Dict[str, str]:
         """
         获取所有字段替换规则
-        
+
         Returns:
             字段替换字典
         """
         return cls.FIELD_REPLACEMENT_MAP.copy()
-
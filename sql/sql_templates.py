@@ -1,16 +1,22 @@
+import re
+from datetime import date, datetime
+from typing import Dict, Tuple
+
+from sql.sql_field_replacer import SQLFieldReplacer
+
 SQL_DICT = {
     # M1：按姓名查询带班记录（只要日期和工序，按时间倒序）
     "M1": """SELECT b.带班日期, b.带班作业工序及地点
     FROM 带班作业记录表 AS b
     JOIN 大桥局人员信息表 AS p ON b.带班人员档案编号 = p.档案编号
-    WHERE p.姓名 = '{person_name}'
+    WHERE p.姓名 = %(person_name)s
     ORDER BY COALESCE(b.FGC_CreateDate, b.带班日期, b.FGC_LastModifyDate) DESC""",
 
     # M2：按姓名查询跟班记录（只要日期和关键工序描述，按时间倒序）
     "M2": """SELECT g.日期, g.重点部位_关键工序_特殊时段情况 
     FROM 跟班作业记录表 AS g
     JOIN 大桥局人员信息表 AS p ON g.跟班人员档案编号 = p.档案编号
-    WHERE p.姓名 = '{person_name}'
+    WHERE p.姓名 = %(person_name)s
     ORDER BY COALESCE(g.FGC_CreateDate, g.日期, g.FGC_LastModifyDate) DESC""",
 
     # M3：按姓名查询带班+跟班合并的工作记录（统一结构，按时间倒序）
@@ -23,7 +29,7 @@ SQL_DICT = {
         b.带班日期 AS 发生日期
     FROM 带班作业记录表 AS b
     JOIN 大桥局人员信息表 AS p1 ON b.带班人员档案编号 = p1.档案编号
-    WHERE p1.姓名 = '{person_name}'
+    WHERE p1.姓名 = %(person_name)s
     UNION ALL
     SELECT COALESCE(g.FGC_CreateDate, g.日期, g.FGC_LastModifyDate) AS ts,
         '跟班' AS 类型,
@@ -33,20 +39,20 @@ SQL_DICT = {
     FROM 跟班作业记录表 AS g
     JOIN 大桥局人员信息表 AS p2
     ON (g.跟班人员档案编号 = p2.档案编号 OR g.跟班人员 = p2.姓名)
-    WHERE p2.姓名 = '{person_name}'
+    WHERE p2.姓名 = %(person_name)s
     ) AS t
     ORDER BY ts DESC""",
 
     # M4：按姓名查询人员详细信息
     "M4": """SELECT 档案编号, 姓名, 岗位, 职务, 手机号, 状态, 所属部门, 所属项目
     FROM 大桥局人员信息表
-    WHERE 姓名 = '{person_name}'""",
+    WHERE 姓名 = %(person_name)s""",
 
     # M5：按班组名称查询跟班记录（只要日期和关键工序描述，按时间倒序）
     "M5": """SELECT g.日期, g.重点部位_关键工序_特殊时段情况
     FROM 跟班作业记录表 AS g
     JOIN 班前讲话班组字典 AS d ON g.班组 = d.班组ID
-    WHERE d.班组 = '{team_name}'
+    WHERE d.班组 = %(team_name)s
     ORDER BY COALESCE(g.FGC_CreateDate, g.日期, g.FGC_LastModifyDate) DESC""",
 
         # M6：按管控计划内容查询状态（内容可能在主表的施工计划作业内容或子表的分项名称中，按时间倒序）
@@ -80,50 +86,106 @@ SQL_DICT = {
         AND DATE(duty.带班日期) = DATE(p.计划日期)
     LEFT JOIN 跟班作业记录表 AS follow ON s.ID = follow.工单子表ID 
         AND DATE(follow.日期) = DATE(p.计划日期)
-    WHERE p.计划日期 = '{date}'
-        AND ru.责任单元名称 LIKE '%{unit_name}%'
+    WHERE p.计划日期 = %(date)s
+        AND ru.责任单元名称 LIKE %(unit_name)s
     ORDER BY s.ID, p.ID""",
 }
 
+# 实体ID版本的模板：参数已由内存实体词典（data/entity_index.py）解析为ID，
+# 直接按索引列过滤，省去对人员表/班组字典/责任单元字典的关联与前导通配符 LIKE
+SQL_ID_DICT = {
+    "M1": """SELECT b.带班日期, b.带班作业工序及地点
+    FROM 带班作业记录表 AS b
+    WHERE b.带班人员档案编号 IN %(person_ids)s
+    ORDER BY COALESCE(b.FGC_CreateDate, b.带班日期, b.FGC_LastModifyDate) DESC""",
+
+    "M2": """SELECT g.日期, g.重点部位_关键工序_特殊时段情况
+    FROM 跟班作业记录表 AS g
+    WHERE g.跟班人员档案编号 IN %(person_ids)s
+    ORDER BY COALESCE(g.FGC_CreateDate, g.日期, g.FGC_LastModifyDate) DESC""",
+
+    "M4": """SELECT 档案编号, 姓名, 岗位, 职务, 手机号, 状态, 所属部门, 所属项目
+    FROM 大桥局人员信息表
+    WHERE 档案编号 IN %(person_ids)s""",
+
+    "M5": """SELECT g.日期, g.重点部位_关键工序_特殊时段情况
+    FROM 跟班作业记录表 AS g
+    WHERE g.班组 IN %(team_ids)s
+    ORDER BY COALESCE(g.FGC_CreateDate, g.日期, g.FGC_LastModifyDate) DESC""",
+}
+SQL_ID_DICT["M6"] = SQL_DICT["M6"].replace(
+    "AND ru.责任单元名称 LIKE %(unit_name)s", "AND p.管控单元id IN %(unit_ids)s")
+
 """SQL模板定义和管理模块"""
 
-# SQL 模板定义：每个模板包含ID、描述、SQL模板（用 {参数} 占位）、必需参数列表
+# SQL 模板定义：每个模板包含ID、描述、必需参数列表，以及参数元数据
+# SQL_DICT 中的模板用 %(参数)s 占位，由数据库驱动绑定参数，不再拼接字符串
+# 参数元数据：
+#   type      - 参数类型，"str"、"int"、"date"（date 统一归一化为 YYYY-MM-DD）或 "list"
+#               （用于 IN %(参数)s，值为列表，由驱动展开为 (v1, v2, ...)）
+#   item      - list 类型中每个元素的参数元数据；max_items 为元素个数上限
+#   max_len   - 字符串最大长度，超出视为非法参数
+#   normalize - 归一化规则，按顺序执行：
+#               strip         去除首尾空白与引号
+#               like_contains 转义 % 和 _ 后包裹为 %值%，用于 LIKE 模糊匹配
+#   resolve   - 可选，参数名 -> 实体解析规则；实体词典可用时将名称解析为ID并使用 SQL_ID_DICT 中的版本
+#               entity 实体类型（person/team/unit）；bind 绑定的ID列表参数名；
+#               match  "name" 解析为唯一名称，"contains" 取所有包含该文本的实体
 SQL_TEMPLATES = {
     "M1": {
         "desc": "通过姓名查询指定人员的带班记录（包括带班日期、内容和地点）",
         "required_params": ["person_name"],
+        "params": {"person_name": {"type": "str", "max_len": 32, "normalize": ["strip"]}},
+        "resolve": {"person_name": {"entity": "person", "bind": "person_ids", "match": "name"}},
     },
     "M2": {
         "desc": "通过姓名查询指定人员的跟班记录（包括跟班日期、内容和地点）",
         "required_params": ["person_name"],
+        "params": {"person_name": {"type": "str", "max_len": 32, "normalize": ["strip"]}},
+        "resolve": {"person_name": {"entity": "person", "bind": "person_ids", "match": "name"}},
     },
     "M3": {
         "desc": "通过姓名查询指定人员的带班+跟班工作记录（包括跟带班日期、内容和地点）",
         "required_params": ["person_name"],  # 必需参数列表
+        "params": {"person_name": {"type": "str", "max_len": 32, "normalize": ["strip"]}},
     },
     "M4": {
         "desc": "通过姓名查询人员信息表中某人的详细信息（所有已有信息）",
         "required_params": ["person_name"],
+        "params": {"person_name": {"type": "str", "max_len": 32, "normalize": ["strip"]}},
+        "resolve": {"person_name": {"entity": "person", "bind": "person_ids", "match": "name"}},
     },
     "M5": {
         "desc": "通过班组名称查询指定班组的跟班记录",
         "required_params": ["team_name"],
+        "params": {"team_name": {"type": "str", "max_len": 64, "normalize": ["strip"]}},
+        "resolve": {"team_name": {"entity": "team", "bind": "team_ids", "match": "name"}},
     },
     "M6": {
         "desc": "模板6：通过日期和单元名称（即地点）查询管控计划的具体内容",
         "required_params": ["date", "unit_name"],
+        "params": {
+            "date": {"type": "date", "normalize": ["strip"]},
+            "unit_name": {"type": "str", "max_len": 64, "normalize": ["strip", "like_contains"]},
+        },
+        "resolve": {"unit_name": {"entity": "unit", "bind": "unit_ids", "match": "contains"}},
     },
 }
 
+# 日期参数可接受的格式（LLM 提取的日期格式不固定）
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y%m%d", "%Y年%m月%d日", "%Y年%m月%d号")
 
 
 class SQLTemplateManager:
     """SQL模板管理器"""
 
+    # 已编译模板缓存：(template_id, 是否ID版本) -> 完成字段替换的参数化SQL
+    _compiled: Dict[Tuple[str, bool], str] = {}
+
     @staticmethod
     def get_template(template_id: str) -> dict:
         """根据模板ID获取模板"""
-        template = {"decs": SQL_TEMPLATES[template_id]["desc"], "sql": SQL_DICT[template_id]}
+        template = {"desc": SQL_TEMPLATES[template_id]["desc"], "sql": SQL_DICT[template_id]}
         if not template:
             raise ValueError(f"未找到模板ID: {template_id}")
         return template
@@ -135,4 +197,146 @@ class SQLTemplateManager:
             f"- {k}: {v['desc']}" for k, v in SQL_TEMPLATES.items()
         ])
 
+    @classmethod
+    def get_compiled_sql(cls, template_id: str, by_id: bool = False) -> str:
+        """
+        获取编译后的模板SQL（字段替换只在首次使用时执行一次）
+
+        模板SQL由开发者维护，编译结果无需再经过 SQLValidator 校验
+
+        Args:
+            template_id: 模板ID
+            by_id: 是否使用按实体ID过滤的版本（SQL_ID_DICT）
+        """
+        key = (template_id, by_id)
+        sql = cls._compiled.get(key)
+        if sql is None:
+            source = SQL_ID_DICT if by_id else SQL_DICT
+            if template_id not in source:
+                raise ValueError(f"未找到模板ID: {template_id}")
+            sql = SQLFieldReplacer.replace_fields(source[template_id])
+            cls._compiled[key] = sql
+        return sql
+
+    @staticmethod
+    def normalize_param(name: str, value, spec: Dict):
+        """按参数元数据校验并归一化单个参数，非法时抛出 ValueError"""
+        if value is None:
+            raise ValueError(f"缺少模板参数: {name}")
+
+        if spec.get("type") == "list":
+            items = value if isinstance(value, (list, tuple)) else str(value).split(",")
+            items = [SQLTemplateManager.normalize_param(name, item, spec.get("item", {})) for item in items]
+            if not items:
+                raise ValueError(f"模板参数 {name} 为空")
+            max_items = spec.get("max_items")
+            if max_items and len(items) > max_items:
+                raise ValueError(f"模板参数 {name} 元素过多: {len(items)} 个")
+            return items
+
+        if spec.get("type") == "date":
+            if isinstance(value, (date, datetime)):
+                return value.strftime("%Y-%m-%d")
+            text = str(value).strip().strip("'\"")
+            for fmt in _DATE_FORMATS:
+                try:
+                    return datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+                except ValueError:
+                    continue
+            raise ValueError(f"模板参数 {name} 不是合法日期: {value!r}")
+
+        if spec.get("type") == "int":
+            try:
+                return int(str(value).strip().strip("'\""))
+            except ValueError:
+                raise ValueError(f"模板参数 {name} 不是整数: {value!r}")
+
+        text = str(value)
+        for rule in spec.get("normalize", []):
+            if rule == "strip":
+                text = text.strip().strip("'\"`").strip()
+            elif rule == "like_contains":
+                text = "%" + re.sub(r"([%_\\])", r"\\\1", text) + "%"
+            else:
+                raise ValueError(f"未知的参数归一化规则: {rule}")
+
+        if not text.strip("%"):
+            raise ValueError(f"模板参数 {name} 为空")
+        max_len = spec.get("max_len")
+        if max_len and len(text.strip("%")) > max_len:
+            raise ValueError(f"模板参数 {name} 过长: {value!r}")
+        return text
+
+    @classmethod
+    def resolve_entities(cls, template_id: str, params: Dict, entity_index) -> Dict:
+        """
+        用内存实体词典将模板中的名称参数解析为实体ID
+
+        Args:
+            template_id: 模板ID
+            params: LLM提取的参数字典
+            entity_index: data.entity_index.EntityIndex 实例（可为 None）
+
+        Returns:
+            参数名 -> Resolution；词典未就绪、模板无解析规则或有名称未命中时返回空字典（回退为按名称查询）
+
+        Raises:
+            AmbiguousEntityError: 名称对应多个不同实体，或只模糊匹配到一个需要确认的实体，需要用户澄清
+        """
+        meta = SQL_TEMPLATES.get(template_id, {})
+        rules = meta.get("resolve")
+        if not rules or entity_index is None or not entity_index.ready or template_id not in SQL_ID_DICT:
+            return {}
+
+        from data.entity_index import AmbiguousEntityError
+
+        resolutions = {}
+        for name, rule in rules.items():
+            value = cls.normalize_param(name, (params or {}).get(name), {"normalize": ["strip"]})
+            resolution = entity_index.resolve(rule["entity"], value, match=rule.get("match", "name"))
+            if resolution.needs_confirmation:
+                raise AmbiguousEntityError(resolution)
+            if not resolution.resolved:
+                return {}
+            resolutions[name] = resolution
+        return resolutions
+
+    @classmethod
+    def prepare(cls, template_id: str, params: Dict, resolutions: Dict = None) -> Tuple[str, Dict]:
+        """
+        将模板与LLM提取的参数组装为参数化查询
+
+        Args:
+            template_id: 模板ID
+            params: LLM提取的参数字典
+            resolutions: resolve_entities 的结果；非空时使用按实体ID过滤的模板版本
+
+        Returns:
+            (参数化SQL, 绑定参数字典)，直接传给 Database.run_query(sql, args)
+        """
+        if template_id not in SQL_TEMPLATES:
+            raise ValueError(f"未找到模板ID: {template_id}")
+        meta = SQL_TEMPLATES[template_id]
+        specs = meta.get("params", {})
+        rules = meta.get("resolve", {}) if resolutions else {}
+
+        args = {}
+        for name in meta["required_params"]:
+            if name in rules:
+                args[rules[name]["bind"]] = resolutions[name].ids
+            else:
+                args[name] = cls.normalize_param(name, (params or {}).get(name), specs.get(name, {}))
+        return cls.get_compiled_sql(template_id, by_id=bool(rules)), args
+
+    @staticmethod
+    def render_for_display(sql: str, args: Dict) -> str:
+        """将绑定参数代入SQL文本，仅用于日志和前端展示，不可用于执行"""
+        if not args:
+            return sql
+        def quote(value) -> str:
+            if isinstance(value, (list, tuple)):
+                return "(" + ", ".join(quote(v) for v in value) + ")"
+            return "'" + str(value).replace("'", "''") + "'"
 
+        quoted = {k: quote(v) for k, v in args.items()}
+        return sql % quoted
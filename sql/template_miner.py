@@ -0,0 +1,317 @@
+"""
+模板挖掘工具：从查询历史中找出反复出现的自由生成SQL，推荐新增为SQL模板
+
+自由模式（template_id == "free"）每次都要走大段生成提示词，且常伴随多次校验重试；
+而历史中同一形状的自由SQL会反复出现。本工具离线完成：
+    1. 读取查询历史（app.py 写入的 SQLite 查询历史库、旧版 JSONL，或 test_runner.py 的 test_report.json）
+    2. 将自由SQL归一化（字面量 -> 占位符）并计算指纹
+    3. 按指纹聚类，按 出现次数 × 平均LLM调用次数 排序
+    4. 为排名靠前的形状生成 SQL_TEMPLATES / SQL_DICT 候选条目
+
+使用方法:
+    python -m sql.template_miner [历史文件 ...] [--min-count 3] [--top 10] [--json]
+"""
+
+import argparse
+import hashlib
+import json
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sql.sql_templates import SQL_TEMPLATES
+
+# SQL 词法单元：注释、字符串字面量、数值字面量、标识符/关键字、空白、其他符号
+_TOKEN_PATTERN = re.compile(
+    r"(?P<comment>--[^\n]*|#[^\n]*|/\*.*?\*/)"
+    r"|(?P<string>'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\")"
+    r"|(?P<number>(?<![\w\u4e00-\u9fa5.])-?\d+(?:\.\d+)?(?![\w\u4e00-\u9fa5]))"
+    r"|(?P<ident>`[^`]+`|[\w\u4e00-\u9fa5]+(?:\.[\w\u4e00-\u9fa5`]+)*)"
+    r"|(?P<space>\s+)"
+    r"|(?P<other>.)",
+    flags=re.DOTALL,
+)
+
+# 字面量前的比较表达式：<列名> <运算符>，用于推断参数名
+_COMPARE_PATTERN = re.compile(
+    r"([\w\u4e00-\u9fa5`]+)\s*(=|<>|!=|>=|<=|>|<|like|in\s*\(|between)\s*$",
+    flags=re.IGNORECASE,
+)
+_IN_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# 参数化SQL中的 IN (%(a)s, %(b)s, ...)：合并为一个列表参数 IN %(a_list)s
+_TEMPLATED_IN_PATTERN = re.compile(r"(\bIN\s*)\(\s*(%\(\w+\)s(?:\s*,\s*%\(\w+\)s)*)\s*\)", flags=re.IGNORECASE)
+# 列表参数的元素个数上限
+IN_LIST_MAX_ITEMS = 500
+_DATE_LITERAL = re.compile(r"^\d{4}[-/.]\d{1,2}[-/.]\d{1,2}")
+# 日期格式串（DATE_FORMAT(..., '%Y-%m') 等的格式参数）：属于SQL结构，保留原样而不作为参数
+_FORMAT_MASK = re.compile(r"^(?:%[a-zA-Z]|[^%a-zA-Z0-9])+$")
+
+# 列名 -> 模板参数名（沿用现有模板的参数命名）
+COLUMN_PARAM_NAMES = {
+    "姓名": "person_name",
+    "跟班人员": "person_name",
+    "班组": "team_name",
+    "班组名称": "team_name",
+    "计划日期": "date",
+    "带班日期": "date",
+    "日期": "date",
+    "责任单元名称": "unit_name",
+    "档案编号": "archive_no",
+    "所属项目": "project_name",
+}
+
+
+@dataclass
+class SQLShape:
+    """一类归一化后形状相同的自由SQL"""
+    fingerprint: str
+    normalized_sql: str
+    count: int = 0
+    llm_calls: int = 0
+    questions: Counter = field(default_factory=Counter)
+    # 代表样例：参数化SQL及每个占位符的推断信息
+    template_sql: str = ""
+    slots: List[Dict] = field(default_factory=list)
+
+    @property
+    def avg_llm_calls(self) -> float:
+        return self.llm_calls / self.count if self.count else 0.0
+
+    @property
+    def score(self) -> float:
+        """频次 × 平均LLM调用次数，即转为模板后可节省的LLM调用数"""
+        return self.count * max(self.avg_llm_calls, 1.0)
+
+
+def _collapse_in_lists(templated_sql: str, slots: List[Dict]) -> Tuple[str, List[Dict]]:
+    """
+    把 IN 列表中逐个元素的占位符合并为一个列表参数
+
+    指纹不区分 IN 列表长度，模板也必须能绑定任意长度的列表：IN (%(a)s, %(b)s) -> IN %(a_list)s，
+    参数值为列表，由驱动展开
+    """
+    by_name = {slot["name"]: slot for slot in slots}
+    merged: Dict[str, List[str]] = {}
+
+    def collapse(match: re.Match) -> str:
+        names = re.findall(r"%\((\w+)\)s", match.group(2))
+        merged[names[0]] = names
+        first = by_name[names[0]]
+        return f"{match.group(1)}%({first['name']}_list)s"
+
+    templated_sql = _TEMPLATED_IN_PATTERN.sub(collapse, templated_sql)
+    dropped = {name for names in merged.values() for name in names[1:]}
+    result = []
+    for slot in slots:
+        if slot["name"] in dropped:
+            continue
+        names = merged.get(slot["name"])
+        if names is not None:
+            slot = {
+                "name": f"{slot['name']}_list",
+                "column": slot["column"],
+                "example": [by_name[name]["example"] for name in names],
+                "spec": {"type": "list", "item": slot["spec"], "max_items": IN_LIST_MAX_ITEMS},
+            }
+        result.append(slot)
+    return templated_sql, result
+
+
+def parameterize_sql(sql: str) -> Tuple[str, str, List[Dict]]:
+    """
+    将SQL中的字面量替换为占位符
+
+    Returns:
+        (归一化SQL，用于计算指纹；参数化SQL，用 %(name)s 占位，IN 列表为一个列表参数；占位符信息列表)
+    """
+    normalized: List[str] = []
+    templated: List[str] = []
+    slots: List[Dict] = []
+    used_names: Counter = Counter()
+
+    for match in _TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        text = match.group(0)
+        if kind == "comment":
+            continue
+        if kind == "space":
+            normalized.append(" ")
+            templated.append(" ")
+            continue
+        if kind in ("string", "number"):
+            value = text[1:-1] if kind == "string" else text
+            prefix = "".join(templated)
+            compare = _COMPARE_PATTERN.search(prefix)
+            if kind == "string" and compare is None and _FORMAT_MASK.match(value):
+                normalized.append(text)
+                templated.append(text.replace("%", "%%"))
+                continue
+            column = compare.group(1).strip("`") if compare else ""
+            base = COLUMN_PARAM_NAMES.get(column, f"param_{len(slots) + 1}")
+            used_names[base] += 1
+            name = base if used_names[base] == 1 else f"{base}_{used_names[base]}"
+
+            spec = {"type": "str", "max_len": 64, "normalize": ["strip"]}
+            if kind == "number":
+                spec = {"type": "int"} if value.lstrip("-").isdigit() else {"type": "str", "max_len": 32}
+            elif _DATE_LITERAL.match(value):
+                spec = {"type": "date", "normalize": ["strip"]}
+            elif value.startswith("%") and value.endswith("%") and len(value) > 1:
+                spec = {"type": "str", "max_len": 64, "normalize": ["strip", "like_contains"]}
+                value = value.strip("%")
+
+            slots.append({"name": name, "column": column, "example": value, "spec": spec})
+            normalized.append("?")
+            templated.append(f"%({name})s")
+            continue
+        if kind == "other" and text == "%":
+            text = "%%"
+        templated.append(text)
+        if kind == "ident" and not text.startswith("`") and text.isascii():
+            # 关键字大小写不影响形状（仅用于指纹，参数化SQL保留原样）
+            text = text.upper()
+        normalized.append(text)
+
+    normalized_sql = re.sub(r"\s+", " ", "".join(normalized)).strip()
+    # IN (?, ?, ?) 不论元素个数都视为同一形状
+    normalized_sql = _IN_LIST_PATTERN.sub("(?)", normalized_sql)
+    templated_sql, slots = _collapse_in_lists("".join(templated).strip(), slots)
+    return normalized_sql, templated_sql, slots
+
+
+def fingerprint_sql(normalized_sql: str) -> str:
+    """计算归一化SQL的指纹"""
+    return hashlib.sha1(normalized_sql.encode("utf-8")).hexdigest()[:12]
+
+
+def load_history(paths: Iterable[Path]) -> List[Dict]:
+    """读取查询历史，兼容 SQLite 查询历史库（.db）、旧版 JSONL 查询历史与 test_report.json"""
+    records: List[Dict] = []
+    for path in paths:
+        path = Path(path)
+        if path.suffix == ".db":
+            # 历史库依赖本模块计算指纹，延迟导入避免循环
+            from data.history_store import HistoryStore
+            records.extend(HistoryStore(path, start_writer=False).iter_records())
+            continue
+        text = Path(path).read_text(encoding="utf-8")
+        if path.suffix == ".jsonl":
+            records.extend(json.loads(line) for line in text.splitlines() if line.strip())
+            continue
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("results", [])
+        records.extend(data)
+    return records
+
+
+def record_template_id(record: Dict) -> Optional[str]:
+    """历史记录的模板ID（SQLite/JSONL 历史为顶层字段，test_report.json 在 template_info 中）"""
+    return record.get("template_id") or (record.get("template_info") or {}).get("template_id")
+
+
+def mine_shapes(records: Iterable[Dict], min_count: int = 2) -> List[SQLShape]:
+    """对自由模式且执行成功的SQL聚类，返回按得分降序排列的形状列表"""
+    shapes: Dict[str, SQLShape] = {}
+    for record in records:
+        template_id = record_template_id(record)
+        sql = record.get("sql")
+        if not sql or not record.get("success") or (template_id and template_id != "free"):
+            continue
+
+        normalized_sql, template_sql, slots = parameterize_sql(sql)
+        fp = fingerprint_sql(normalized_sql)
+        shape = shapes.get(fp)
+        if shape is None:
+            shape = SQLShape(fingerprint=fp, normalized_sql=normalized_sql,
+                             template_sql=template_sql, slots=slots)
+            shapes[fp] = shape
+        shape.count += 1
+        shape.llm_calls += int(record.get("llm_calls") or record.get("attempts") or 1)
+        if record.get("question"):
+            shape.questions[record["question"]] += 1
+
+    ranked = [s for s in shapes.values() if s.count >= min_count]
+    ranked.sort(key=lambda s: s.score, reverse=True)
+    return ranked
+
+
+def _next_template_ids(start: Optional[int] = None) -> Iterable[str]:
+    """生成未被占用的模板ID（M7、M8 ...）"""
+    index = start or max(int(k[1:]) for k in SQL_TEMPLATES if k[1:].isdigit()) + 1
+    while True:
+        yield f"M{index}"
+        index += 1
+
+
+def propose_templates(shapes: List[SQLShape]) -> List[Dict]:
+    """为聚类结果生成模板候选条目（需人工审阅描述与参数名后再合入 sql_templates.py）"""
+    proposals = []
+    for template_id, shape in zip(_next_template_ids(), shapes):
+        question, _ = shape.questions.most_common(1)[0] if shape.questions else ("", 0)
+        proposals.append({
+            "template_id": template_id,
+            "fingerprint": shape.fingerprint,
+            "count": shape.count,
+            "avg_llm_calls": round(shape.avg_llm_calls, 2),
+            "score": round(shape.score, 2),
+            "sample_questions": [q for q, _ in shape.questions.most_common(3)],
+            "SQL_TEMPLATES": {
+                "desc": f"（待审阅）{question}",
+                "required_params": [slot["name"] for slot in shape.slots],
+                "params": {slot["name"]: slot["spec"] for slot in shape.slots},
+            },
+            "SQL_DICT": shape.template_sql,
+        })
+    return proposals
+
+
+def format_proposal(proposal: Dict) -> str:
+    """将候选条目格式化为可直接粘贴进 sql_templates.py 的代码片段"""
+    meta = json.dumps(proposal["SQL_TEMPLATES"], ensure_ascii=False, indent=4)
+    lines = [
+        f"# 指纹 {proposal['fingerprint']}：出现 {proposal['count']} 次，"
+        f"平均LLM调用 {proposal['avg_llm_calls']} 次，得分 {proposal['score']}",
+    ]
+    lines += [f"#   示例问题：{q}" for q in proposal["sample_questions"]]
+    lines.append(f'# SQL_TEMPLATES["{proposal["template_id"]}"] =')
+    lines.append(meta)
+    lines.append(f'# SQL_DICT["{proposal["template_id"]}"] =')
+    lines.append(f'"""{proposal["SQL_DICT"]}"""')
+    return "\n".join(lines)
+
+
+# 默认查询历史路径，与 config.config 中 --query_history_path 的默认值一致
+# （不导入 config.config，避免其 parse_args 与本工具的命令行参数冲突）
+DEFAULT_HISTORY_PATH = Path(__file__).resolve().parent.parent / "memory" / "query_history.db"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从查询历史中挖掘自由SQL模板")
+    parser.add_argument("history", nargs="*", type=Path, help="查询历史文件（默认读取 query_history_path）")
+    parser.add_argument("--min-count", type=int, default=3, help="形状最少出现次数")
+    parser.add_argument("--top", type=int, default=10, help="最多输出的候选模板数")
+    parser.add_argument("--json", action="store_true", help="以JSON格式输出候选模板")
+    args = parser.parse_args()
+
+    paths = args.history or [DEFAULT_HISTORY_PATH]
+    records = load_history(paths)
+    shapes = mine_shapes(records, min_count=args.min_count)[:args.top]
+    proposals = propose_templates(shapes)
+
+    free_total = sum(1 for r in records if (record_template_id(r) or "free") == "free")
+    if args.json:
+        print(json.dumps(proposals, ensure_ascii=False, indent=2))
+        return
+
+    print(f"查询历史 {len(records)} 条，其中自由模式 {free_total} 条，"
+          f"可复用形状 {len(shapes)} 类（覆盖 {sum(s.count for s in shapes)} 条）")
+    for proposal in proposals:
+        print()
+        print(format_proposal(proposal))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+基准脚本：上传音频的预处理开销（旧：临时文件 + ffmpeg 子进程转码 vs 新：内存解码）
+    旧流程：上传内容写临时文件 -> ffmpeg 转成 16k 单声道 wav 临时文件 -> 模型按路径读取
+    新流程：voice.audio_decode.decode_audio 直接从字节解码为 16k float32 数组
+统计每次请求的耗时 P50/P95 与CPU时间（本进程 + 子进程），不含模型推理。
+使用方法: python test/bench_audio_decode.py --audio sample.wav [--audio sample.webm] [--rounds 50]
+"""
+
+import argparse
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice.audio_decode import decode_audio
+
+
+def legacy_decode(data: bytes, suffix: str):
+    """旧流程：落盘 + ffmpeg 转码 + 读取 wav（模型按路径读取文件的开销用 soundfile 读取近似）"""
+    import soundfile as sf
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(data)
+        tmp_path = tmp_file.name
+    fd, converted_path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        subprocess.run(["ffmpeg", "-y", "-i", tmp_path, "-ar", "16000", "-ac", "1", converted_path],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        audio, _ = sf.read(converted_path, dtype="float32")
+        return audio
+    finally:
+        for path in (tmp_path, converted_path):
+            os.unlink(path)
+
+
+def _cpu_seconds() -> float:
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def bench(fn, rounds: int) -> dict:
+    fn()  # 预热
+    latencies = []
+    cpu_start = _cpu_seconds()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    cpu = _cpu_seconds() - cpu_start
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+        "cpu_ms": cpu / rounds * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="上传音频解码开销基准测试")
+    parser.add_argument("--audio", action="append", required=True, help="测试音频，可多次指定（wav/webm/mp3 等）")
+    parser.add_argument("--rounds", type=int, default=50, help="每种方式的请求次数")
+    parser.add_argument("--skip-legacy", action="store_true", help="不测旧流程（未安装 ffmpeg 时）")
+    args = parser.parse_args()
+
+    print(f"{'音频':<24}{'方式':<16}{'P50 ms':>10}{'P95 ms':>10}{'CPU ms/次':>12}")
+    for path in args.audio:
+        with open(path, "rb") as f:
+            data = f.read()
+        suffix = os.path.splitext(path)[1].lower() or ".wav"
+        audio, method = decode_audio(data)
+        name = f"{os.path.basename(path)} ({len(audio) / 16000:.1f}s)"
+        rows = [(f"内存/{method}", bench(lambda: decode_audio(data), args.rounds))]
+        if not args.skip_legacy:
+            rows.append(("临时文件+ffmpeg", bench(lambda: legacy_decode(data, suffix), args.rounds)))
+        for label, r in rows:
+            print(f"{name:<24}{label:<16}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['cpu_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+基准脚本：对比旧版逐规则双 re.sub 字段替换与单遍预编译替换的耗时
+使用方法: python test/bench_field_replacer.py [--clauses 2000] [--repeat 20]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql.sql_field_replacer import SQLFieldReplacer
+
+
+def legacy_replace_fields(sql: str) -> str:
+    """旧实现：每次调用重新排序，并对每条规则执行两次 re.sub（不跳过字面量）"""
+    result_sql = sql
+    sorted_replacements = sorted(
+        SQLFieldReplacer.FIELD_REPLACEMENT_MAP.items(),
+        key=lambda x: len(x[0]),
+        reverse=True
+    )
+    for schema_field, db_field in sorted_replacements:
+        table_field_pattern = rf"([`\w一-龥]+)\.{re.escape(schema_field)}"
+        result_sql = re.sub(table_field_pattern, rf"\1.{db_field}", result_sql, flags=re.IGNORECASE)
+        standalone_pattern = rf"(?<![`\w一-龥]){re.escape(schema_field)}(?![`\w一-龥])"
+        result_sql = re.sub(standalone_pattern, db_field, result_sql, flags=re.IGNORECASE)
+    return result_sql
+
+
+def build_sql(clauses: int) -> str:
+    """生成一条包含大量字段引用、字符串字面量与注释的大SQL"""
+    parts = ["SELECT b.带班日期, b.带班人员档案编号, `带班领导档案编号`"]
+    parts.append("FROM 带班作业记录表 AS b")
+    parts.append("JOIN 每日管控计划 AS p ON b.工单ID = p.ID")
+    parts.append("WHERE 1 = 1")
+    for i in range(clauses):
+        parts.append(
+            f"  OR (b.带班人员档案编号 = 'BM-{i:05d}' AND p.管控责任人档案编号 <> '管控责任人档案编号')"
+            f" -- 第{i}个条件 带班领导档案编号"
+        )
+    parts.append("ORDER BY b.带班日期 DESC")
+    return "\n".join(parts)
+
+
+def timeit(func, sql: str, repeat: int) -> float:
+    """返回单次调用的平均耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(sql)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="字段替换基准测试")
+    parser.add_argument("--clauses", type=int, default=2000, help="生成SQL中的条件数量")
+    parser.add_argument("--repeat", type=int, default=20, help="每种实现的重复次数")
+    args = parser.parse_args()
+
+    sql = build_sql(args.clauses)
+    # 预热：触发正则编译缓存
+    SQLFieldReplacer.replace_fields(sql)
+    legacy_replace_fields(sql)
+
+    legacy_ms = timeit(legacy_replace_fields, sql, args.repeat)
+    single_ms = timeit(SQLFieldReplacer.replace_fields, sql, args.repeat)
+    _, rewrites = SQLFieldReplacer.rewrite(sql)
+
+    print(f"SQL长度: {len(sql)} 字符, 条件数: {args.clauses}")
+    print(f"旧实现（双 re.sub / 规则）: {legacy_ms:.2f} ms")
+    print(f"单遍预编译替换:            {single_ms:.2f} ms")
+    print(f"加速比: {legacy_ms / single_ms:.2f}x")
+    print(f"实际替换次数: {len(rewrites)}（字面量与注释中的字段名已跳过）")
+
+
+if __name__ == "__main__":
+    main()
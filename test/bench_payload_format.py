@@ -0,0 +1,110 @@
+"""
+基准脚本：对比查询结果的旧响应格式与列式压缩格式的体积与编码耗时
+    旧格式：逐行逐格 serialize_row 转换 + jsonify（行对象数组，中文转义为 \\uXXXX）
+    新格式：原始行直接交给 json_codec 编码（orjson 可用时使用 orjson），列式 {columns, data}，可选 gzip/brotli
+使用方法: python test/bench_payload_format.py [--rows 1000] [--repeat 20]
+"""
+
+import argparse
+import decimal
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data import json_codec
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+
+def legacy_serialize_row(row: dict) -> dict:
+    """旧实现：Database.serialize_row 的逐格类型转换"""
+    serialized = {}
+    for key, value in row.items():
+        if value is None:
+            serialized[key] = None
+        elif isinstance(value, (date, datetime)):
+            serialized[key] = value.isoformat()
+        elif isinstance(value, timedelta):
+            serialized[key] = str(value)
+        elif isinstance(value, decimal.Decimal):
+            serialized[key] = float(value)
+        else:
+            serialized[key] = value
+    return serialized
+
+
+def build_rows(count: int) -> list:
+    """模拟带班作业记录查询结果：中文列名、日期、时间、Decimal 与较长文本"""
+    base = datetime(2025, 3, 1, 8, 0, 0)
+    return [
+        {
+            "带班日期": (base + timedelta(days=i % 300)).date(),
+            "带班人员档案编号": f"BM-{i:05d}",
+            "姓名": ["罗康康", "桂晓明", "吕昊", "张伟"][i % 4],
+            "所属项目": "沪渝蓉高铁武汉至宜昌段站前工程ZQSG-5标",
+            "班组": f"钢筋班组{i % 12}",
+            "作业内容": "墩身钢筋绑扎及模板安装，检查保护层厚度与预埋件位置" * (1 + i % 2),
+            "开始时间": base + timedelta(days=i % 300, hours=i % 10),
+            "作业时长": timedelta(hours=2 + i % 6),
+            "完成率": decimal.Decimal(f"{(i * 7) % 100}.{i % 100:02d}"),
+            "备注": None if i % 3 else "已复核",
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_encode(rows: list) -> bytes:
+    """旧格式：serialize_row + jsonify（Flask 默认 ensure_ascii=True）"""
+    return json.dumps({"rows": [legacy_serialize_row(r) for r in rows]}).encode("utf-8")
+
+
+def columnar_encode(rows: list) -> bytes:
+    """新格式：列式 + 快速编码器，日期/Decimal 由编码器处理"""
+    return json_codec.dumps({"rows": json_codec.to_columnar(rows)})
+
+
+def timeit(func, repeat: int):
+    """返回 (单次平均耗时毫秒, 最后一次返回值)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = func()
+    return (time.perf_counter() - start) * 1000 / repeat, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询结果响应格式基准测试")
+    parser.add_argument("--rows", type=int, default=1000, help="结果行数")
+    parser.add_argument("--repeat", type=int, default=20, help="每种格式的重复次数")
+    args = parser.parse_args()
+
+    rows = build_rows(args.rows)
+    cases = [
+        ("旧格式 行对象+jsonify", lambda: legacy_encode(rows)),
+        ("列式 无压缩", lambda: columnar_encode(rows)),
+        ("列式 + gzip", lambda: gzip.compress(columnar_encode(rows), compresslevel=5)),
+    ]
+    if BROTLI_AVAILABLE:
+        cases.append(("列式 + brotli", lambda: brotli.compress(columnar_encode(rows), quality=4)))
+
+    print(f"结果行数: {args.rows}, 编码器: {'orjson' if json_codec.ORJSON_AVAILABLE else '标准库 json'}"
+          f"{'' if BROTLI_AVAILABLE else '（未安装 brotli，跳过 brotli）'}")
+    print(f"{'格式':<24}{'体积(KB)':>10}{'相对旧格式':>12}{'耗时(ms)':>10}")
+    baseline_size = None
+    for name, func in cases:
+        elapsed, body = timeit(func, args.repeat)
+        baseline_size = baseline_size or len(body)
+        print(f"{name:<24}{len(body) / 1024:>10.1f}{len(body) / baseline_size:>12.1%}{elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+基准脚本：服务启动耗时（导入耗时回归检查）
+    - 在子进程中以 python -X importtime 导入 app，汇总总导入耗时与耗时最多的顶层模块
+    - 检查 torch/funasr/pandas 等重型依赖没有在导入阶段被加载（应推迟到加载模型时）
+    - 可选 --boot：再测 create_app() 返回耗时与语音模型加载完成（/api/ready 就绪）的耗时
+    超出 --max-import-ms 或导入了禁止的模块时以非零状态退出，可放进 CI 作为回归检查。
+使用方法: python test/bench_startup.py [--max-import-ms 1500] [--top 15] [--forbid torch funasr pandas] [--boot]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+while any(s in ("pending", "loading") for s in app.model_status.values()):
+    time.sleep(0.05)
+print(json.dumps({"import": imported - start, "create_app": created - imported,
+                  "ready": time.perf_counter() - start, "models": app.model_status}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """解析 -X importtime 输出：返回 {模块: (自身us, 累计us)}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="服务启动耗时基准测试")
+    parser.add_argument("--module", default="app", help="要导入的入口模块")
+    parser.add_argument("--max-import-ms", type=float, default=0, help="总导入耗时上限（毫秒），0 表示不检查")
+    parser.add_argument("--top", type=int, default=15, help="列出耗时最多的顶层包数量")
+    parser.add_argument("--forbid", nargs="*", default=["torch", "funasr", "pandas"],
+                        help="导入阶段不允许加载的模块")
+    parser.add_argument("--boot", action="store_true", help="同时测量 create_app() 与模型就绪耗时")
+    args = parser.parse_args()
+
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+                          cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        sys.exit(f"导入 {args.module} 失败:\n{proc.stderr[-2000:]}")
+    modules = parse_importtime(proc.stderr)
+    total_ms = sum(self_us for self_us, _ in modules.values()) / 1000
+
+    # 按顶层包汇总自身耗时
+    packages = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        packages[name.split(".")[0]] += self_us
+    print(f"导入 {args.module}: {total_ms:.0f}ms，共 {len(modules)} 个模块")
+    print(f"{'顶层包':<28}{'耗时ms':>10}{'占比':>8}")
+    for name, self_us in sorted(packages.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{name:<28}{self_us / 1000:>10.1f}{self_us / 1000 / total_ms:>8.1%}")
+
+    failures = []
+    forbidden = sorted(name for name in args.forbid if name in packages)
+    if forbidden:
+        failures.append(f"导入阶段加载了重型依赖: {', '.join(forbidden)}")
+    if args.max_import_ms and total_ms > args.max_import_ms:
+        failures.append(f"导入耗时 {total_ms:.0f}ms 超过上限 {args.max_import_ms:.0f}ms")
+
+    if args.boot:
+        env = dict(os.environ, AI2SQL_PRELOAD="0")
+        boot = subprocess.run([sys.executable, "-c", BOOT_SCRIPT], cwd=ROOT, env=env,
+                              stdout=subprocess.PIPE, text=True)
+        if boot.returncode == 0:
+            r = json.loads(boot.stdout.strip().splitlines()[-1])
+            print(f"导入 {r['import'] * 1000:.0f}ms，create_app() {r['create_app'] * 1000:.0f}ms，"
+                  f"模型就绪 {r['ready']:.1f}s，状态 {r['models']}")
+        else:
+            failures.append("create_app() 启动失败")
+
+    for failure in failures:
+        print(f"失败: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+基准脚本：语音识别动态小批次的吞吐-延迟曲线（CPU）
+    N 个并发客户端各自循环提交同一组音频（闭环：收到结果后立即提交下一条），对每组
+    (并发数, 凑批等待 ms) 统计：
+    - 吞吐：每秒完成的请求数、每秒处理的音频秒数
+    - 延迟：单次请求（排队 + 推理）P50/P95
+    - 平均批大小、进程CPU时间 / 音频时长
+    凑批等待为 0 且批大小为 1 即不合并的基线（等价于工作线程串行调用 model.generate）。
+使用方法: python test/bench_stt_batch.py --model model/SenseVoiceSmall
+          --vad model/speech_fsmn_vad_zh-cn-16k-common-pytorch --audio a.wav [--audio b.wav ...]
+          [--clients 1 2 4 8] [--waits 0 20 50 100] [--max-batch-size 8] [--threads 0] [--requests 8]
+"""
+
+import argparse
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice.audio_decode import decode_audio
+from voice.stt_batcher import SAMPLE_RATE, STTBatchWorker
+from voice.stt_service import STTService
+
+
+def run_client(worker: STTBatchWorker, audios: list, requests: int, offset: int, latencies: list):
+    for i in range(requests):
+        audio = audios[(offset + i) % len(audios)]
+        start = time.perf_counter()
+        worker.recognize(audio)
+        latencies.append(time.perf_counter() - start)
+
+
+def bench(stt: STTService, audios: list, clients: int, wait_ms: int, batch_size: int,
+          threads: int, requests: int) -> dict:
+    worker = STTBatchWorker(stt, max_wait_ms=wait_ms, max_batch_size=batch_size,
+                            queue_size=clients * 2, num_threads=threads)
+    worker.start()
+    latencies: list = []
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    workers = [threading.Thread(target=run_client, args=(worker, audios, requests, i, latencies))
+               for i in range(clients)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+    stats = worker.stats()
+    latencies.sort()
+    return {
+        "req_per_s": len(latencies) / wall,
+        "audio_per_s": stats["audio_seconds"] / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000,
+        "avg_batch": stats["avg_batch_size"],
+        "cpu_per_audio_second": cpu / stats["audio_seconds"] if stats["audio_seconds"] else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语音识别动态小批次基准测试")
+    parser.add_argument("--model", required=True, help="识别模型路径（如 SenseVoiceSmall）")
+    parser.add_argument("--vad", required=True, help="VAD 模型路径")
+    parser.add_argument("--audio", action="append", required=True, help="测试音频，可多次指定")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8], help="并发客户端数")
+    parser.add_argument("--waits", type=int, nargs="+", default=[0, 20, 50, 100], help="凑批等待时间（毫秒）")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="单批条数上限")
+    parser.add_argument("--threads", type=int, default=0, help="torch 计算线程数，0 表示自动")
+    parser.add_argument("--requests", type=int, default=8, help="每个客户端的请求数")
+    args = parser.parse_args()
+
+    stt = STTService(args.model, args.vad, device="cpu")
+    if not stt.is_available():
+        sys.exit("语音识别模型加载失败，请检查 --model/--vad 路径与 funasr 安装")
+    audios = []
+    for path in args.audio:
+        with open(path, "rb") as f:
+            audios.append(decode_audio(f.read())[0])
+    print(f"音频 {len(audios)} 段，平均 {statistics.mean(len(a) for a in audios) / SAMPLE_RATE:.1f}s")
+    bench(stt, audios, 1, 0, 1, args.threads, 2)  # 预热
+
+    print(f"{'并发':>4}{'凑批ms':>8}{'批大小':>8}{'请求/s':>10}{'音频s/s':>10}{'P50 ms':>10}{'P95 ms':>10}"
+          f"{'CPU秒/音频秒':>14}")
+    for clients in args.clients:
+        rows = [(0, 1)] + [(wait, args.max_batch_size) for wait in args.waits]
+        for wait, batch_size in rows:
+            r = bench(stt, audios, clients, wait, batch_size, args.threads, args.requests)
+            label = f"{wait}" if batch_size > 1 else "不合并"
+            print(f"{clients:>4}{label:>8}{r['avg_batch']:>8.2f}{r['req_per_s']:>10.2f}{r['audio_per_s']:>10.1f}"
+                  f"{r['p50_ms']:>10.0f}{r['p95_ms']:>10.0f}{r['cpu_per_audio_second']:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+基准脚本：语音识别模型 fp32 与 int8 动态量化对比（CPU）
+    每种模式在独立子进程中加载模型（保证内存统计互不影响），对同一组音频统计：
+    - 加载耗时、预热耗时、加载后常驻内存（RSS）增量
+    - 首个请求耗时（未预热 / 预热后）、实时率（推理耗时 / 音频时长）
+    - 与 fp32 结果的字符一致率（量化带来的识别差异）
+使用方法: python test/bench_stt_quantize.py --model model/SenseVoiceSmall
+          --vad model/speech_fsmn_vad_zh-cn-16k-common-pytorch --audio a.wav [--audio b.wav ...]
+          [--modes none int8] [--threads 4] [--rounds 3]
+"""
+
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_mb() -> float:
+    """当前进程常驻内存（MB）"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(args):
+    """子进程：加载一种模式的模型并测量，结果以 JSON 输出到 stdout"""
+    import torch
+
+    from voice.audio_decode import decode_audio
+    from voice.stt_service import STTService
+
+    torch.set_num_threads(args.threads)
+    audios = []
+    for path in args.audio:
+        with open(path, "rb") as f:
+            audios.append(decode_audio(f.read())[0])
+    audio_seconds = sum(len(a) for a in audios) / 16000
+
+    rss_before = rss_mb()
+    stt = STTService(args.model, args.vad, device="cpu", quantize=args.child)
+    if not stt.is_available():
+        sys.exit("语音识别模型加载失败")
+    rss_loaded = rss_mb()
+
+    start = time.perf_counter()
+    stt.recognize(audios[0])
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    stt.recognize(audios[0])
+    warm = time.perf_counter() - start
+
+    texts = []
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        texts = [stt.recognize(audio) for audio in audios]
+    elapsed = (time.perf_counter() - start) / args.rounds
+    print(json.dumps({
+        "load_seconds": stt.load_seconds,
+        "rss_mb": rss_loaded - rss_before,
+        "peak_rss_mb": rss_mb(),
+        "cold_ms": cold * 1000,
+        "warm_ms": warm * 1000,
+        "rtf": elapsed / audio_seconds,
+        "texts": texts,
+    }, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="语音识别模型量化对比基准测试")
+    parser.add_argument("--model", required=True, help="识别模型路径（如 SenseVoiceSmall）")
+    parser.add_argument("--vad", required=True, help="VAD 模型路径")
+    parser.add_argument("--audio", action="append", required=True, help="测试音频，可多次指定")
+    parser.add_argument("--modes", nargs="+", default=["none", "int8"], choices=["none", "int8"])
+    parser.add_argument("--threads", type=int, default=4, help="torch 计算线程数")
+    parser.add_argument("--rounds", type=int, default=3, help="整组音频重复识别次数")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = {}
+    for mode in args.modes:
+        cmd = [sys.executable, os.path.abspath(__file__), "--child", mode, "--model", args.model,
+               "--vad", args.vad, "--threads", str(args.threads), "--rounds", str(args.rounds)]
+        for path in args.audio:
+            cmd += ["--audio", path]
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, check=True, text=True)
+        results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    baseline = results.get("none", next(iter(results.values())))["texts"]
+    print(f"{'模式':<8}{'加载s':>8}{'内存MB':>10}{'峰值MB':>10}{'首次ms':>10}{'预热后ms':>10}{'RTF':>8}{'与fp32一致率':>14}")
+    for mode, r in results.items():
+        agreement = sum(difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(baseline, r["texts"]))
+        agreement /= max(1, len(baseline))
+        print(f"{mode:<8}{r['load_seconds']:>8.1f}{r['rss_mb']:>10.0f}{r['peak_rss_mb']:>10.0f}{r['cold_ms']:>10.0f}"
+              f"{r['warm_ms']:>10.0f}{r['rtf']:>8.3f}{agreement:>14.1%}")
+
+
+if __name__ == "__main__":
+    main()
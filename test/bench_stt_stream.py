@@ -0,0 +1,121 @@
+"""
+基准脚本：流式语音识别的每路CPU开销与并发能力
+    用同一段音频模拟 N 路同时说话的客户端（按 100ms 一包送入，可选按真实时间节奏发送），统计：
+    - 每路实时率（解码耗时 / 音频时长）、首字延迟、分块解码耗时 P50/P95
+    - 进程CPU时间 / 音频时长（含 torch 计算线程，即每路流实际占用的CPU核数）
+使用方法: python test/bench_stt_stream.py --model model/paraformer-zh-streaming --audio sample.wav
+          [--streams 1 2 4] [--replicas 1] [--chunk-ms 600] [--realtime]
+"""
+
+import argparse
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice.streaming_stt import SAMPLE_RATE, StreamingSTTService
+
+PACKET_SECONDS = 0.1
+
+
+def load_pcm(path: str) -> bytes:
+    """读取音频并转为 16k 单声道 16bit PCM"""
+    import librosa
+
+    audio, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+    return (np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def run_stream(service: StreamingSTTService, pcm: bytes, realtime: bool, out: list):
+    session = service.open()
+    packet = int(SAMPLE_RATE * PACKET_SECONDS) * 2
+    start = time.perf_counter()
+    first_partial = None
+    try:
+        for offset in range(0, len(pcm), packet):
+            if realtime:
+                # 按真实说话节奏发送
+                target = start + offset / 2 / SAMPLE_RATE
+                time.sleep(max(0.0, target - time.perf_counter()))
+            text = session.feed(pcm[offset:offset + packet])
+            if text and first_partial is None:
+                first_partial = time.perf_counter() - start
+        finish_start = time.perf_counter()
+        text = session.finish()
+        out.append({
+            **session.stats(),
+            "first_partial": first_partial,
+            "final_latency": time.perf_counter() - finish_start,
+            "text": text,
+        })
+    finally:
+        session.close()
+
+
+def bench(service: StreamingSTTService, pcm: bytes, streams: int, realtime: bool) -> dict:
+    results: list = []
+    usage_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=run_stream, args=(service, pcm, realtime, results)) for _ in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    usage_end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = (usage_end.ru_utime - usage_start.ru_utime) + (usage_end.ru_stime - usage_start.ru_stime)
+    audio = sum(r["audio_seconds"] for r in results)
+    chunk_latency = [r["decode_seconds"] / r["chunks"] for r in results if r["chunks"]]
+    first = [r["first_partial"] for r in results if r["first_partial"] is not None]
+    return {
+        "streams": streams,
+        "wall": wall,
+        "rtf_avg": statistics.mean(r["rtf"] for r in results),
+        "rtf_max": max(r["rtf"] for r in results),
+        "cpu_per_audio_second": cpu / audio if audio else 0.0,
+        "chunk_avg_ms": statistics.mean(chunk_latency) * 1000 if chunk_latency else 0.0,
+        "first_partial_ms": statistics.median(first) * 1000 if first else None,
+        "final_latency_ms": statistics.median(r["final_latency"] for r in results) * 1000,
+        "text": results[0]["text"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式语音识别基准测试")
+    parser.add_argument("--model", required=True, help="流式识别模型路径")
+    parser.add_argument("--audio", required=True, help="测试音频（任意采样率，自动转为16k单声道）")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4], help="并发流数")
+    parser.add_argument("--replicas", type=int, default=1, help="模型副本数")
+    parser.add_argument("--chunk-ms", type=int, default=600, help="解码分块时长（毫秒）")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--realtime", action="store_true", help="按真实说话节奏发送音频（否则尽快发送）")
+    args = parser.parse_args()
+
+    service = StreamingSTTService(args.model, device=args.device, replicas=args.replicas,
+                                  max_streams=max(args.streams), chunk_ms=args.chunk_ms)
+    if not service.is_available():
+        sys.exit("流式识别模型加载失败，请检查 --model 路径与 funasr 安装")
+    pcm = load_pcm(args.audio)
+    print(f"音频 {len(pcm) / 2 / SAMPLE_RATE:.1f}s，分块 {args.chunk_ms}ms，副本 {args.replicas}，"
+          f"{'实时节奏' if args.realtime else '尽快发送'}")
+    bench(service, pcm, 1, False)  # 预热
+
+    print(f"{'流数':>4}{'平均RTF':>10}{'最大RTF':>10}{'CPU秒/音频秒':>14}{'分块解码ms':>12}"
+          f"{'首字ms':>10}{'尾字ms':>10}{'总耗时s':>10}")
+    for streams in args.streams:
+        r = bench(service, pcm, streams, args.realtime)
+        first = f"{r['first_partial_ms']:.0f}" if r["first_partial_ms"] is not None else "-"
+        print(f"{streams:>4}{r['rtf_avg']:>10.3f}{r['rtf_max']:>10.3f}{r['cpu_per_audio_second']:>14.3f}"
+              f"{r['chunk_avg_ms']:>12.1f}{first:>10}{r['final_latency_ms']:>10.0f}{r['wall']:>10.1f}")
+    print(f"识别结果: {r['text']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+基准脚本：识别前静音裁剪节省的音频时长与识别耗时
+    对每段音频（可在首尾补上指定时长的低幅噪声，模拟浏览器录音点击前后的静音）分别统计：
+    - 裁剪前后的音频时长、裁剪本身的耗时
+    - 直接识别与裁剪后识别的耗时，以及两者识别文本的字符一致率
+使用方法: python test/bench_stt_trim.py --model model/SenseVoiceSmall
+          --vad model/speech_fsmn_vad_zh-cn-16k-common-pytorch --audio a.wav [--audio b.wav ...]
+          [--lead 1.5] [--tail 2.0] [--rounds 3]
+"""
+
+import argparse
+import difflib
+import os
+import sys
+import time
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voice.audio_decode import decode_audio
+from voice.stt_service import STTService
+from voice.vad_trim import SAMPLE_RATE, trim_silence
+
+
+def with_silence(audio: np.ndarray, lead: float, tail: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    noise = lambda seconds: (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 0.002).astype(np.float32)
+    return np.concatenate([noise(lead), audio, noise(tail)])
+
+
+def timed(fn, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        value = fn()
+    return value, (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="识别前静音裁剪基准测试")
+    parser.add_argument("--model", required=True, help="识别模型路径（如 SenseVoiceSmall）")
+    parser.add_argument("--vad", required=True, help="VAD 模型路径")
+    parser.add_argument("--audio", action="append", required=True, help="测试音频，可多次指定")
+    parser.add_argument("--lead", type=float, default=0.0, help="开头补充的静音（秒）")
+    parser.add_argument("--tail", type=float, default=0.0, help="结尾补充的静音（秒）")
+    parser.add_argument("--rounds", type=int, default=3, help="每段音频的识别次数（取平均）")
+    args = parser.parse_args()
+
+    stt = STTService(args.model, args.vad, device="cpu", warmup_runs=1)
+    if not stt.is_available():
+        sys.exit("语音识别模型加载失败，请检查 --model/--vad 路径与 funasr 安装")
+
+    print(f"{'音频':<20}{'原始s':>8}{'裁剪后s':>9}{'裁剪ms':>8}{'原识别ms':>10}{'裁剪后ms':>10}{'节省':>8}{'一致率':>8}")
+    totals = {"original": 0.0, "trimmed": 0.0, "raw_ms": 0.0, "trim_ms": 0.0}
+    for path in args.audio:
+        with open(path, "rb") as f:
+            audio = with_silence(decode_audio(f.read())[0], args.lead, args.tail)
+        trim, trim_cost = timed(lambda: trim_silence(audio), 10)
+        raw_text, raw_cost = timed(lambda: stt.recognize(audio), args.rounds)
+        trimmed_text, trimmed_cost = timed(lambda: stt.recognize(trim.audio), args.rounds)
+        agreement = difflib.SequenceMatcher(None, raw_text, trimmed_text).ratio()
+        # 裁剪耗时计入裁剪后的总耗时
+        total_ms = (trimmed_cost + trim_cost) * 1000
+        print(f"{os.path.basename(path):<20}{trim.original_seconds:>8.1f}{trim.seconds:>9.1f}{trim_cost * 1000:>8.1f}"
+              f"{raw_cost * 1000:>10.0f}{total_ms:>10.0f}{1 - total_ms / (raw_cost * 1000):>8.0%}{agreement:>8.0%}")
+        totals["original"] += trim.original_seconds
+        totals["trimmed"] += trim.seconds
+        totals["raw_ms"] += raw_cost * 1000
+        totals["trim_ms"] += total_ms
+    print(f"合计：音频 {totals['original']:.1f}s -> {totals['trimmed']:.1f}s"
+          f"（节省 {1 - totals['trimmed'] / totals['original']:.0%}），"
+          f"识别耗时 {totals['raw_ms']:.0f}ms -> {totals['trim_ms']:.0f}ms"
+          f"（降低 {1 - totals['trim_ms'] / totals['raw_ms']:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
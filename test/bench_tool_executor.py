@@ -0,0 +1,64 @@
+"""
+基准脚本：智能体一轮多个工具调用的耗时（串行 vs 并发执行）
+    模拟 LLM 在一轮中返回 N 个相互独立的工具调用（如多次 select_base_info），每个工具耗时在
+    [min, max] 毫秒之间（模拟数据库/接口延迟），对比逐个执行与 ToolExecutor 并发执行的整轮耗时，
+    以及同一会话再次调用时命中缓存的耗时。
+使用方法: python test/bench_tool_executor.py [--calls 1 2 4 8] [--workers 4] [--min-ms 50] [--max-ms 300]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# 添加项目根目录与 model 目录到路径（model 下的模块以同级方式互相导入）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "model"))
+
+from tool_executor import ToolExecutor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工具并发执行基准测试")
+    parser.add_argument("--calls", type=int, nargs="+", default=[1, 2, 4, 8], help="一轮中的工具调用数")
+    parser.add_argument("--workers", type=int, default=4, help="工具线程池大小")
+    parser.add_argument("--min-ms", type=float, default=50, help="单个工具最短耗时（毫秒）")
+    parser.add_argument("--max-ms", type=float, default=300, help="单个工具最长耗时（毫秒）")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+
+    def lookup(table_name: str, delay: float):
+        time.sleep(delay)
+        return {"table_name": table_name}
+
+    executor = ToolExecutor(max_workers=args.workers, step_timeout=60)
+    executor.register("select_base_info", lookup)
+
+    print(f"{'调用数':>6}{'最慢工具ms':>12}{'串行ms':>10}{'并发ms':>10}{'缓存命中ms':>12}")
+    for n in args.calls:
+        delays = [rng.uniform(args.min_ms, args.max_ms) / 1000 for _ in range(n)]
+        calls = [{"id": f"call_{i}", "function": {"name": "select_base_info",
+                                                  "arguments": json.dumps({"table_name": f"表{i}", "delay": d})}}
+                 for i, d in enumerate(delays)]
+        start = time.perf_counter()
+        for i, delay in enumerate(delays):
+            lookup(f"表{i}", delay)
+        serial = time.perf_counter() - start
+
+        session = f"bench-{n}"
+        start = time.perf_counter()
+        executor.run(calls, session)
+        parallel = time.perf_counter() - start
+        start = time.perf_counter()
+        executor.run(calls, session)
+        cached = time.perf_counter() - start
+        print(f"{n:>6}{max(delays) * 1000:>12.0f}{serial * 1000:>10.0f}{parallel * 1000:>10.0f}{cached * 1000:>12.2f}")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+压测脚本：按不同并发档位向 /api/query 发送测试问题，统计吞吐与延迟分布
+用于确定 gunicorn 的 workers / threads 配置（参见 gunicorn.conf.py 中的并发规划）；
+gunicorn.conf.py 中的默认值尚无实测数据，应以本脚本在目标环境（真实 LLM 服务与数据库）的结果为准
+使用方法: python test/load_test.py --url http://127.0.0.1:5000 --concurrency 1 2 4 8 --requests 40
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+import requests
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.test_runner import TEST_QUESTIONS
+
+
+def percentile(values, pct: float) -> float:
+    """计算百分位数（values 已排序）"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def send_query(url: str, question: str, timeout: int):
+    """发送一次查询，返回 (是否成功, 耗时秒, HTTP状态码)"""
+    start = time.perf_counter()
+    try:
+        resp = requests.post(f"{url}/api/query", json={"question": question}, timeout=timeout)
+        ok = resp.status_code == 200 and resp.json().get("success", False)
+        return ok, time.perf_counter() - start, resp.status_code
+    except Exception:
+        return False, time.perf_counter() - start, 0
+
+
+def run_level(url: str, concurrency: int, total: int, timeout: int) -> dict:
+    """以指定并发发送 total 个请求"""
+    questions = [q for _, q in islice(cycle(TEST_QUESTIONS), total)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda q: send_query(url, q, timeout), questions))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[1] for r in results)
+    status_counts = {}
+    for _, _, status in results:
+        status_counts[status] = status_counts.get(status, 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "success": sum(1 for r in results if r[0]),
+        "throughput": total / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max": latencies[-1] if latencies else 0.0,
+        "status": status_counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI2SQL 压测")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="服务地址")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="并发档位")
+    parser.add_argument("--requests", type=int, default=40, help="每个档位的请求数")
+    parser.add_argument("--timeout", type=int, default=300, help="单个请求超时（秒）")
+    args = parser.parse_args()
+
+    print(f"{'并发':>4} {'请求':>5} {'成功':>5} {'吞吐(req/s)':>12} {'P50(s)':>8} {'P95(s)':>8} {'最大(s)':>8}  状态码")
+    for level in args.concurrency:
+        r = run_level(args.url, level, args.requests, args.timeout)
+        print(f"{r['concurrency']:>4} {r['requests']:>5} {r['success']:>5} {r['throughput']:>12.2f} "
+              f"{r['p50']:>8.2f} {r['p95']:>8.2f} {r['max']:>8.2f}  {r['status']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,7 @@ import json
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from main import AI2SQLService
+from data.json_codec import json_default
 
 # 测试问题列表（重点测试新增关联关系）
 TEST_QUESTIONS = [
@@ -149,7 +150,7 @@ def run_tests():
                 "success_rate": f"{success/total*100:.1f}%"
             },
             "results": results
-        }, f, ensure_ascii=False, indent=2)
+        }, f, ensure_ascii=False, indent=2, default=json_default)
     
     print(f"\n详细报告已保存到: {report_file}")
     
@@ -0,0 +1,114 @@
+"""
+内存中的音频解码：上传的音频字节直接解码为 16kHz 单声道 float32 数组，交给 FunASR
+
+    1. soundfile（libsndfile）直接从内存解码 wav/flac/ogg/mp3，前端录音上传的是 16k wav，走这一条
+    2. 其他容器（如 webm/opus）：安装了 PyAV 时在进程内解码
+    3. 仍无法解码时，ffmpeg 通过管道读写（stdin/stdout），不落临时文件
+重采样使用 soxr（未安装时回退 librosa），多声道取平均。
+"""
+
+import importlib.util
+import io
+import subprocess
+from typing import Tuple
+
+import numpy as np
+
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    SOUNDFILE_AVAILABLE = False
+
+try:
+    import soxr
+    SOXR_AVAILABLE = True
+except ImportError:
+    SOXR_AVAILABLE = False
+
+# PyAV 只在 wav 等格式之外才用到，导入较慢，推迟到第一次使用时
+PYAV_AVAILABLE = importlib.util.find_spec("av") is not None
+
+TARGET_SAMPLE_RATE = 16000
+
+
+class AudioDecodeError(Exception):
+    """音频无法解码"""
+
+
+def _decode_soundfile(data: bytes) -> Tuple[np.ndarray, int]:
+    audio, sample_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=False)
+    return audio, sample_rate
+
+
+def _decode_pyav(data: bytes) -> Tuple[np.ndarray, int]:
+    import av
+
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=TARGET_SAMPLE_RATE)
+        frames = []
+        for frame in container.decode(stream):
+            for resampled in resampler.resample(frame):
+                frames.append(resampled.to_ndarray().reshape(-1))
+        for resampled in resampler.resample(None):
+            frames.append(resampled.to_ndarray().reshape(-1))
+    if not frames:
+        raise AudioDecodeError("音频中没有可解码的数据")
+    return np.concatenate(frames).astype(np.float32), TARGET_SAMPLE_RATE
+
+
+def _decode_ffmpeg(data: bytes) -> Tuple[np.ndarray, int]:
+    """兜底：ffmpeg 从 stdin 读入、向 stdout 输出 16k 单声道 float32 裸流"""
+    cmd = ["ffmpeg", "-loglevel", "error", "-i", "pipe:0",
+           "-f", "f32le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "pipe:1"]
+    try:
+        proc = subprocess.run(cmd, input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    except FileNotFoundError:
+        raise AudioDecodeError("不支持的音频格式（请上传 wav，或安装 PyAV/ffmpeg）")
+    except subprocess.CalledProcessError as e:
+        raise AudioDecodeError(f"音频解码失败: {e.stderr.decode('utf-8', errors='ignore')[:200]}")
+    return np.frombuffer(proc.stdout, dtype=np.float32), TARGET_SAMPLE_RATE
+
+
+def resample(audio: np.ndarray, sample_rate: int, target: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """重采样到目标采样率"""
+    if sample_rate == target:
+        return audio
+    if SOXR_AVAILABLE:
+        return soxr.resample(audio, sample_rate, target, quality="HQ")
+    import librosa
+
+    return librosa.resample(audio, orig_sr=sample_rate, target_sr=target)
+
+
+def decode_audio(data: bytes) -> Tuple[np.ndarray, str]:
+    """
+    解码音频字节为 16kHz 单声道 float32 数组
+
+    Returns:
+        (音频数组, 使用的解码方式 soundfile/pyav/ffmpeg)
+    """
+    if not data:
+        raise AudioDecodeError("音频文件为空")
+    audio, sample_rate, method = None, None, None
+    if SOUNDFILE_AVAILABLE:
+        try:
+            audio, sample_rate = _decode_soundfile(data)
+            method = "soundfile"
+        except Exception:
+            audio = None
+    if audio is None and PYAV_AVAILABLE:
+        try:
+            audio, sample_rate = _decode_pyav(data)
+            method = "pyav"
+        except Exception:
+            audio = None
+    if audio is None:
+        audio, sample_rate = _decode_ffmpeg(data)
+        method = "ffmpeg"
+
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    audio = resample(np.ascontiguousarray(audio, dtype=np.float32), sample_rate)
+    return audio.astype(np.float32, copy=False), method
@@ -1,14 +1,16 @@
 import argparse
-import sounddevice as sd
 
 
 parser = argparse.ArgumentParser(description='语音控制与语音通话整合系统')
 
-devices = sd.query_devices()
-device_count = len(devices)
 
-# 默认使用倒数第二个设备（如果设备数量足够）
-default_device_id = device_count -1 if device_count >= 2 else 0
+def default_device_id() -> int:
+    """默认使用最后一个设备（如果设备数量足够）；枚举声卡较慢，只在需要时调用，不在导入时执行"""
+    import sounddevice as sd
+
+    device_count = len(sd.query_devices())
+    return device_count - 1 if device_count >= 2 else 0
+
 
 # 音频参数
 parser.add_argument('--input_device_id', type=int, default=0, help='音频设备ID，-1表示使用默认设备')
@@ -52,4 +54,4 @@ parser.add_argument('--speed', type=float, default=1.1)
 # 解析参数，生成包含所有配置的对象
 # 注意：parser 仍然是 ArgumentParser 对象（供 synthesis_client.py 等使用）
 # args 是解析后的参数对象，包含所有配置属性（如 args.model_url）
-args = parser.parse_args()
+args, _ = parser.parse_known_args()
@@ -0,0 +1,195 @@
+"""
+实时流式语音识别（边说边出字）
+依赖：funasr（流式模型如 paraformer-zh-streaming）
+
+客户端通过 WebSocket 持续发送 16kHz 16bit 单声道 PCM，服务端每攒够一个分块（默认 600ms）
+做一次增量解码，推送当前识别文本（partial）；客户端结束录音后推送最终结果（final）。
+
+    - 每个连接一个 StreamingSession，持有自己的解码缓存（编码器/解码器的 look-back 状态）
+    - 模型副本共享给多个连接：FunASR 的 AutoModel.inference 会就地修改模型实例上的 kwargs，
+      同一副本上的解码必须串行，多个连接按分块交替解码；副本数（replicas）可配置以提高并发
+    - 同时进行的流数有上限（max_streams），超出时拒绝新连接
+    - 统计每个流的解码耗时、本线程CPU时间与实时率（解码耗时 / 音频时长）
+"""
+
+import importlib.util
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config.config import logger
+from config.metrics import STT_STREAM_CHUNK_SECONDS, STT_STREAM_RTF
+
+# funasr（连同 torch）导入需要数秒，推迟到加载模型时才导入
+FUNASR_AVAILABLE = importlib.util.find_spec("funasr") is not None
+
+SAMPLE_RATE = 16000
+# paraformer 流式模型的一帧为 60ms（960 个采样点）
+_FRAME_SAMPLES = 960
+
+
+class StreamsExhausted(Exception):
+    """同时进行的流数已达上限"""
+
+
+@dataclass
+class _Replica:
+    model: object
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    sessions: int = 0
+
+
+class StreamingSTTService:
+    """流式识别模型（可多副本）+ 并发流数限制"""
+
+    def __init__(self, model_dir: str, device: str = "cpu", replicas: int = 1,
+                 max_streams: int = 4, chunk_ms: int = 600,
+                 encoder_chunk_look_back: int = 4, decoder_chunk_look_back: int = 1):
+        """
+        Args:
+            model_dir: 流式识别模型路径（如 paraformer-zh-streaming）
+            device: 计算设备
+            replicas: 模型副本数，每个副本同一时刻只解码一个分块
+            max_streams: 同时进行的流数上限
+            chunk_ms: 解码分块时长（60ms 的整数倍），越小出字越快、CPU开销越高
+            encoder_chunk_look_back / decoder_chunk_look_back: 流式注意力回看的分块数
+        """
+        self.model_dir = model_dir
+        self.device = device
+        self.max_streams = max_streams
+        frames = max(1, chunk_ms // 60)
+        # [0, 当前分块帧数, 前瞻帧数]，与 FunASR 流式示例一致
+        self.chunk_size = [0, frames, max(1, frames // 2)]
+        self.chunk_samples = frames * _FRAME_SAMPLES
+        self.encoder_chunk_look_back = encoder_chunk_look_back
+        self.decoder_chunk_look_back = decoder_chunk_look_back
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._replicas: List[_Replica] = []
+        if FUNASR_AVAILABLE and os.path.exists(model_dir):
+            try:
+                from funasr import AutoModel
+
+                for _ in range(max(1, replicas)):
+                    model = AutoModel(model=model_dir, device=device, disable_update=True,
+                                      disable_log=True, disable_pbar=True, log_level="ERROR")
+                    self._replicas.append(_Replica(model))
+                logger.info(f"流式语音识别模型已加载: {model_dir}，副本 {len(self._replicas)} 个，"
+                            f"分块 {self.chunk_samples * 1000 // SAMPLE_RATE}ms")
+            except Exception as e:
+                logger.error(f"流式语音识别模型加载失败: {e}")
+                self._replicas = []
+
+    def is_available(self) -> bool:
+        return bool(self._replicas)
+
+    def open(self) -> "StreamingSession":
+        """开始一个新的识别流，超过并发上限时抛出 StreamsExhausted"""
+        with self._lock:
+            if self._active >= self.max_streams:
+                raise StreamsExhausted(f"实时语音识别并发已满（{self.max_streams} 路），请稍后重试")
+            self._active += 1
+            replica = min(self._replicas, key=lambda r: r.sessions)
+            replica.sessions += 1
+        return StreamingSession(self, replica)
+
+    def _close(self, replica: _Replica):
+        with self._lock:
+            self._active -= 1
+            replica.sessions -= 1
+
+    def _decode(self, replica: _Replica, speech: np.ndarray, cache: Dict, is_final: bool) -> str:
+        with replica.lock:
+            result = replica.model.generate(
+                input=speech,
+                cache=cache,
+                is_final=is_final,
+                chunk_size=self.chunk_size,
+                encoder_chunk_look_back=self.encoder_chunk_look_back,
+                decoder_chunk_look_back=self.decoder_chunk_look_back,
+                disable_pbar=True,
+            )
+        return result[0].get("text", "") if result else ""
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "active_streams": self._active,
+                "max_streams": self.max_streams,
+                "replicas": len(self._replicas),
+            }
+
+
+class StreamingSession:
+    """单个连接的识别流：缓冲 PCM，按分块增量解码，拼接识别文本"""
+
+    def __init__(self, service: StreamingSTTService, replica: _Replica):
+        self.service = service
+        self.replica = replica
+        self.cache: Dict = {}
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.pieces: List[str] = []
+        self.audio_samples = 0
+        self.decode_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.chunks = 0
+        self.closed = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self.pieces)
+
+    def _run(self, speech: np.ndarray, is_final: bool):
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        piece = self.service._decode(self.replica, speech, self.cache, is_final)
+        elapsed = time.perf_counter() - start
+        self.decode_seconds += elapsed
+        self.cpu_seconds += time.thread_time() - cpu_start
+        self.chunks += 1
+        STT_STREAM_CHUNK_SECONDS.observe(elapsed)
+        if piece:
+            self.pieces.append(piece)
+
+    def feed(self, pcm: bytes) -> Optional[str]:
+        """送入一段 16bit PCM，每解码出新文字时返回当前完整文本，否则返回 None"""
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        self.audio_samples += len(samples)
+        self.buffer = np.concatenate([self.buffer, samples]) if len(self.buffer) else samples
+        before = len(self.pieces)
+        stride = self.service.chunk_samples
+        while len(self.buffer) >= stride:
+            chunk, self.buffer = self.buffer[:stride], self.buffer[stride:]
+            self._run(chunk, is_final=False)
+        return self.text if len(self.pieces) > before else None
+
+    def finish(self) -> str:
+        """解码剩余音频并结束，返回最终文本"""
+        if not self.closed:
+            self._run(self.buffer, is_final=True)
+            self.buffer = np.zeros(0, dtype=np.float32)
+            self.close()
+        return self.text
+
+    def close(self):
+        """释放并发名额（连接异常断开时也需调用）"""
+        if self.closed:
+            return
+        self.closed = True
+        self.service._close(self.replica)
+        if self.audio_samples:
+            STT_STREAM_RTF.observe(self.decode_seconds / (self.audio_samples / SAMPLE_RATE))
+
+    def stats(self) -> Dict:
+        audio_seconds = self.audio_samples / SAMPLE_RATE
+        return {
+            "audio_seconds": round(audio_seconds, 3),
+            "decode_seconds": round(self.decode_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "chunks": self.chunks,
+            "rtf": round(self.decode_seconds / audio_seconds, 3) if audio_seconds else None,
+        }
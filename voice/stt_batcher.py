@@ -0,0 +1,195 @@
+"""
+语音识别推理工作线程：独占模型，把并发的识别请求动态合并为小批次
+
+    - 请求线程只提交音频并拿到 Future，模型只在工作线程中调用：并发的语音请求不会各自占满
+      torch 计算线程而互相争抢CPU，也避免 FunASR 在同一模型实例上并发推理（inference 会就地修改 kwargs）
+    - 动态小批次：取到第一条音频后最多再等 max_wait_ms 收集后续请求，批内音频总时长不超过
+      max_batch_seconds、条数不超过 max_batch_size；批内音频不经过 VAD 切分，
+      超过 BATCH_ITEM_MAX_SECONDS 的长音频单独走 VAD 切分识别
+    - 工作线程启动时设置 torch 计算线程数（num_threads，0 表示取CPU核数的一半，其余留给请求处理与流式识别），
+      并先做模型预热（warmup_runs），预热期间到达的请求排队等待
+    - 队列有上限，写满时直接拒绝（STTBusy）
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+from config.config import logger
+from config.metrics import STT_BATCH_SIZE, STT_QUEUE_WAIT_SECONDS, STT_RECOGNIZE_SECONDS
+
+SAMPLE_RATE = 16000
+# 可以合并进批次的单条音频时长上限（秒），与 STTService 的 VAD 最大分段时长一致
+BATCH_ITEM_MAX_SECONDS = 30
+
+
+class STTBusy(Exception):
+    """识别队列已满"""
+
+
+@dataclass
+class _Request:
+    audio: np.ndarray
+    future: Future = field(default_factory=Future)
+    submitted_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def seconds(self) -> float:
+        return len(self.audio) / SAMPLE_RATE
+
+
+def default_num_threads() -> int:
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class STTBatchWorker:
+    """独占 STTService 模型的识别工作线程（动态小批次）"""
+
+    def __init__(self, stt, max_wait_ms: int = 50, max_batch_seconds: float = 60.0, max_batch_size: int = 8,
+                 queue_size: int = 32, num_threads: int = 0, warmup_runs: int = 0):
+        """
+        Args:
+            stt: STTService 实例（提供 recognize / recognize_batch）
+            max_wait_ms: 取到第一条音频后等待后续请求凑批的最长时间（毫秒），0 表示不等待
+            max_batch_seconds: 单批音频总时长上限（秒）
+            max_batch_size: 单批条数上限，1 表示不合并
+            queue_size: 排队请求上限
+            num_threads: torch 计算线程数，0 表示自动
+            warmup_runs: 工作线程启动后的预热次数，0 表示不预热
+        """
+        self.stt = stt
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_seconds = max_batch_seconds
+        self.max_batch_size = max(1, max_batch_size)
+        self.queue_size = queue_size
+        self.num_threads = num_threads or default_num_threads()
+        self.warmup_runs = warmup_runs
+
+        self._cond = threading.Condition()
+        self._pending: Deque[_Request] = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._metrics = {"submitted": 0, "rejected": 0, "batches": 0, "items": 0, "failed": 0,
+                         "audio_seconds": 0.0, "busy_seconds": 0.0}
+
+    def start(self):
+        """启动工作线程（fork 后在子进程中重新调用）"""
+        self._thread = threading.Thread(target=self._worker, name="stt-batch-worker", daemon=True)
+        self._thread.start()
+
+    def restart_after_fork(self):
+        """fork 后在子进程中调用：线程不会随 fork 复制，重建条件变量与工作线程"""
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self.start()
+
+    def submit(self, audio: np.ndarray) -> Future:
+        """提交 16k 单声道 float32 音频，返回识别文本的 Future；队列已满抛出 STTBusy"""
+        request = _Request(audio)
+        with self._cond:
+            if len(self._pending) >= self.queue_size:
+                self._metrics["rejected"] += 1
+                raise STTBusy(f"语音识别繁忙（排队 {len(self._pending)} 条），请稍后重试")
+            self._metrics["submitted"] += 1
+            self._pending.append(request)
+            self._cond.notify()
+        return request.future
+
+    def recognize(self, audio: np.ndarray, timeout: Optional[float] = None) -> str:
+        """同步识别：提交并等待结果"""
+        return self.submit(audio).result(timeout=timeout)
+
+    def _next_batch(self) -> List[_Request]:
+        """取出下一批：队首请求到达后最多等待 max_wait，期间凑满条数或时长上限即提前出队"""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            head = self._pending.popleft()
+            batch = [head]
+            if head.seconds > BATCH_ITEM_MAX_SECONDS:
+                return batch
+            seconds = head.seconds
+            deadline = head.submitted_at + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._pending:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(timeout=left)
+                    continue
+                nxt = self._pending[0]
+                if nxt.seconds > BATCH_ITEM_MAX_SECONDS or seconds + nxt.seconds > self.max_batch_seconds:
+                    break
+                batch.append(self._pending.popleft())
+                seconds += nxt.seconds
+            return batch
+
+    def _worker(self):
+        try:
+            import torch
+
+            torch.set_num_threads(self.num_threads)
+        except ImportError:
+            pass
+        if self.warmup_runs > 0:
+            try:
+                self.stt.warmup(self.warmup_runs)
+            except Exception as e:
+                logger.warning(f"[语音识别] 模型预热失败: {e}")
+        while True:
+            batch = self._next_batch()
+            started = time.monotonic()
+            for request in batch:
+                STT_QUEUE_WAIT_SECONDS.observe(started - request.submitted_at)
+            # 调用方已超时放弃的请求不再识别
+            batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                with STT_RECOGNIZE_SECONDS.time(mode="batch" if len(batch) > 1 else "single"):
+                    if len(batch) == 1:
+                        texts = [self.stt.recognize(batch[0].audio)]
+                    else:
+                        texts = self.stt.recognize_batch([r.audio for r in batch])
+                for request, text in zip(batch, texts):
+                    request.future.set_result(text)
+            except Exception as e:
+                logger.error(f"[语音识别] 批量识别失败（{len(batch)} 条）: {e}")
+                if len(batch) > 1:
+                    # 整批失败（含结果与输入对不上）：逐条重试，单条失败只影响该请求
+                    self._recognize_each(batch)
+                else:
+                    self._metrics["failed"] += 1
+                    batch[0].future.set_exception(e)
+            STT_BATCH_SIZE.observe(len(batch))
+            with self._cond:
+                self._metrics["batches"] += 1
+                self._metrics["items"] += len(batch)
+                self._metrics["audio_seconds"] += sum(r.seconds for r in batch)
+                self._metrics["busy_seconds"] += time.monotonic() - started
+
+    def _recognize_each(self, batch: List[_Request]):
+        """逐条识别（批量识别失败后的回退）"""
+        for request in batch:
+            if request.future.done():
+                continue
+            try:
+                request.future.set_result(self.stt.recognize(request.audio))
+            except Exception as e:
+                self._metrics["failed"] += 1
+                request.future.set_exception(e)
+
+    def stats(self) -> Dict:
+        """工作线程指标：队列深度、平均批大小、推理实时率等"""
+        with self._cond:
+            m = dict(self._metrics)
+            m["queue_depth"] = len(self._pending)
+        m["avg_batch_size"] = m["items"] / m["batches"] if m["batches"] else 0.0
+        m["rtf"] = m["busy_seconds"] / m["audio_seconds"] if m["audio_seconds"] else None
+        m["num_threads"] = self.num_threads
+        return m
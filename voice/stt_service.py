@@ -1,40 +1,52 @@
 """
 轻量化语音识别服务（仅 STT，不含机器人控制逻辑）
 依赖：funasr
+
+CPU 部署可选 int8 动态量化（quantize="int8"）：识别模型中的全连接层权重量化为 int8，
+推理时按批动态量化激活值，VAD 模型体积很小，保持 fp32。
+模型加载后可做预热（warmup_runs），让首个真实请求不承担算子初始化开销。
+funasr（连同 torch）导入需要数秒，推迟到加载模型时才导入，导入本模块本身不加载它们。
 """
 
+import importlib.util
 import os
 import logging
-from typing import Optional
+import time
+from typing import List, Optional, Union
+
+import numpy as np
 from config.config import logger
 
 # 禁用funasr的cli_utils日志
 logging.getLogger("funasr.utils.cli_utils").disabled = True
 
-try:
-    from funasr.utils.postprocess_utils import rich_transcription_postprocess
-    from funasr import AutoModel
-    FUNASR_AVAILABLE = True
-except ImportError:
-    FUNASR_AVAILABLE = False
+FUNASR_AVAILABLE = importlib.util.find_spec("funasr") is not None
+if not FUNASR_AVAILABLE:
     print("警告：未安装 funasr，STT 服务不可用")
 
 
 class STTService:
     """基于 FunASR 的语音转文本服务"""
 
-    def __init__(self, model_dir: str, vad_model: str, device: str = "cuda:0"):
+    def __init__(self, model_dir: str, vad_model: str, device: str = "cuda:0",
+                 quantize: str = "none", warmup_runs: int = 0):
         """
         Args:
             model_dir: 识别模型路径（如 SenseVoiceSmall）
             vad_model: VAD 模型路径（如 fsmn_vad）
             device:    计算设备，"cuda:0" 或 "cpu"
+            quantize:  "none" 保持 fp32；"int8" 动态量化（仅 CPU）
+            warmup_runs: 加载后的预热次数，0 表示不预热
         """
         self.model_dir = model_dir
         self.vad_model = vad_model
         self.device = device
+        self.quantize = quantize
+        self.warmup_runs = warmup_runs
         self.model = None
         self.initialized = False
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
 
         if FUNASR_AVAILABLE:
             self._init_model()
@@ -50,7 +62,12 @@ class STTService:
             return
 
         print("正在初始化 FunASR 语音识别模型...")
+        start = time.perf_counter()
         try:
+            from funasr import AutoModel
+            from funasr.utils.postprocess_utils import rich_transcription_postprocess
+
+            self._postprocess = rich_transcription_postprocess
             self.model = AutoModel(
                 model=self.model_dir,
                 vad_model=self.vad_model,
@@ -62,31 +79,66 @@ class STTService:
                 disable_pbar=True,
                 log_level="ERROR",
             )
+            if self.quantize == "int8":
+                self._quantize_int8()
             self.initialized = True
-            print("FunASR 语音识别模型初始化完成")
+            self.load_seconds = time.perf_counter() - start
+            print(f"FunASR 语音识别模型初始化完成，耗时 {self.load_seconds:.1f}s（{self.quantize}）")
         except Exception as e:
             print(f"FunASR 模型初始化失败: {e}")
             self.initialized = False
+            return
+        if self.warmup_runs > 0:
+            self.warmup(self.warmup_runs)
+
+    def _quantize_int8(self):
+        """识别模型的全连接层动态量化为 int8（GPU 上不支持，保持 fp32）"""
+        if not self.device.startswith("cpu"):
+            print(f"int8 动态量化仅支持 CPU，当前设备 {self.device}，保持 fp32")
+            self.quantize = "none"
+            return
+        import torch
+
+        self.model.model = torch.quantization.quantize_dynamic(
+            self.model.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model.model.eval()
+
+    def warmup(self, runs: int = 1):
+        """
+        用合成音频跑几次推理，完成算子初始化与内存分配
+        低幅噪声会被 VAD 判为静音而跳过识别模型，因此同时走一次不经过 VAD 的批量识别
+        """
+        if not self.is_available():
+            return
+        rng = np.random.default_rng(0)
+        audio = (rng.standard_normal(16000 * 2) * 0.01).astype(np.float32)
+        start = time.perf_counter()
+        for _ in range(runs):
+            self.recognize(audio)
+            self.recognize_batch([audio, audio[:16000]])
+        self.warmup_seconds = time.perf_counter() - start
+        print(f"FunASR 语音识别模型预热完成，耗时 {self.warmup_seconds:.2f}s")
 
     def is_available(self) -> bool:
         """服务是否可用"""
         return FUNASR_AVAILABLE and self.initialized and self.model is not None
 
-    def recognize(self, audio_path: str) -> str:
+    def recognize(self, audio: Union[str, np.ndarray]) -> str:
         """
-        对音频文件进行语音识别
-        推荐输入：16k 单声道 wav
+        对音频进行语音识别
+        输入：音频文件路径，或 16k 单声道 float32 数组（见 voice/audio_decode.py，无需落盘）
         返回：识别文本（失败返回空字符串）
         """
         if not self.is_available():
             return ""
-        if not os.path.exists(audio_path):
-            print(f"音频文件不存在: {audio_path}")
+        if isinstance(audio, str) and not os.path.exists(audio):
+            print(f"音频文件不存在: {audio}")
             return ""
 
         try:
             result = self.model.generate(
-                input=audio_path,
+                input=audio,
+                fs=16000,
                 cache={},
                 language="zn",
                 use_itn=True,
@@ -97,21 +149,49 @@ class STTService:
             )
             if not result or "text" not in result[0]:
                 return ""
-            text = rich_transcription_postprocess(result[0]["text"])
+            text = self._postprocess(result[0]["text"])
             return text.strip()
         except Exception as e:
             print(f"语音识别失败: {e}")
             return ""
 
+    def recognize_batch(self, audios: List[np.ndarray]) -> List[str]:
+        """
+        批量识别多段 16k 单声道音频（由 voice/stt_batcher.py 的工作线程调用）
+        各段作为一个批次直接送入识别模型、不经过 VAD 切分，调用方需保证单段不超过 VAD 最大分段时长（30s）
+        返回：与输入一一对应的识别文本；结果按段的 key 对应，有段缺少结果时抛出 RuntimeError
+        （不能按位置补齐，否则之后的文本会错配到其他请求），由调用方整批失败或逐条重试
+        """
+        if not self.is_available():
+            return [""] * len(audios)
+        keys = [f"seg{i}" for i in range(len(audios))]
+        # 传入 kwargs 副本：AutoModel.inference 会把本次参数就地合并进 kwargs，避免 batch_size 残留到后续调用
+        results = self.model.inference(
+            audios,
+            kwargs=dict(self.model.kwargs),
+            key=keys,
+            batch_size=len(audios),
+            fs=16000,
+            language="zn",
+            use_itn=True,
+            disable_pbar=True,
+        )
+        texts = {result.get("key"): self._postprocess(result.get("text", "")).strip() for result in results or []}
+        missing = [key for key in keys if key not in texts]
+        if missing:
+            raise RuntimeError(f"批量识别结果缺少 {len(missing)}/{len(keys)} 段: {', '.join(missing)}")
+        return [texts[key] for key in keys]
+
 
 # 可选的全局单例获取
 _stt_service: Optional[STTService] = None
 
 
-def get_stt_service(model_dir: str, vad_model: str, device: str = "cuda:0") -> STTService:
+def get_stt_service(model_dir: str, vad_model: str, device: str = "cuda:0",
+                    quantize: str = "none", warmup_runs: int = 0) -> STTService:
     """获取 STTService 单例"""
     global _stt_service
     if _stt_service is None:
-        _stt_service = STTService(model_dir, vad_model, device=device)
+        _stt_service = STTService(model_dir, vad_model, device=device, quantize=quantize, warmup_runs=warmup_runs)
     return _stt_service
 
@@ -0,0 +1,106 @@
+"""
+识别前的静音裁剪与端点检测（基于短时能量，纯 numpy，耗时远小于识别模型）
+
+浏览器录音前后常带有较长的静音（点击麦克风到开口、说完到点击停止），识别模型会对这些静音同样做 VAD 与推理。
+在解码后的音频上先做一遍轻量的预处理：
+    - 按 30ms 分帧计算能量（dB），阈值取噪声底（低分位能量）+ margin，同时不低于峰值以下一定范围与绝对下限
+    - 端点：第一个/最后一个语音帧前后各保留 pad_ms，之外的静音裁掉
+    - 句中停顿超过 max_pause_ms 的部分压缩到 max_pause_ms
+    - 裁剪后仍超过 max_seconds 的音频截断
+    - 整段都没有语音时返回空音频，调用方可直接返回“未检测到语音”而不调用识别模型
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+_FRAME = SAMPLE_RATE * FRAME_MS // 1000
+# 低于该能量（dBFS）的帧一律视为静音
+_ABS_FLOOR_DB = -55.0
+
+
+@dataclass
+class TrimResult:
+    audio: np.ndarray
+    original_seconds: float
+    leading_seconds: float = 0.0    # 裁掉的开头静音
+    trailing_seconds: float = 0.0   # 裁掉的结尾静音
+    pause_seconds: float = 0.0      # 压缩掉的句中停顿
+    truncated_seconds: float = 0.0  # 超出时长上限被截断的部分
+
+    @property
+    def seconds(self) -> float:
+        return len(self.audio) / SAMPLE_RATE
+
+    @property
+    def saved_seconds(self) -> float:
+        return self.original_seconds - self.seconds
+
+    @property
+    def has_speech(self) -> bool:
+        return len(self.audio) > 0
+
+
+def frame_energy_db(audio: np.ndarray) -> np.ndarray:
+    """每个 30ms 帧的均方根能量（dBFS），末尾不足一帧的部分补零"""
+    frames = -(-len(audio) // _FRAME)
+    padded = np.zeros(frames * _FRAME, dtype=np.float32)
+    padded[:len(audio)] = audio
+    rms = np.sqrt(np.mean(padded.reshape(frames, _FRAME) ** 2, axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+def speech_frames(energy_db: np.ndarray, margin_db: float = 10.0, dynamic_range_db: float = 25.0) -> np.ndarray:
+    """语音帧掩码：能量高于 min(噪声底 + margin, 峰值 - dynamic_range)，且高于绝对下限"""
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = min(noise_floor + margin_db, energy_db.max() - dynamic_range_db)
+    return energy_db > max(threshold, _ABS_FLOOR_DB)
+
+
+def trim_silence(audio: np.ndarray, pad_ms: int = 300, max_pause_ms: int = 1000,
+                 max_seconds: float = 60.0, margin_db: float = 10.0) -> TrimResult:
+    """
+    裁剪 16k 单声道音频的首尾静音、压缩句中长停顿并限制总时长
+
+    Args:
+        pad_ms: 语音段首尾保留的静音（避免切掉轻声的首尾字）
+        max_pause_ms: 句中停顿的保留上限，0 表示不压缩
+        max_seconds: 裁剪后的时长上限，0 表示不限制
+        margin_db: 语音能量需高于噪声底的幅度
+    """
+    original_seconds = len(audio) / SAMPLE_RATE
+    if len(audio) == 0:
+        return TrimResult(audio, original_seconds)
+    speech = speech_frames(frame_energy_db(audio), margin_db=margin_db)
+    voiced = np.flatnonzero(speech)
+    if len(voiced) == 0:
+        return TrimResult(audio[:0], original_seconds, leading_seconds=original_seconds)
+
+    pad = pad_ms * SAMPLE_RATE // 1000
+    start = max(0, voiced[0] * _FRAME - pad)
+    end = min(len(audio), (voiced[-1] + 1) * _FRAME + pad)
+    result = TrimResult(audio, original_seconds,
+                        leading_seconds=start / SAMPLE_RATE,
+                        trailing_seconds=(len(audio) - end) / SAMPLE_RATE)
+
+    keep = np.zeros(len(audio), dtype=bool)
+    keep[start:end] = True
+    if max_pause_ms > 0:
+        # 相邻语音帧之间的静音超过 max_pause 时，只保留两端各一半
+        max_pause = max_pause_ms * SAMPLE_RATE // 1000
+        gaps = np.flatnonzero(np.diff(voiced) > 1)
+        for i in gaps:
+            gap_start, gap_end = (voiced[i] + 1) * _FRAME, voiced[i + 1] * _FRAME
+            if gap_end - gap_start > max_pause:
+                keep[gap_start + max_pause // 2:gap_end - max_pause // 2] = False
+        result.pause_seconds = (end - start - int(keep.sum())) / SAMPLE_RATE
+    trimmed = audio[keep]
+
+    limit = int(max_seconds * SAMPLE_RATE)
+    if limit and len(trimmed) > limit:
+        result.truncated_seconds = (len(trimmed) - limit) / SAMPLE_RATE
+        trimmed = trimmed[:limit]
+    result.audio = np.ascontiguousarray(trimmed)
+    return result